@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark Result Comparison
+Prints load_test.py result files side by side.
+
+Usage:
+    python bench/compare.py RESULT.json [RESULT.json ...]
+
+Example:
+    python bench/compare.py bench/results/*.json
+"""
+
+import json
+import sys
+from pathlib import Path
+
+
+COLUMNS = (
+    ('commit', 9), ('backend', 9), ('threads', 8), ('workers', 8), ('cache', 6), ('conns', 6),
+    ('req/s', 10), ('p50 ms', 9), ('p95 ms', 9), ('p99 ms', 9), ('errors', 7), ('rss MB', 8),
+)
+
+
+def row(report):
+    """Return the table cells for one report."""
+    config = report['config']
+    results = report['results']
+    latency = results.get('latency') or {}
+    memory = results.get('server_memory') or {}
+    rss = memory.get('peak_rss_bytes')
+    return (
+        report.get('commit') or '-',
+        config['backend'],
+        config['threads'],
+        config['workers'],
+        config['cache_mb'],
+        config['connections'],
+        results['requests_per_sec'],
+        latency.get('p50_ms', '-'),
+        latency.get('p95_ms', '-'),
+        latency.get('p99_ms', '-'),
+        results['client_errors'] + results['connect_errors'],
+        f"{rss / 1024 / 1024:.1f}" if rss else '-',
+    )
+
+
+def main():
+    """Main function."""
+    paths = sys.argv[1:]
+    if not paths:
+        print("Usage: python bench/compare.py RESULT.json [RESULT.json ...]")
+        return 1
+    
+    print('  '.join(name.rjust(width) for name, width in COLUMNS) + '  file')
+    for path in paths:
+        report = json.loads(Path(path).read_text())
+        cells = row(report)
+        print('  '.join(str(cell).rjust(width) for cell, (_, width) in zip(cells, COLUMNS))
+              + f"  {Path(path).name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
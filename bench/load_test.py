@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Static Server Load Test
+Starts the site's WSGI app (create_static_file_app) on a local port in a child
+process, runs concurrent keep-alive HTTP/1.1 clients against a realistic page
+load mix, and reports requests/sec, latency percentiles and the server's peak
+RSS. Results are written to JSON so runs can be compared across commits,
+backends, thread counts and cache settings (see bench/compare.py).
+
+The request mix is what a browser fetches for one visit: index.html,
+styles/main.css, every JS module reachable from scripts/main.js,
+data/archives.json and one of the logo srcset variants.
+
+Usage:
+    python bench/load_test.py [--backend waitress|asyncio] [--threads N] [--workers N]
+                              [--connections N] [--duration SECONDS] [--warmup SECONDS]
+                              [--cache-mb N] [--production] [--output FILE]
+
+Example:
+    python bench/load_test.py --backend asyncio --connections 200 --duration 20
+    # -> bench/results/20261015T120000Z-3d4e602-asyncio-t8-w1-c200.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from server_assets import JS_IMPORT_PATTERN, AssetManifest
+
+
+# Directory where results are written when --output is not given
+RESULTS_DIR = PROJECT_ROOT / 'bench' / 'results'
+
+# Logo srcset variants (e.g. EHRLogo-desktop-2x.webp)
+LOGO_VARIANT_PATTERN = re.compile(r'-[123]x\.(png|webp)$')
+
+# Seconds to wait for the server to accept connections
+SERVER_START_TIMEOUT = 30.0
+
+# Request headers sent by every client (what a browser sends for a static asset)
+DEFAULT_ACCEPT_ENCODING = 'gzip, deflate, br'
+
+
+def js_module_graph(root, entry='scripts/main.js'):
+    """
+    Return every JS module reachable from an entry module through relative imports.
+    
+    Args:
+        root: Project root
+        entry: Entry module path relative to root
+    
+    Returns:
+        list: Module paths relative to root, entry first
+    """
+    seen = []
+    pending = [entry]
+    while pending:
+        rel_path = pending.pop()
+        if rel_path in seen or not (root / rel_path).is_file():
+            continue
+        seen.append(rel_path)
+        text = (root / rel_path).read_text(encoding='utf-8', errors='replace')
+        for match in JS_IMPORT_PATTERN.finditer(text):
+            target = AssetManifest._resolve_import(rel_path, match.group(3))
+            if target.endswith('.js') and target not in seen:
+                pending.append(target)
+    return seen
+
+
+def build_request_mix(root, production=False):
+    """
+    Build the weighted request mix for one simulated page visit.
+    
+    Args:
+        root: Project root
+        production: Map assets to their content-hashed URLs (server started with --production)
+    
+    Returns:
+        list: (URL path, weight) tuples
+    """
+    mix = [('index.html', 1.0), ('styles/main.css', 1.0), ('data/archives.json', 1.0)]
+    mix.extend((rel_path, 1.0) for rel_path in js_module_graph(root))
+    
+    # A browser picks one srcset variant per visit
+    logos = sorted(
+        f"assets/logos/{path.name}" for path in (root / 'assets' / 'logos').glob('*')
+        if LOGO_VARIANT_PATTERN.search(path.name)
+    )
+    mix.extend((rel_path, 1.0 / len(logos)) for rel_path in logos)
+    
+    mix = [(rel_path, weight) for rel_path, weight in mix if (root / rel_path).is_file()]
+    
+    manifest = AssetManifest(str(root)) if production else None
+    urls = []
+    for rel_path, weight in mix:
+        if rel_path == 'index.html':
+            url = '/'
+        elif manifest is not None and manifest.hashed_url(rel_path):
+            url = '/' + manifest.hashed_url(rel_path)
+        else:
+            url = '/' + rel_path
+        urls.append((url, weight))
+    return urls
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(latencies):
+    """Summarise latencies (seconds) as milliseconds."""
+    values = sorted(latencies)
+    if not values:
+        return {}
+    return {
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+async def fetch(reader, writer, request):
+    """
+    Send one request on an open connection and read the whole response.
+    
+    Returns:
+        tuple: (status code, body bytes, server closes the connection)
+    """
+    writer.write(request)
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    
+    body_bytes = 0
+    if request.startswith(b'HEAD ') or status in (204, 304) or status < 200:
+        pass
+    elif 'content-length' in headers:
+        body_bytes = int(headers['content-length'])
+        await reader.readexactly(body_bytes)
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            body_bytes += size
+            if size == 0:
+                break
+    else:
+        body_bytes = len(await reader.read())
+        return status, body_bytes, True
+    return status, body_bytes, headers.get('connection', '').lower() == 'close'
+
+
+async def run_client(host, port, urls, weights, measure_start, deadline, samples, counters, seed,
+                     accept_encoding):
+    """One keep-alive client issuing requests back to back until the deadline."""
+    rng = random.Random(seed)
+    requests = {
+        url: (f'GET {url} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+              f'Accept-Encoding: {accept_encoding}\r\nUser-Agent: orangeterry-bench\r\n\r\n').encode('latin-1')
+        for url in urls
+    }
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError:
+                counters['connect_errors'] += 1
+                await asyncio.sleep(0.05)
+                continue
+            counters['connections'] += 1
+        url = rng.choices(urls, weights)[0]
+        start = time.perf_counter()
+        try:
+            status, body_bytes, close = await fetch(reader, writer, requests[url])
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            counters['errors'] += 1
+            writer.close()
+            writer = None
+            continue
+        elapsed = time.perf_counter() - start
+        if start >= measure_start:
+            samples.append((url, status, elapsed, body_bytes))
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, urls, weights, connections, warmup, duration, accept_encoding):
+    """
+    Run all clients and collect per-request samples from the measured window.
+    
+    Returns:
+        tuple: (samples, counters, measured seconds)
+    """
+    samples = []
+    counters = {'connections': 0, 'errors': 0, 'connect_errors': 0}
+    now = time.perf_counter()
+    measure_start = now + warmup
+    deadline = measure_start + duration
+    await asyncio.gather(*(
+        run_client(host, port, urls, weights, measure_start, deadline, samples, counters, seed,
+                   accept_encoding)
+        for seed in range(connections)
+    ))
+    measured = max(time.perf_counter() - measure_start, 1e-9)
+    return samples, counters, measured
+
+
+def summarise(samples, counters, measured):
+    """Build the results section of the report."""
+    latencies = [elapsed for _, _, elapsed, _ in samples]
+    statuses = {}
+    per_url = {}
+    for url, status, elapsed, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        per_url.setdefault(url, []).append(elapsed)
+    total_bytes = sum(body_bytes for _, _, _, body_bytes in samples)
+    results = {
+        'requests': len(samples),
+        'duration_s': round(measured, 3),
+        'requests_per_sec': round(len(samples) / measured, 1),
+        'bytes_per_sec': round(total_bytes / measured, 1),
+        'latency': latency_summary(latencies),
+        'status_counts': statuses,
+        'client_errors': counters['errors'],
+        'connect_errors': counters['connect_errors'],
+        'connections_opened': counters['connections'],
+        'per_url': {
+            url: dict(requests=len(values), **latency_summary(values))
+            for url, values in sorted(per_url.items())
+        },
+    }
+    return results
+
+
+def process_tree(pid):
+    """Return pid and all of its descendants (Linux /proc; just pid elsewhere)."""
+    pids = [pid]
+    index = 0
+    while index < len(pids):
+        children_file = Path(f'/proc/{pids[index]}/task/{pids[index]}/children')
+        try:
+            pids.extend(int(child) for child in children_file.read_text().split())
+        except OSError:
+            pass
+        index += 1
+    return pids
+
+
+def peak_rss(pid):
+    """
+    Read the peak resident set size of a process tree from /proc (Linux).
+    
+    Returns:
+        dict: Largest single-process and summed peak RSS in bytes, or None if unavailable
+    """
+    peaks = []
+    for tree_pid in process_tree(pid):
+        try:
+            for line in Path(f'/proc/{tree_pid}/status').read_text().splitlines():
+                if line.startswith('VmHWM:'):
+                    peaks.append(int(line.split()[1]) * 1024)
+        except OSError:
+            pass
+    if not peaks:
+        return None
+    return {'peak_rss_bytes': max(peaks), 'peak_rss_total_bytes': sum(peaks), 'processes': len(peaks)}
+
+
+def children_peak_rss():
+    """Fallback peak RSS of waited-for child processes via getrusage (POSIX)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {'peak_rss_bytes': maxrss * scale, 'peak_rss_total_bytes': None, 'processes': None}
+
+
+def free_port():
+    """Ask the OS for an unused local port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host, port, process, timeout=SERVER_START_TIMEOUT):
+    """Block until the server accepts connections (or fail if it exits)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} before accepting connections")
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not accept connections within {timeout:.0f}s")
+
+
+def git_commit():
+    """Return the short commit hash of the working tree, or None."""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def serve_child(args):
+    """
+    Run the server under test (invoked by the harness as a child process).
+    
+    Builds the app the way server.py does (including the file watcher) with
+    the requested cache settings and serves it with the requested backend
+    until SIGTERM.
+    """
+    import server
+    from server_asyncio import AsyncioHTTPServer
+    from server_workers import Supervisor, create_listen_socket, serve_until_stopped
+    from waitress.server import create_server
+    
+    def make_app(worker_id=None):
+        file_cache = server.FileCache(max_bytes=args.cache_mb * 1024 * 1024)
+        return server.build_site_app(PROJECT_ROOT, args.production, file_cache=file_cache)
+    
+    def serve_worker(app, sock, should_stop):
+        if args.backend == 'asyncio':
+            return AsyncioHTTPServer(app, threads=args.threads).run(sock=sock, should_stop=should_stop)
+        options = dict(server.SERVE_OPTIONS, threads=args.threads)
+        return serve_until_stopped(create_server(app, sockets=[sock], **options), should_stop)
+    
+    if args.workers > 1:
+        supervisor = Supervisor(make_app, serve_worker, '127.0.0.1', args.port, args.workers,
+                                on_worker_exit=server.stop_site_app)
+        return supervisor.run()
+    
+    stop_requested = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_requested.append(signum))
+    app = make_app()
+    sock = create_listen_socket('127.0.0.1', args.port)
+    serve_worker(app, sock, lambda: bool(stop_requested))
+    server.stop_site_app(app)
+    return 0
+
+
+def run_benchmark(args):
+    """
+    Start the server, run the load and write the JSON report.
+    
+    Returns:
+        dict: The report
+    """
+    host = '127.0.0.1'
+    port = args.port or free_port()
+    mix = build_request_mix(PROJECT_ROOT, production=args.production)
+    urls = [url for url, _ in mix]
+    weights = [weight for _, weight in mix]
+    
+    command = [
+        sys.executable, str(Path(__file__).resolve()), '--serve-child',
+        '--port', str(port), '--backend', args.backend, '--threads', str(args.threads),
+        '--workers', str(args.workers), '--cache-mb', str(args.cache_mb),
+    ]
+    if args.production:
+        command.append('--production')
+    log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    
+    print(f"Starting {args.backend} server on {host}:{port} "
+          f"(threads={args.threads}, workers={args.workers}, cache={args.cache_mb} MB)")
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=PROJECT_ROOT)
+    rss = None
+    try:
+        wait_for_port(host, port, process)
+        print(f"Running {args.connections} keep-alive clients for {args.warmup:g}s warm-up "
+              f"+ {args.duration:g}s over {len(urls)} URLs...")
+        samples, counters, measured = asyncio.run(run_load(
+            host, port, urls, weights, args.connections, args.warmup, args.duration,
+            args.accept_encoding,
+        ))
+        rss = peak_rss(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if log is not subprocess.DEVNULL:
+            log.close()
+    if rss is None:
+        rss = children_peak_rss()
+    
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'backend': args.backend,
+            'threads': args.threads,
+            'workers': args.workers,
+            'cache_mb': args.cache_mb,
+            'production': args.production,
+            'connections': args.connections,
+            'warmup_s': args.warmup,
+            'duration_s': args.duration,
+            'accept_encoding': args.accept_encoding,
+            'request_mix': dict(mix),
+        },
+        'results': dict(summarise(samples, counters, measured), server_memory=rss),
+    }
+
+
+def default_output_path(report):
+    """Results file name: timestamp, commit and the settings being compared."""
+    config = report['config']
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    name = (f"{stamp}-{report['commit'] or 'nocommit'}-{config['backend']}-t{config['threads']}"
+            f"-w{config['workers']}-c{config['connections']}.json")
+    return RESULTS_DIR / name
+
+
+def print_report(report):
+    """Print a short human-readable summary."""
+    results = report['results']
+    latency = results['latency']
+    print()
+    print(f"Requests:      {results['requests']} in {results['duration_s']}s "
+          f"({results['requests_per_sec']} req/s, {results['bytes_per_sec'] / 1024 / 1024:.1f} MB/s)")
+    if latency:
+        print(f"Latency (ms):  p50 {latency['p50_ms']}  p95 {latency['p95_ms']}  "
+              f"p99 {latency['p99_ms']}  max {latency['max_ms']}")
+    print(f"Status codes:  {results['status_counts']}")
+    print(f"Errors:        {results['client_errors']} request, {results['connect_errors']} connect")
+    memory = results['server_memory']
+    if memory:
+        print(f"Server RSS:    peak {memory['peak_rss_bytes'] / 1024 / 1024:.1f} MB"
+              + (f" (all processes {memory['peak_rss_total_bytes'] / 1024 / 1024:.1f} MB)"
+                 if memory['peak_rss_total_bytes'] else ''))
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Load-test the static server.")
+    parser.add_argument('--backend', choices=('waitress', 'asyncio'), default='waitress',
+                        help="Server backend (default: waitress)")
+    parser.add_argument('--threads', type=int, default=4,
+                        help="Waitress threads / asyncio WSGI pool size (default: 4)")
+    parser.add_argument('--workers', type=int, default=1, help="Pre-forked worker processes (default: 1)")
+    parser.add_argument('--cache-mb', type=int, default=32, help="File cache size in MB, 0 disables it (default: 32)")
+    parser.add_argument('--production', action='store_true', help="Serve content-hashed asset URLs")
+    parser.add_argument('--connections', type=int, default=50, help="Concurrent keep-alive clients (default: 50)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Measured seconds (default: 10)")
+    parser.add_argument('--warmup', type=float, default=2.0, help="Unmeasured warm-up seconds (default: 2)")
+    parser.add_argument('--accept-encoding', default=DEFAULT_ACCEPT_ENCODING,
+                        help=f"Accept-Encoding sent by clients (default: '{DEFAULT_ACCEPT_ENCODING}')")
+    parser.add_argument('--port', type=int, default=0, help="Server port (default: a free port)")
+    parser.add_argument('--output', help="Results JSON path (default: bench/results/<timestamp>-...json)")
+    parser.add_argument('--server-log', help="Write the server's output to this file")
+    parser.add_argument('--serve-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.serve_child:
+        return serve_child(args)
+    
+    report = run_benchmark(args)
+    print_report(report)
+    
+    output = Path(args.output) if args.output else default_output_path(report)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + '\n')
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Archives File
+Reads and writes data/archives.json for the fetch scripts (and for
+server.py's scheduled scrapes, see server_scrape.py).
+
+The file is always replaced atomically: the new data is written to a
+temporary file in the same directory, given the old file's permissions and
+renamed over it, so a server or browser reading it never sees a partial file.
+"""
+
+import json
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+# Default location of the archives data
+ARCHIVES_PATH = Path(__file__).parent.parent / "data" / "archives.json"
+
+# Permissions of a newly created archives file (readable by the web server)
+NEW_FILE_MODE = 0o644
+
+
+def load_archives(path=ARCHIVES_PATH):
+    """
+    Parse an archives.json file.
+    
+    Args:
+        path: File to read
+    
+    Returns:
+        dict: The parsed data ({} if the file does not exist)
+    
+    Raises:
+        OSError, ValueError: If the file exists but cannot be read or parsed
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def read_archives(path=ARCHIVES_PATH):
+    """Read an archives.json file, returning {} if it is missing or unreadable."""
+    try:
+        return load_archives(path)
+    except Exception as e:
+        print(f"Warning: Could not read existing JSON file: {e}")
+        return {}
+
+
+def write_archives(path, data):
+    """
+    Replace an archives.json file atomically, keeping its permissions.
+    
+    Args:
+        path: File to replace
+        data: JSON-serialisable archives data
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = NEW_FILE_MODE
+    # mkstemp creates the file as 0600; it gets the old file's mode before the rename
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{path.name}-', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
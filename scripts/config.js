@@ -19,6 +19,29 @@ let configData = null;
  */
 let configError = null;
 
+/**
+ * Reads a JSON data block inlined into the page by the server (server.py --inline-data)
+ * 
+ * @param {string} id - Element id of the <script type="application/json"> block
+ * @returns {Object|null} The parsed data, or null if the page has no such block
+ * 
+ * @example
+ * const bootstrap = readBootstrap('bootstrap-events');
+ */
+export function readBootstrap(id) {
+    const element = document.getElementById(id);
+    if (!element) {
+        return null;
+    }
+
+    try {
+        return JSON.parse(element.textContent);
+    } catch (error) {
+        console.warn(`Ignoring invalid bootstrap data "${id}":`, error);
+        return null;
+    }
+}
+
 /**
  * Loads the archives.json configuration file
  * 
@@ -38,10 +61,17 @@ export async function loadConfig() {
         throw configError;
     }
 
+    // Archives inlined into the page skip the request, when they hold the whole catalogue
+    const bootstrap = readBootstrap('bootstrap-archives');
+    if (bootstrap && bootstrap.audio && bootstrap.video
+            && bootstrap.audio.next === null && bootstrap.video.next === null) {
+        configData = { audio: bootstrap.audio.items, video: bootstrap.video.items };
+        return configData;
+    }
+
     try {
-        // Add cache-busting parameter to ensure fresh data
-        const cacheBuster = `?t=${Date.now()}`;
-        const response = await fetch(`data/archives.json${cacheBuster}`);
+        // Revalidate with the server (ETag / Last-Modified) so a cached copy is reused when unchanged
+        const response = await fetch('data/archives.json', { cache: 'no-cache' });
         
         if (!response.ok) {
             throw new Error(`Failed to load configuration: ${response.status} ${response.statusText}`);
@@ -6,6 +6,8 @@
  * @module events
  */
 
+import { readBootstrap } from './config.js';
+
 /**
  * Loads events from the JSON configuration file
  * 
@@ -15,6 +17,13 @@
  * const events = await loadEvents();
  */
 export async function loadEvents() {
+    // Events inlined into the page skip the request, when none are missing (all still upcoming)
+    const bootstrap = readBootstrap('bootstrap-events');
+    if (bootstrap && bootstrap.upcoming && Array.isArray(bootstrap.upcoming.events)
+            && bootstrap.upcoming.events.length === bootstrap.count) {
+        return bootstrap.upcoming.events;
+    }
+
     try {
         const response = await fetch('data/events.json');
         
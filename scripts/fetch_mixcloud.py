@@ -19,6 +19,8 @@ from pathlib import Path
 from html.parser import HTMLParser
 from datetime import datetime
 
+from archives_io import read_archives, write_archives
+
 
 def fetch_mixcloud_user(username):
     """
@@ -46,13 +48,14 @@ def fetch_mixcloud_user(username):
         return None
 
 
-def fetch_all_uploads(username):
+def fetch_all_uploads(username, strict=False):
     """
     Fetches all uploads from a Mixcloud user profile.
     Mixcloud API uses pagination, so we need to follow 'next' links.
     
     Args:
         username: The Mixcloud username
+        strict: Raise if a page fails instead of returning the uploads fetched so far
         
     Returns:
         list: List of all upload items
@@ -77,6 +80,8 @@ def fetch_all_uploads(username):
                 
         except Exception as e:
             print(f"Error fetching uploads: {e}")
+            if strict:
+                raise
             break
     
     print(f"Total uploads fetched: {len(uploads)}")
@@ -487,20 +492,30 @@ def fetch_hearthis_tracks(username):
     return tracks
 
 
-def main():
-    """Main function to fetch data from both platforms and generate JSON."""
-    # Get usernames from command line or use defaults
-    mixcloud_username = sys.argv[1] if len(sys.argv) > 1 else "Orangeterry"
-    hearthis_username = sys.argv[2] if len(sys.argv) > 2 else None
+def fetch_audio_items(hearthis_username=None, strict=False):
+    """
+    Fetch the Orange Terry sets from Mixcloud (and optionally hearthis.at).
+    
+    merge_audio_archives() replaces the Mixcloud items with what this returns, so a
+    partial result drops sets from the archives. Unattended runs pass strict=True.
     
+    Args:
+        hearthis_username: hearthis.at profile to include (None skips hearthis.at)
+        strict: Raise RuntimeError if a Mixcloud profile or page cannot be fetched
+    
+    Returns:
+        list: Archive items from every platform (empty if nothing was found)
+    """
     all_archive_items = []
     
     # Fetch all tracks from Orangeterry profile
     print(f"\n=== Fetching Mixcloud profile: Orangeterry (all tracks) ===")
     user_data = fetch_mixcloud_user("Orangeterry")
+    if strict and not user_data:
+        raise RuntimeError("could not fetch Mixcloud profile Orangeterry")
     if user_data:
         print(f"User found: {user_data.get('name', 'Orangeterry')}")
-        uploads = fetch_all_uploads("Orangeterry")
+        uploads = fetch_all_uploads("Orangeterry", strict)
         if uploads:
             mixcloud_items = [format_archive_item(upload) for upload in uploads]
             all_archive_items.extend(mixcloud_items)
@@ -513,9 +528,11 @@ def main():
     # Fetch only "Orange Terry" sets from weekendradiocouk profile
     print(f"\n=== Fetching Mixcloud profile: weekendradiocouk (Orange Terry sets only) ===")
     user_data2 = fetch_mixcloud_user("weekendradiocouk")
+    if strict and not user_data2:
+        raise RuntimeError("could not fetch Mixcloud profile weekendradiocouk")
     if user_data2:
         print(f"User found: {user_data2.get('name', 'weekendradiocouk')}")
-        uploads2 = fetch_all_uploads("weekendradiocouk")
+        uploads2 = fetch_all_uploads("weekendradiocouk", strict)
         if uploads2:
             # Filter for only sets containing "Orange Terry" in the title (case-insensitive)
             orange_terry_uploads = [
@@ -543,33 +560,36 @@ def main():
         else:
             print("No hearthis.at tracks found.")
     
-    if not all_archive_items:
-        print("\nNo audio items found from either platform.")
-        return 1
+    return all_archive_items
+
+
+def merge_audio_archives(existing_data, all_archive_items):
+    """
+    Merge freshly fetched audio items into the existing archives data.
     
-    # Read existing JSON to preserve video entries and manually added tracks
-    output_path = Path(__file__).parent.parent / "data" / "archives.json"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    Scraped Mixcloud items replace the Orangeterry and weekendradiocouk ones;
+    Mixcloud items from other profiles, hearthis.at tracks (which may have been
+    added by hand) and the video entries are preserved.
+    
+    Args:
+        existing_data: Parsed archives.json ({} if there is none)
+        all_archive_items: Items returned by fetch_audio_items()
     
-    existing_data = {}
+    Returns:
+        dict: The new archives.json contents
+    """
     existing_hearthis_tracks = []
     existing_other_mixcloud = []
-    if output_path.exists():
-        try:
-            with open(output_path, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-                # Preserve existing hearthis tracks (they may be manually added since they load dynamically)
-                if "audio" in existing_data:
-                    existing_hearthis_tracks = [item for item in existing_data["audio"] if item.get("platform") == "hearthis"]
-                    # Preserve Mixcloud items from other profiles (not Orangeterry or weekendradiocouk)
-                    existing_other_mixcloud = [
-                        item for item in existing_data["audio"] 
-                        if item.get("platform") == "mixcloud" 
-                        and not item.get("url", "").startswith("https://www.mixcloud.com/Orangeterry/")
-                        and not item.get("url", "").startswith("https://www.mixcloud.com/weekendradiocouk/")
-                    ]
-        except Exception as e:
-            print(f"Warning: Could not read existing JSON file: {e}")
+    if "audio" in existing_data:
+        # Preserve existing hearthis tracks (they may be manually added since they load dynamically)
+        existing_hearthis_tracks = [item for item in existing_data["audio"] if item.get("platform") == "hearthis"]
+        # Preserve Mixcloud items from other profiles (not Orangeterry or weekendradiocouk)
+        existing_other_mixcloud = [
+            item for item in existing_data["audio"] 
+            if item.get("platform") == "mixcloud" 
+            and not item.get("url", "").startswith("https://www.mixcloud.com/Orangeterry/")
+            and not item.get("url", "").startswith("https://www.mixcloud.com/weekendradiocouk/")
+        ]
     
     # Ensure video is always an array (required by config.js validation)
     existing_video = existing_data.get("video", [])
@@ -590,14 +610,31 @@ def main():
     all_audio_items = new_mixcloud_items + existing_other_mixcloud + existing_hearthis_tracks
     
     # Create output structure, preserving existing video entries and manually added hearthis tracks
-    output = {
+    return {
         "audio": all_audio_items,
         "video": existing_video
     }
+
+
+def main():
+    """Main function to fetch data from both platforms and generate JSON."""
+    # Get usernames from command line or use defaults
+    mixcloud_username = sys.argv[1] if len(sys.argv) > 1 else "Orangeterry"
+    hearthis_username = sys.argv[2] if len(sys.argv) > 2 else None
+    
+    all_archive_items = fetch_audio_items(hearthis_username)
+    
+    if not all_archive_items:
+        print("\nNo audio items found from either platform.")
+        return 1
+    
+    # Read existing JSON to preserve video entries and manually added tracks
+    output_path = Path(__file__).parent.parent / "data" / "archives.json"
+    output = merge_audio_archives(read_archives(output_path), all_archive_items)
+    all_audio_items = output["audio"]
     
     # Write to JSON file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    write_archives(output_path, output)
     
     print(f"\n=== Successfully generated {output_path} ===")
     print(f"Total audio items: {len(all_audio_items)}")
@@ -612,9 +649,11 @@ def main():
         print(f"    - weekendradiocouk (Orange Terry sets): {weekendradio_count}")
     if other_mixcloud_count > 0:
         print(f"    - Other profiles: {other_mixcloud_count}")
-    print(f"  - hearthis.at: {len([i for i in all_audio_items if i['platform'] == 'hearthis'])}")
-    if existing_hearthis_tracks and not new_hearthis_tracks:
-        print(f"  Note: Preserved {len(existing_hearthis_tracks)} existing hearthis.at track(s)")
+    hearthis_items = [i for i in all_audio_items if i['platform'] == 'hearthis']
+    print(f"  - hearthis.at: {len(hearthis_items)}")
+    new_hearthis_tracks = [item for item in all_archive_items if item.get("platform") == "hearthis"]
+    if hearthis_items and not new_hearthis_tracks:
+        print(f"  Note: Preserved {len(hearthis_items)} existing hearthis.at track(s)")
     
     return 0
 
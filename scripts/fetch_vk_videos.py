@@ -35,6 +35,8 @@ from html.parser import HTMLParser
 from http.cookiejar import CookieJar
 from io import BytesIO
 
+from archives_io import read_archives, write_archives
+
 
 class VKPlaylistParser(HTMLParser):
     """HTML parser to extract video data from VK playlist page."""
@@ -903,41 +905,25 @@ def fetch_vk_playlist_with_scraper(playlist_url, username=None, password=None):
     return videos
 
 
-def main():
-    """Main function to fetch VK playlist data and generate JSON."""
-    # Parse command line arguments
-    playlist_url = "https://vkvideo.ru/playlist/512257790_1"
-    use_vk_scraper = False
-    vk_username = None
-    vk_password = None
-    video_urls = []  # For manually specified video URLs
-    
-    if len(sys.argv) > 1:
-        first_arg = sys.argv[1]
-        # Check if it's a playlist URL or a video URL
-        if '/playlist/' in first_arg and '/video' not in first_arg:
-            # It's a playlist URL (not a specific video in playlist)
-            playlist_url = first_arg
-        elif '/video' in first_arg:
-            # Treat as video URL(s) - collect all video URLs
-            video_urls.append(first_arg)
-            playlist_url = None
+# Playlist fetched when no URL is given on the command line
+DEFAULT_PLAYLIST_URL = "https://vkvideo.ru/playlist/512257790_1"
+
+
+def fetch_videos(playlist_url=DEFAULT_PLAYLIST_URL, video_urls=(), use_vk_scraper=False,
+                 vk_username=None, vk_password=None):
+    """
+    Fetch videos from a VK playlist, or from individual video URLs.
     
-    # Check for optional flags and additional video URLs
-    i = 2
-    while i < len(sys.argv):
-        if sys.argv[i] == '--use-vk-scraper':
-            use_vk_scraper = True
-        elif sys.argv[i] == '--vk-username' and i + 1 < len(sys.argv):
-            vk_username = sys.argv[i + 1]
-            i += 1
-        elif sys.argv[i] == '--vk-password' and i + 1 < len(sys.argv):
-            vk_password = sys.argv[i + 1]
-            i += 1
-        elif '/video' in sys.argv[i]:
-            video_urls.append(sys.argv[i])
-        i += 1
+    Args:
+        playlist_url: Playlist to fetch (ignored when video_urls are given)
+        video_urls: Individual video URLs to extract instead of the playlist
+        use_vk_scraper: Try vk-url-scraper before falling back to HTML parsing
+        vk_username: VK username for vk-url-scraper
+        vk_password: VK password for vk-url-scraper
     
+    Returns:
+        list: Raw video dicts (empty if nothing was found)
+    """
     print(f"\n=== Fetching VK Video Playlist ===")
     
     videos = []
@@ -981,31 +967,23 @@ def main():
             playlist_videos = fetch_vk_playlist(playlist_url)
             videos.extend(playlist_videos)
     
-        if not videos:
-            print("\nNo videos found in playlist.")
-            print("\nNote: VK playlists are often JavaScript-rendered, meaning video data")
-            print("is loaded dynamically after the page loads. Static HTML parsing may not")
-            print("capture all videos. Consider:")
-            print("  1. Using a headless browser (Selenium/Playwright) for full rendering")
-            print("  2. Manually adding videos to data/archives.json")
-            print("  3. Using VK API if available (requires authentication)")
-            return 1
-    
-    # Format videos
-    formatted_videos = [format_archive_item(video) for video in videos]
+    return videos
+
+
+def merge_video_archives(existing_data, formatted_videos):
+    """
+    Merge formatted videos into the existing archives data.
     
-    # Read existing JSON to preserve audio entries
-    output_path = Path(__file__).parent.parent / "data" / "archives.json"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    Existing videos are kept, new ones are added by key and the list is sorted
+    newest first; audio entries are preserved.
     
-    existing_data = {}
-    if output_path.exists():
-        try:
-            with open(output_path, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-        except Exception as e:
-            print(f"Warning: Could not read existing JSON file: {e}")
+    Args:
+        existing_data: Parsed archives.json ({} if there is none)
+        formatted_videos: Items from format_archive_item()
     
+    Returns:
+        dict: The new archives.json contents
+    """
     # Ensure audio is always an array (required by config.js validation)
     existing_audio = existing_data.get("audio", [])
     if not isinstance(existing_audio, list):
@@ -1029,17 +1007,71 @@ def main():
     existing_video.sort(key=lambda x: x.get('created_time', ''), reverse=True)
     
     # Create output structure, preserving existing audio entries
-    output = {
+    return {
         "audio": existing_audio,
         "video": existing_video
     }
+
+
+def main():
+    """Main function to fetch VK playlist data and generate JSON."""
+    # Parse command line arguments
+    playlist_url = DEFAULT_PLAYLIST_URL
+    use_vk_scraper = False
+    vk_username = None
+    vk_password = None
+    video_urls = []  # For manually specified video URLs
+    
+    if len(sys.argv) > 1:
+        first_arg = sys.argv[1]
+        # Check if it's a playlist URL or a video URL
+        if '/playlist/' in first_arg and '/video' not in first_arg:
+            # It's a playlist URL (not a specific video in playlist)
+            playlist_url = first_arg
+        elif '/video' in first_arg:
+            # Treat as video URL(s) - collect all video URLs
+            video_urls.append(first_arg)
+            playlist_url = None
+    
+    # Check for optional flags and additional video URLs
+    i = 2
+    while i < len(sys.argv):
+        if sys.argv[i] == '--use-vk-scraper':
+            use_vk_scraper = True
+        elif sys.argv[i] == '--vk-username' and i + 1 < len(sys.argv):
+            vk_username = sys.argv[i + 1]
+            i += 1
+        elif sys.argv[i] == '--vk-password' and i + 1 < len(sys.argv):
+            vk_password = sys.argv[i + 1]
+            i += 1
+        elif '/video' in sys.argv[i]:
+            video_urls.append(sys.argv[i])
+        i += 1
+    
+    videos = fetch_videos(playlist_url, video_urls, use_vk_scraper, vk_username, vk_password)
+    
+    if playlist_url and not video_urls and not videos:
+        print("\nNo videos found in playlist.")
+        print("\nNote: VK playlists are often JavaScript-rendered, meaning video data")
+        print("is loaded dynamically after the page loads. Static HTML parsing may not")
+        print("capture all videos. Consider:")
+        print("  1. Using a headless browser (Selenium/Playwright) for full rendering")
+        print("  2. Manually adding videos to data/archives.json")
+        print("  3. Using VK API if available (requires authentication)")
+        return 1
+    
+    # Format videos
+    formatted_videos = [format_archive_item(video) for video in videos]
+    
+    # Read existing JSON to preserve audio entries
+    output_path = Path(__file__).parent.parent / "data" / "archives.json"
+    output = merge_video_archives(read_archives(output_path), formatted_videos)
     
     # Write to JSON file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    write_archives(output_path, output)
     
     print(f"\n=== Successfully generated {output_path} ===")
-    print(f"Total video items: {len(existing_video)}")
+    print(f"Total video items: {len(output['video'])}")
     print(f"  - New videos added: {len(formatted_videos)}")
     
     return 0
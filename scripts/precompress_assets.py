@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Precompressed Asset Builder
+Writes gzip (and brotli, when available) siblings next to every compressible
+static file so server.py can serve them without compressing per request.
+
+Usage:
+    python scripts/precompress_assets.py [--force]
+
+Example:
+    python scripts/precompress_assets.py
+    # styles/main.css -> styles/main.css.gz, styles/main.css.br
+"""
+
+import gzip
+import os
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# File extensions worth compressing (text formats; images are already compressed)
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.xml', '.webmanifest'}
+
+# Directories never scanned
+SKIP_DIRS = {'.git', '__pycache__', 'node_modules', '_site', '.venv', 'venv'}
+
+# Files smaller than this gain nothing from compression
+MIN_SIZE = 256
+
+
+def gzip_compress(data):
+    """Compress bytes with gzip at maximum level (mtime fixed for reproducible output)."""
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data):
+    """Compress bytes with brotli at maximum quality."""
+    return brotli.compress(data, quality=11)
+
+
+def iter_compressible_files(root):
+    """
+    Yield every compressible file under root.
+    
+    Args:
+        root: Project root directory
+    
+    Yields:
+        Path: Source file path
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.')]
+        for filename in filenames:
+            path = Path(dirpath) / filename
+            if path.suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+                yield path
+
+
+def write_sibling(source, suffix, compress, data, force=False):
+    """
+    Write one compressed sibling of a source file if it is missing or stale.
+    
+    The sibling is only kept if it is smaller than the source; otherwise any
+    existing sibling is removed so the server falls back to the identity file.
+    
+    Args:
+        source: Source file path
+        suffix: Sibling suffix ('.gz' or '.br')
+        compress: Compression function
+        data: Source file contents
+        force: Rewrite even if the sibling is newer than the source
+    
+    Returns:
+        int: Size of the sibling in bytes, or 0 if none was kept
+    """
+    sibling = source.with_name(source.name + suffix)
+    source_mtime = source.stat().st_mtime_ns
+    
+    if not force and sibling.exists() and sibling.stat().st_mtime_ns >= source_mtime:
+        return sibling.stat().st_size
+    
+    compressed = compress(data)
+    if len(compressed) >= len(data):
+        if sibling.exists():
+            sibling.unlink()
+        return 0
+    
+    # Write atomically so a running server never sees a half-written sibling
+    tmp_path = sibling.with_name(sibling.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmp_path, sibling)
+    return len(compressed)
+
+
+def precompress(root, force=False):
+    """
+    Write compressed siblings for every compressible file under root.
+    
+    Args:
+        root: Project root directory
+        force: Rewrite siblings even if they look up to date
+    
+    Returns:
+        int: Number of source files processed
+    """
+    encoders = [('.gz', gzip_compress)]
+    if brotli is not None:
+        encoders.append(('.br', brotli_compress))
+    else:
+        print("Note: brotli not installed, writing gzip siblings only")
+        print("Install it with: pip install brotli")
+    
+    count = 0
+    for source in iter_compressible_files(root):
+        data = source.read_bytes()
+        if len(data) < MIN_SIZE:
+            continue
+        
+        results = []
+        for suffix, compress in encoders:
+            size = write_sibling(source, suffix, compress, data, force=force)
+            if size:
+                results.append(f"{suffix} {size/1024:.1f} KB")
+        
+        count += 1
+        relative = source.relative_to(root)
+        print(f"  {relative} ({len(data)/1024:.1f} KB) -> {', '.join(results) or 'not compressible'}")
+    
+    return count
+
+
+def main():
+    """Main function."""
+    project_root = Path(__file__).parent.parent.resolve()
+    force = '--force' in sys.argv[1:]
+    
+    print(f"Precompressing assets in: {project_root}")
+    count = precompress(project_root, force=force)
+    print(f"\nProcessed {count} file(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
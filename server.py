@@ -4,38 +4,1282 @@ Local Development Server using Waitress
 A stable, production-ready server with better error handling and debugging.
 
 Usage:
-    python server.py [port]
-    
+    python server.py [port] [--production]
+
+Options:
+    --production    Serve scripts/ and styles/ from content-hashed, immutable
+                    URLs (index.html is rewritten); starts headless (no
+                    banner or browser)
+    --inline-data   Inline the first archive pages and upcoming events into
+                    index.html as JSON blocks (see server_api.py)
+    --scrape-interval MINUTES
+                    Refresh data/archives.json from Mixcloud and VK every
+                    MINUTES in the background (see server_scrape.py)
+
+Health checks:
+    /__live         200 while the process is serving
+    /__ready        200 once the startup cache warm-up has finished, 503 before
+
+Data:
+    /api/archives, /api/events, /api/events/upcoming   JSON pages (see server_api.py)
+    /__events       Server-Sent Events stream of data changes (see server_events.py)
+
 Requirements:
     pip install waitress
 """
 
-import webbrowser
+import time
+
+# Reference point for the startup timings reported once the server is ready
+STARTUP_BEGAN = time.perf_counter()
+
+import argparse
 import sys
 import os
+import posixpath
+import stat
+import hashlib
+import gzip
+import secrets
+import threading
 import traceback
-import time
+import signal
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from waitress import serve
+from wsgiref.util import FileWrapper
+from waitress.server import create_server
 import mimetypes
 
+from server_assets import AssetManifest
+from server_watch import SKIP_DIRS, FileWatcher
+from server_metrics import (CACHE_ENVIRON_KEY, ROUTE_ENVIRON_KEY, ServerMetrics, access_log_collector,
+                            asyncio_collector, cache_collector, event_stream_collector, scrape_collector,
+                            trace_collector, waitress_collector)
+from server_trace import NULL_TRACE, TRACE_ENVIRON_KEY, RequestTracer
+from server_preload import preload_paths
+from server_api import (ARCHIVES_PATH, EVENTS_PATH, ArchiveIndex, EventIndex, bootstrap_blocks, inject_bootstrap,
+                        json_bytes)
+from server_events import ChangeFeed, with_event_stream
+
 # Default port
 DEFAULT_PORT = 8000
 
-def create_static_file_app(directory):
+# Health check endpoints for orchestrators (answered before any metrics or file lookup)
+LIVE_PATH = '/__live'
+READY_PATH = '/__ready'
+
+# Waitress settings shared by the single-process server and every pre-forked worker
+SERVE_OPTIONS = {
+    'threads': 4,  # Use multiple threads for better concurrency
+    'channel_timeout': 120,  # Timeout for connections
+    'cleanup_interval': 30,  # Cleanup interval
+    'asyncore_use_poll': True,  # Better for Windows
+}
+
+# HTTP server backends selectable with --backend
+SERVER_BACKENDS = ('waitress', 'asyncio')
+
+# In-memory file cache limits
+DEFAULT_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Total bytes held across all entries
+DEFAULT_CACHE_MAX_ENTRY_BYTES = 2 * 1024 * 1024  # Larger files are read from disk each time
+
+# How often the route table rescans the served directory for changes (seconds)
+DEFAULT_ROUTE_REFRESH_INTERVAL = 2.0
+
+# Chunk size used when streaming file contents from disk
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Requests asking for more byte ranges than this are answered with the whole file
+MAX_RANGES = 16
+
+# Browsers may store responses but must revalidate them (ETag / Last-Modified) before reuse
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Content-hashed asset URLs (production mode) never change, so they can be cached for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Serialised API pages kept per route and data version (more distinct queries start a new set)
+MAX_API_ENTRIES = 1024
+
+# Precompressed siblings (written by scripts/precompress_assets.py), in server preference order
+PRECOMPRESSED_ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+# Content types that are negotiated against precompressed siblings and sent with Vary
+COMPRESSIBLE_TYPES = frozenset({
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+    'application/javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/xml',
+    'image/svg+xml',
+})
+
+# On-the-fly gzip for compressible files that have no precompressed sibling
+DEFAULT_COMPRESS_MIN_SIZE = 1024  # Smaller bodies are not worth a Content-Encoding
+DEFAULT_COMPRESS_MAX_BYTES = 8 * 1024 * 1024  # Total bytes of compressed variants kept
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Headers sent with every file response
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', '*'),
+)
+
+
+def make_etag(data):
+    """
+    Build a strong ETag from file contents.
+    
+    Args:
+        data: File contents as bytes
+    
+    Returns:
+        str: Quoted ETag value
+    """
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def make_stat_etag(mtime_ns, size):
+    """
+    Build a strong ETag from file metadata, for files too large to hash per version.
+    
+    Args:
+        mtime_ns: Modification time of the file in nanoseconds
+        size: Size of the file in bytes
+    
+    Returns:
+        str: Quoted ETag value
+    """
+    return f'"{mtime_ns:x}-{size:x}"'
+
+
+def http_date(timestamp):
+    """Format a POSIX timestamp as an HTTP-date (RFC 7231)."""
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(environ, etag, mtime):
+    """
+    Evaluate conditional GET headers against the current file version.
+    
+    If-None-Match takes precedence; If-Modified-Since is only consulted when
+    the client sent no If-None-Match header (RFC 7232, section 6).
+    
+    Args:
+        environ: WSGI environ dict
+        etag: Current quoted ETag of the file
+        mtime: Current modification time of the file (POSIX timestamp)
+    
+    Returns:
+        bool: True if a 304 Not Modified response should be sent
+    """
+    if environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD'):
+        return False
+    
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        # Weak comparison: W/"x" matches "x"
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            if candidate == etag:
+                return True
+        return False
+    
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        # HTTP dates have one-second resolution
+        return int(mtime) <= since
+    
+    return False
+
+
+def acceptable_encodings(accept_encoding, codings):
+    """
+    Pick the content codings a client accepts, best first.
+    
+    Args:
+        accept_encoding: Value of the Accept-Encoding header, or None
+        codings: Codings the server can offer, in server preference order
+    
+    Returns:
+        list: Accepted codings ordered by q-value, ties broken by server preference
+    """
+    if not accept_encoding:
+        return []
+    
+    qvalues = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    
+    if 'gzip' not in qvalues and 'x-gzip' in qvalues:
+        qvalues['gzip'] = qvalues['x-gzip']
+    
+    accepted = []
+    for coding in codings:
+        q = qvalues.get(coding, qvalues.get('*', 0.0))
+        if q > 0:
+            accepted.append((q, coding))
+    # sort() is stable, so equal q-values keep server preference order
+    accepted.sort(key=lambda item: -item[0])
+    return [coding for _, coding in accepted]
+
+
+def if_range_matches(environ, etag, mtime):
+    """
+    Check an If-Range precondition; a Range header is only honoured if it holds.
+    
+    Args:
+        environ: WSGI environ dict
+        etag: Current quoted ETag of the file
+        mtime: Current modification time of the file (POSIX timestamp)
+    
+    Returns:
+        bool: True if there is no If-Range header or it matches the current version
+    """
+    if_range = environ.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Strong comparison only: weak validators never match
+        return if_range == etag
+    try:
+        return int(mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+
+
+def parse_range_header(header, size):
+    """
+    Parse a Range request header (RFC 7233) against a file size.
+    
+    Args:
+        header: Value of the Range header, or None
+        size: Size of the file in bytes
+    
+    Returns:
+        None if the header is absent, malformed or asks for too many ranges (serve the
+        whole file); an empty list if no range is satisfiable (416); otherwise a list
+        of inclusive (start, end) byte offsets
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        first = first.strip()
+        last = last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            if not last:
+                return None
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append((max(size - suffix, 0), size - 1))
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= size:
+                continue
+            end = int(last) if last else size - 1
+            ranges.append((start, min(end, size - 1)))
+    
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def iter_file_range(file_path, start, end, chunk_size=FILE_CHUNK_SIZE):
+    """
+    Stream an inclusive byte window of a file from disk.
+    
+    Args:
+        file_path: Path of the file to read
+        start: First byte offset
+        end: Last byte offset (inclusive)
+        chunk_size: Maximum size of each yielded chunk
+    
+    Yields:
+        bytes: Consecutive chunks of the requested window
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class CachedFile:
+    """
+    A cached static file: its contents plus the response headers built for it.
+    
+    The mtime and size of the file at load time are kept so the entry can be
+    revalidated against a fresh os.stat() result without re-reading the file.
+    The ETag is computed once when the entry is built. Files too large to hold
+    in memory get a metadata-only entry (data is None) and are streamed from disk.
+    """
+    
+    __slots__ = ('data', 'headers', 'mtime_ns', 'size', 'etag', 'validator_headers',
+                 'content_type', 'content_encoding', 'cache_control')
+    
+    def __init__(self, data, headers, mtime_ns, size, etag, validator_headers, content_type,
+                 content_encoding=None, cache_control=REVALIDATE_CACHE_CONTROL):
+        self.data = data
+        self.headers = headers
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = etag
+        self.validator_headers = validator_headers
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.cache_control = cache_control
+    
+    @property
+    def nbytes(self):
+        """Number of bytes this entry holds in memory."""
+        return len(self.data) if self.data is not None else 0
+    
+    def matches(self, mtime_ns, size):
+        """Return True if the entry was loaded from the file version with this mtime and size."""
+        return self.mtime_ns == mtime_ns and self.size == size
+
+
+def build_file_entry(data, mtime_ns, size, etag, content_type, content_encoding=None,
+                     cache_control=REVALIDATE_CACHE_CONTROL):
+    """
+    Build a CachedFile with its precomputed response headers.
+    
+    Args:
+        data: File contents, or None for files streamed from disk
+        mtime_ns: Modification time of the file in nanoseconds
+        size: Size of the response body in bytes
+        etag: Quoted ETag value
+        content_type: MIME type of the (decoded) content
+        content_encoding: Content-Encoding of the body, or None for identity
+        cache_control: Cache-Control header value
+    
+    Returns:
+        CachedFile: The new entry
+    """
+    validator_headers = (
+        ('ETag', etag),
+        ('Last-Modified', http_date(mtime_ns / 1e9)),
+        ('Cache-Control', cache_control),
+    ) + CORS_HEADERS
+    if content_type in COMPRESSIBLE_TYPES:
+        # The response body depends on Accept-Encoding, even for the identity file
+        validator_headers += (('Vary', 'Accept-Encoding'),)
+    headers = (
+        ('Content-Type', content_type),
+        ('Content-Length', str(size)),
+        ('Accept-Ranges', 'bytes'),
+    )
+    if content_encoding:
+        headers += (('Content-Encoding', content_encoding),)
+    headers += validator_headers
+    return CachedFile(data, headers, mtime_ns, size, etag, validator_headers,
+                      content_type, content_encoding, cache_control)
+
+
+class _Load:
+    """A FileCache load in progress, shared by the requests that missed on the same file version."""
+    
+    __slots__ = ('done', 'entry', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class FileCache:
+    """
+    Bounded, thread-safe LRU cache of static files keyed by resolved path.
+    
+    Entries are revalidated by mtime and size on every lookup and evicted
+    least-recently-used first once the total cached bytes exceed max_bytes.
+    Files larger than max_entry_bytes are never cached.
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_CACHE_MAX_BYTES, max_entry_bytes=DEFAULT_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = OrderedDict()
+        self._loading = {}  # (file_path, mtime_ns, size) -> _Load in progress
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+    
+    def get(self, file_path, mtime_ns, size):
+        """
+        Look up a cached file.
+        
+        Args:
+            file_path: Resolved absolute path of the file
+            mtime_ns: Current modification time of the file in nanoseconds
+            size: Current size of the file in bytes
+        
+        Returns:
+            CachedFile if a valid entry exists, otherwise None
+        """
+        with self._lock:
+            cached = self._entries.get(file_path)
+            if cached is not None:
+                version, entry = cached
+                if version == (mtime_ns, size):
+                    self._entries.move_to_end(file_path)
+                    self.hits += 1
+                    return entry
+                # Stale entry: the file changed on disk since it was cached
+                self._remove(file_path)
+            self.misses += 1
+            return None
+    
+    def get_or_load(self, file_path, mtime_ns, size, load):
+        """
+        Look up a cached file, loading it on a miss (single-flight).
+        
+        Concurrent misses for the same file version wait for the first
+        caller's load() and share its entry (or its exception), so a burst of
+        requests for a new file costs one read, hash and header build.
+        
+        Args:
+            file_path: Resolved absolute path of the file
+            mtime_ns: Current modification time of the file in nanoseconds
+            size: Current size of the file in bytes
+            load: Callable returning the CachedFile for this version
+        
+        Returns:
+            tuple: (CachedFile, outcome), outcome being 'hit', 'miss' (loaded here),
+                'stream' (loaded, too large to cache) or 'coalesced' (loaded by another thread)
+        """
+        key = (file_path, mtime_ns, size)
+        with self._lock:
+            cached = self._entries.get(file_path)
+            if cached is not None:
+                version, entry = cached
+                if version == (mtime_ns, size):
+                    self._entries.move_to_end(file_path)
+                    self.hits += 1
+                    return entry, 'hit'
+                self._remove(file_path)
+            self.misses += 1
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = _Load()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        
+        if not leader:
+            loading.done.wait()
+            if loading.error is not None:
+                raise loading.error
+            return loading.entry, 'coalesced'
+        
+        try:
+            entry = load()
+            # Keyed on the version asked for, which may be older than the one read if the
+            # file changed since it was stat()ed, so later lookups with it still hit
+            self.put(file_path, entry, (mtime_ns, size))
+            loading.entry = entry
+        except BaseException as e:
+            loading.error = e
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.done.set()
+        return entry, 'miss' if entry.data is not None else 'stream'
+    
+    def put(self, file_path, entry, version=None):
+        """
+        Store an entry, evicting least-recently-used entries to stay in budget.
+        
+        Args:
+            file_path: Resolved absolute path of the file
+            entry: CachedFile to store
+            version: (mtime_ns, size) that lookups must pass to hit this entry;
+                defaults to the entry's own mtime and size
+        
+        Returns:
+            bool: True if the entry was cached, False if it is too large
+        """
+        if entry.nbytes > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if file_path in self._entries:
+                self._remove(file_path)
+            if version is None:
+                version = (entry.mtime_ns, entry.size)
+            self._entries[file_path] = (version, entry)
+            self.current_bytes += entry.nbytes
+            while self.current_bytes > self.max_bytes:
+                oldest_path = next(iter(self._entries))
+                self._remove(oldest_path)
+                self.evictions += 1
+        return True
+    
+    def invalidate(self, file_path=None):
+        """Drop one entry, or every entry if file_path is None; return True if anything was dropped."""
+        with self._lock:
+            if file_path is None:
+                dropped = bool(self._entries)
+                self._entries.clear()
+                self.current_bytes = 0
+                return dropped
+            if file_path in self._entries:
+                self._remove(file_path)
+                return True
+            return False
+    
+    def stats(self):
+        """
+        Get cache counters.
+        
+        Returns:
+            dict: Entry count, byte usage and hit/miss/eviction counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+            }
+    
+    def _remove(self, file_path):
+        # Caller must hold self._lock
+        _, entry = self._entries.pop(file_path)
+        self.current_bytes -= entry.nbytes
+
+
+class Route:
+    """Everything needed to serve one URL path, captured when the route table was built."""
+    
+    __slots__ = ('file_path', 'content_type', 'size', 'mtime_ns', 'etag')
+    
+    def __init__(self, file_path, content_type, size, mtime_ns, etag):
+        self.file_path = file_path
+        self.content_type = content_type
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = etag
+
+
+class RouteTable:
+    """
+    Immutable in-memory map of URL path -> Route for every servable file.
+    
+    Request handling is a single dict lookup; paths that are not in the table
+    are answered 404 without touching the disk. The table is rebuilt off the
+    request path (at most every refresh_interval seconds, on a background
+    thread) and swapped in atomically, so readers always see a complete
+    snapshot. Unchanged files keep their previous Route, so only new or
+    modified files are re-hashed.
+    """
+    
+    def __init__(self, directory, refresh_interval=DEFAULT_ROUTE_REFRESH_INTERVAL,
+                 max_hash_bytes=DEFAULT_CACHE_MAX_ENTRY_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.refresh_interval = refresh_interval
+        self.max_hash_bytes = max_hash_bytes
+        self.routes = {}
+        self.built_at = 0.0
+        self.rebuilds = 0
+        self._rebuild_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.rebuild()
+    
+    def lookup(self, url_path):
+        """
+        Find the route for a URL path.
+        
+        Args:
+            url_path: Request path without the leading slash
+        
+        Returns:
+            Route or None
+        """
+        if (self.refresh_interval is not None
+                and time.monotonic() - self.built_at >= self.refresh_interval):
+            self.refresh_in_background()
+        return self.routes.get(url_path)
+    
+    def refresh_in_background(self):
+        """Start a background rebuild unless one is already running."""
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        
+        def run():
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"[ERROR] Route table rebuild failed: {type(e).__name__}: {e}")
+            finally:
+                self._refresh_lock.release()
+        
+        threading.Thread(target=run, name='route-table-refresh', daemon=True).start()
+    
+    def rebuild(self):
+        """Rescan the directory and atomically swap in the new table."""
+        with self._rebuild_lock:
+            previous = self.routes
+            routes = {}
+            for url_path, file_path, st in self._scan():
+                route = previous.get(url_path)
+                if route is None or not (route.mtime_ns == st.st_mtime_ns and route.size == st.st_size):
+                    route = self._make_route(file_path, st)
+                    if route is None:
+                        continue
+                routes[url_path] = route
+            self.routes = routes
+            self.built_at = time.monotonic()
+            self.rebuilds += 1
+    
+    def update(self, url_paths):
+        """
+        Refresh the routes for specific URL paths and atomically swap in the result.
+        
+        Args:
+            url_paths: Iterable of URL paths (relative, POSIX separators) that changed
+        
+        Returns:
+            int: Number of routes added, replaced or removed
+        """
+        with self._rebuild_lock:
+            routes = dict(self.routes)
+            changed = 0
+            for url_path in url_paths:
+                file_path = os.path.join(self.directory, *url_path.split('/'))
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    st = None
+                if st is None or not stat.S_ISREG(st.st_mode):
+                    if routes.pop(url_path, None) is not None:
+                        changed += 1
+                    continue
+                route = routes.get(url_path)
+                if route is not None and route.mtime_ns == st.st_mtime_ns and route.size == st.st_size:
+                    continue
+                route = self._make_route(file_path, st)
+                if route is None:
+                    if routes.pop(url_path, None) is not None:
+                        changed += 1
+                    continue
+                routes[url_path] = route
+                changed += 1
+            self.routes = routes
+            self.built_at = time.monotonic()
+            return changed
+    
+    def stats(self):
+        """
+        Get route table counters.
+        
+        Returns:
+            dict: Route count, rebuild count and age of the current snapshot
+        """
+        return {
+            'routes': len(self.routes),
+            'rebuilds': self.rebuilds,
+            'age_seconds': time.monotonic() - self.built_at,
+        }
+    
+    def _make_route(self, file_path, st):
+        """Build a Route, hashing the file contents if it is small enough to cache."""
+        content_type, _ = mimetypes.guess_type(file_path)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        if st.st_size > self.max_hash_bytes:
+            return Route(file_path, content_type, st.st_size, st.st_mtime_ns,
+                         make_stat_etag(st.st_mtime_ns, st.st_size))
+        try:
+            with open(file_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                data = f.read()
+        except OSError:
+            # Removed or unreadable since the scan
+            return None
+        return Route(file_path, content_type, len(data), st.st_mtime_ns, make_etag(data))
+    
+    def _scan(self):
+        """Yield (url path, absolute path, stat) for every regular file under the directory."""
+        pending = [(self.directory, '')]
+        while pending:
+            dir_path, prefix = pending.pop()
+            try:
+                entries = list(os.scandir(dir_path))
+            except OSError:
+                continue
+            for dir_entry in entries:
+                # Hidden files and directories (.git, .env, ...) and server output (logs/ ...) are never served
+                if dir_entry.name.startswith('.'):
+                    continue
+                try:
+                    if dir_entry.is_dir():
+                        if dir_entry.name not in SKIP_DIRS:
+                            pending.append((dir_entry.path, prefix + dir_entry.name + '/'))
+                    elif dir_entry.is_file():
+                        yield prefix + dir_entry.name, dir_entry.path, dir_entry.stat()
+                except OSError:
+                    continue
+
+
+class DynamicCompressor:
+    """
+    Gzips cached files on demand and keeps one compressed variant per file version.
+    
+    Compression runs on a background executor: a request that finds no variant
+    schedules one and is answered with the identity body, so a burst of first
+    hits never blocks server worker threads on zlib. Variants are keyed by path
+    and remembered together with the ETag of the file version they were made
+    from, so each version is compressed exactly once.
+    """
+    
+    def __init__(self, min_size=DEFAULT_COMPRESS_MIN_SIZE, max_bytes=DEFAULT_COMPRESS_MAX_BYTES,
+                 level=DEFAULT_COMPRESS_LEVEL, content_types=COMPRESSIBLE_TYPES, max_workers=1):
+        self.min_size = min_size
+        self.max_bytes = max_bytes
+        self.level = level
+        self.content_types = frozenset(content_types)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compress')
+        self._variants = OrderedDict()  # file_path -> (source ETag, CachedFile)
+        self._pending = set()  # (file_path, source ETag) currently being compressed
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.compressions = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+    
+    def eligible(self, entry):
+        """Return True if an entry is worth compressing on the fly."""
+        return (entry.data is not None
+                and entry.content_encoding is None
+                and entry.content_type in self.content_types
+                and entry.size >= self.min_size)
+    
+    def get_variant(self, file_path, entry):
+        """
+        Look up the gzip variant of a cached file version.
+        
+        If there is none yet, compression is scheduled in the background.
+        
+        Args:
+            file_path: Resolved absolute path of the file
+            entry: Identity CachedFile for the current file version
+        
+        Returns:
+            CachedFile: The gzip variant, or None if it is not ready
+        """
+        key = (file_path, entry.etag)
+        with self._lock:
+            cached = self._variants.get(file_path)
+            if cached is not None:
+                if cached[0] == entry.etag:
+                    self._variants.move_to_end(file_path)
+                    self.hits += 1
+                    return cached[1]
+                # Variant of an older version of the file
+                self._remove(file_path)
+            self.misses += 1
+            if key in self._pending:
+                return None
+            self._pending.add(key)
+        self._executor.submit(self._compress, file_path, entry)
+        return None
+    
+    def precompress(self, file_path, entry):
+        """
+        Compress a file version on the calling thread (startup warm-up).
+        
+        Does nothing if the entry is not eligible or its variant is already
+        stored or being compressed.
+        
+        Returns:
+            bool: True if a variant was compressed
+        """
+        if not self.eligible(entry):
+            return False
+        key = (file_path, entry.etag)
+        with self._lock:
+            cached = self._variants.get(file_path)
+            if (cached is not None and cached[0] == entry.etag) or key in self._pending:
+                return False
+            self._pending.add(key)
+        self._compress(file_path, entry)
+        return True
+    
+    def _compress(self, file_path, entry):
+        """Compress one file version and store the variant (runs on the executor)."""
+        key = (file_path, entry.etag)
+        try:
+            compressed = gzip.compress(entry.data, compresslevel=self.level, mtime=0)
+            if len(compressed) >= entry.size:
+                # Not worth it: store the identity entry so it is not retried
+                variant = entry
+            else:
+                # Derive the variant ETag from the source ETag so it tracks the file version
+                etag = entry.etag[:-1] + '-gzip"'
+                variant = build_file_entry(compressed, entry.mtime_ns, len(compressed), etag,
+                                           entry.content_type, 'gzip', entry.cache_control)
+            with self._lock:
+                if file_path in self._variants:
+                    self._remove(file_path)
+                self._variants[file_path] = (entry.etag, variant)
+                self.current_bytes += variant.nbytes
+                while self.current_bytes > self.max_bytes and self._variants:
+                    self._remove(next(iter(self._variants)))
+                self.compressions += 1
+                self.bytes_in += entry.size
+                self.bytes_out += variant.size
+        except Exception as e:
+            print(f"[ERROR] Compression failed for {file_path}: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+    
+    def invalidate(self, file_path=None):
+        """Drop one variant, or every variant if file_path is None; return True if anything was dropped."""
+        with self._lock:
+            if file_path is None:
+                dropped = bool(self._variants)
+                self._variants.clear()
+                self.current_bytes = 0
+                return dropped
+            if file_path in self._variants:
+                self._remove(file_path)
+                return True
+            return False
+    
+    def stats(self):
+        """
+        Get compressor counters.
+        
+        Returns:
+            dict: Variant count, byte usage, hit/miss counts and compression totals
+        """
+        with self._lock:
+            return {
+                'variants': len(self._variants),
+                'bytes': self.current_bytes,
+                'pending': len(self._pending),
+                'hits': self.hits,
+                'misses': self.misses,
+                'compressions': self.compressions,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+            }
+    
+    def shutdown(self):
+        """Stop the background executor."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _remove(self, file_path):
+        # Caller must hold self._lock
+        _, variant = self._variants.pop(file_path)
+        self.current_bytes -= variant.nbytes
+
+
+def create_static_file_app(directory, file_cache=None, compressor=None, manifest=None, route_table=None,
+                            metrics=None, access_log=None, profiler=None, tracer=None, ready=None,
+                            archive_index=None, event_index=None, inline_data=False, change_feed=None):
     """
     Create a WSGI application for serving static files.
     
     Args:
         directory: Directory to serve files from
-        
+        file_cache: Optional FileCache instance (a default-sized one is created if omitted)
+        compressor: Optional DynamicCompressor for on-the-fly gzip (a default one is created if omitted)
+        manifest: Optional server_assets.AssetManifest; when given (production mode), assets are
+            served from content-hashed immutable URLs and index.html references them
+        route_table: Optional RouteTable for the directory (one is built if omitted)
+        metrics: Optional server_metrics.ServerMetrics; when given, requests are recorded
+            and /__metrics is served
+        access_log: Optional server_log.AccessLog (started); when given, every request and
+            request-path error is queued to it instead of printed (implies metrics)
+        profiler: Optional server_profile.RequestProfiler (started); sampled requests run
+            under cProfile
+        tracer: Optional server_trace.RequestTracer (started); request pipeline stages are
+            timed into per-stage histograms (served at /__metrics when metrics are enabled)
+        ready: Optional threading.Event; /__ready answers 503 until it is set (the app is
+            ready at once if omitted). /__live always answers 200.
+        archive_index: Optional server_api.ArchiveIndex; when given, /api/archives serves
+            pages of it
+        event_index: Optional server_api.EventIndex; when given, /api/events and
+            /api/events/upcoming serve it
+        inline_data: Serve index.html with the first archive pages and upcoming events
+            inlined as JSON blocks (server_api.bootstrap_blocks)
+        change_feed: Optional server_events.ChangeFeed (started); when given, /__events
+            streams data changes to clients
+    
     Returns:
-        WSGI application function
+        WSGI application function (the caches are available as application.file_cache,
+        application.compressor and application.route_table)
     """
     abs_directory = os.path.abspath(directory)
+    if file_cache is None:
+        file_cache = FileCache()
+    if compressor is None:
+        compressor = DynamicCompressor()
+    if route_table is None:
+        route_table = RouteTable(abs_directory, max_hash_bytes=file_cache.max_entry_bytes)
+    if ready is None:
+        ready = threading.Event()
+        ready.set()
+    if access_log is not None and metrics is None:
+        metrics = ServerMetrics()
+    
+    def report_error(message, environ, exc_info=False):
+        """Send a request-path error to the access log, or print it if there is none."""
+        if access_log is not None:
+            access_log.error(message, environ, exc_info)
+        else:
+            print(f"[ERROR] {message}")
+            if exc_info:
+                traceback.print_exc()
+    
+    def load_file(file_path, mtime_ns, size, content_type, content_encoding=None, etag=None):
+        """
+        Build the cache entry for a file version, including ETag and headers.
+        
+        Precompressed siblings pass the identity file's content type and their
+        coding, so the entry is served as that type with Content-Encoding set.
+        An ETag already computed by the route table is reused when the file
+        read is the version it was computed for.
+        """
+        if size > file_cache.max_entry_bytes:
+            # Too large to keep in memory: describe it from metadata and stream on demand
+            return build_file_entry(None, mtime_ns, size, etag or make_stat_etag(mtime_ns, size),
+                                    content_type, content_encoding)
+        
+        with open(file_path, 'rb') as f:
+            # Stat the open file so the entry's mtime/size match the bytes we read
+            st = os.fstat(f.fileno())
+            file_data = f.read()
+        if etag is None or not (st.st_mtime_ns == mtime_ns and len(file_data) == size):
+            etag = make_etag(file_data)
+        return build_file_entry(file_data, st.st_mtime_ns, len(file_data), etag,
+                                content_type, content_encoding)
+    
+    def get_entry(route, content_type=None, content_encoding=None, environ=None):
+        """Return the cached entry for a route, loading it on a miss (outcome noted in environ)."""
+        entry, outcome = file_cache.get_or_load(
+            route.file_path, route.mtime_ns, route.size,
+            lambda: load_file(route.file_path, route.mtime_ns, route.size,
+                              content_type or route.content_type, content_encoding, route.etag))
+        if environ is not None:
+            environ[CACHE_ENVIRON_KEY] = outcome
+        return entry
+    
+    def find_precompressed(codings, url_path, entry):
+        """
+        Find the best precompressed sibling among the codings the client accepts.
+        
+        Siblings older than the identity file are ignored as stale.
+        
+        Returns:
+            tuple: (sibling path, sibling entry), or (None, None) if there is none
+        """
+        suffixes = dict(PRECOMPRESSED_ENCODINGS)
+        for coding in codings:
+            sibling = route_table.routes.get(url_path + suffixes[coding])
+            if sibling is None or sibling.mtime_ns < entry.mtime_ns:
+                continue
+            return sibling.file_path, get_entry(sibling, entry.content_type, coding)
+        return None, None
+    
+    # Entries for content-hashed URLs, rebuilt lazily after each manifest build
+    hashed_entries = {}
+    hashed_entries_build = [None]
+    
+    def get_hashed_entry(key, build_entry):
+        """Return the memoised entry for a hashed asset or the rendered entry point."""
+        if hashed_entries_build[0] != manifest.builds:
+            hashed_entries.clear()
+            hashed_entries_build[0] = manifest.builds
+        entry = hashed_entries.get(key)
+        if entry is None:
+            entry = hashed_entries[key] = build_entry()
+        return entry
+    
+    # JSON API routes (request path -> server_api index)
+    data_indexes = [index for index in (archive_index, event_index) if index is not None]
+    api_routes = {route: index for index in data_indexes for route in index.routes}
+    
+    # Serialised API pages: route -> (data version, {normalised query: CachedFile})
+    api_entries = {}
+    
+    def get_api_entry(route, index, environ):
+        """
+        Return the memoised entry for an API page, rendering it on a miss.
+        
+        Returns:
+            tuple: (cache key, CachedFile)
+        
+        Raises:
+            ValueError: If the query string is invalid
+        """
+        if index.check_on_request:
+            index.refresh_if_stale()
+        snapshot = index.snapshot
+        query = index.parse_query(route, environ.get('QUERY_STRING', ''))
+        version, entries = api_entries.get(route, (None, None))
+        if version != snapshot.version or len(entries) >= MAX_API_ENTRIES:
+            # New data version (or too many distinct queries): start a new set for the route
+            entries = {}
+            api_entries[route] = (snapshot.version, entries)
+        entry = entries.get(query)
+        environ[CACHE_ENVIRON_KEY] = 'hit' if entry is not None else 'miss'
+        if entry is None:
+            body = index.render(query, snapshot)
+            entry = entries[query] = build_file_entry(body, snapshot.mtime_ns, len(body), make_etag(body),
+                                                      'application/json')
+        return f"api:{route}?{query}", entry
+    
+    # index.html with the bootstrap data inlined, for one page, data and date version
+    entry_point = manifest.entry_point if manifest is not None else 'index.html'
+    bootstrapped = [(None, None)]
+    
+    def bootstrap_entry(entry):
+        """
+        Return the entry point with the bootstrap data blocks inlined.
+        
+        The page is re-rendered only when the entry point, a data file or the
+        date (for the upcoming events) changes.
+        
+        Returns:
+            tuple: (cache key, CachedFile)
+        """
+        if entry.data is None:
+            return None, entry
+        for index in data_indexes:
+            if index.check_on_request:
+                index.refresh_if_stale()
+        today = date.today().isoformat()
+        version = (entry.etag, today) + tuple(index.snapshot.version for index in data_indexes)
+        cached_version, cached_entry = bootstrapped[0]
+        if cached_version != version:
+            html = inject_bootstrap(entry.data, bootstrap_blocks(archive_index, event_index, today))
+            mtime_ns = max([entry.mtime_ns] + [index.snapshot.mtime_ns for index in data_indexes])
+            cached_entry = build_file_entry(html, mtime_ns, len(html), make_etag(html), entry.content_type)
+            bootstrapped[0] = (version, cached_entry)
+        return 'bootstrap:' + entry_point, cached_entry
+    
+    def find_hashed(path):
+        """
+        Resolve a request path against the asset manifest.
+        
+        Returns:
+            tuple: (cache key, CachedFile), or (None, None) if the path is not a hashed asset
+        """
+        if path == manifest.entry_point:
+            # The entry point stays revalidating; re-render it if any asset changed
+            if manifest.check_on_request:
+                manifest.refresh_if_stale()
+            if manifest.index_html is None:
+                return None, None
+            html, mtime_ns = manifest.index_html
+            return 'manifest:' + path, get_hashed_entry(path, lambda: build_file_entry(
+                html, mtime_ns, len(html), make_etag(html), 'text/html'))
+        
+        asset = manifest.lookup(path)
+        if asset is None:
+            return None, None
+        
+        def build_entry():
+            content_type, _ = mimetypes.guess_type(asset.rel_path)
+            return build_file_entry(asset.data, asset.mtime_ns, len(asset.data), f'"{asset.digest}"',
+                                    content_type or 'application/octet-stream',
+                                    cache_control=IMMUTABLE_CACHE_CONTROL)
+        return 'manifest:' + path, get_hashed_entry(path, build_entry)
+    
+    def negotiate(environ, file_path, entry, url_path=None):
+        """
+        Swap in a compressed representation of an entry the client accepts.
+        
+        A precompressed sibling of url_path (if given) is preferred, then an
+        on-the-fly gzip variant. Ranges always apply to the identity representation.
+        
+        Returns:
+            tuple: (file path, entry) to send
+        """
+        if entry.content_type not in COMPRESSIBLE_TYPES or 'HTTP_RANGE' in environ:
+            return file_path, entry
+        codings = acceptable_encodings(
+            environ.get('HTTP_ACCEPT_ENCODING'),
+            [coding for coding, _ in PRECOMPRESSED_ENCODINGS],
+        )
+        if url_path is not None:
+            sibling_path, sibling_entry = find_precompressed(codings, url_path, entry)
+            if sibling_entry is not None:
+                return sibling_path, sibling_entry
+        if 'gzip' in codings and compressor.eligible(entry):
+            entry = compressor.get_variant(file_path, entry) or entry
+        return file_path, entry
+    
+    def respond(environ, start_response, file_path, entry):
+        """Send an entry, honouring conditional and range headers."""
+        # Conditional GET: answer with headers only if the client copy is current
+        if is_not_modified(environ, entry.etag, entry.mtime_ns / 1e9):
+            start_response('304 Not Modified', list(entry.validator_headers))
+            return [b'']
+        
+        # Byte ranges (only honoured for GET/HEAD and when If-Range still holds)
+        ranges = None
+        if (environ.get('REQUEST_METHOD', 'GET') in ('GET', 'HEAD')
+                and if_range_matches(environ, entry.etag, entry.mtime_ns / 1e9)):
+            ranges = parse_range_header(environ.get('HTTP_RANGE'), entry.size)
+        if ranges == []:
+            headers = [
+                ('Content-Type', 'text/plain'),
+                ('Content-Range', f'bytes */{entry.size}'),
+            ]
+            headers.extend(entry.validator_headers)
+            start_response('416 Range Not Satisfiable', headers)
+            return [b'']
+        if ranges:
+            return send_ranges(file_path, entry, ranges, start_response)
+        
+        if entry.data is None:
+            return send_file(environ, file_path, entry, start_response)
+        
+        start_response('200 OK', list(entry.headers))
+        return [entry.data]
+    
+    def iter_body(file_path, entry, start, end):
+        """Yield an inclusive byte window of a file, from memory if cached."""
+        if entry.data is not None:
+            yield entry.data[start:end + 1]
+        else:
+            yield from iter_file_range(file_path, start, end)
+    
+    def send_file(environ, file_path, entry, start_response):
+        """
+        Send a whole uncached file through the server's wsgi.file_wrapper.
+        
+        Waitress streams the open file in fixed-size chunks rather than
+        buffering it, so memory use does not grow with the file size.
+        """
+        f = open(file_path, 'rb')
+        try:
+            st = os.fstat(f.fileno())
+            if not entry.matches(st.st_mtime_ns, st.st_size):
+                # Replaced since the route was built: describe the file we actually opened
+                entry = load_file(file_path, st.st_mtime_ns, st.st_size,
+                                  entry.content_type, entry.content_encoding)
+            file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+            start_response('200 OK', list(entry.headers))
+            return file_wrapper(f, FILE_CHUNK_SIZE)
+        except Exception:
+            f.close()
+            raise
+    
+    def send_ranges(file_path, entry, ranges, start_response):
+        """Send a 206 Partial Content response for one or more byte ranges."""
+        size = entry.size
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            headers = [
+                ('Content-Type', entry.content_type),
+                ('Content-Length', str(end - start + 1)),
+                ('Content-Range', f'bytes {start}-{end}/{size}'),
+            ]
+            headers.extend(entry.validator_headers)
+            start_response('206 Partial Content', headers)
+            return iter_body(file_path, entry, start, end)
+        
+        # Multiple ranges: multipart/byteranges body with one part per range
+        boundary = secrets.token_hex(16)
+        part_headers = [
+            (f'\r\n--{boundary}\r\n'
+             f'Content-Type: {entry.content_type}\r\n'
+             f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode('latin-1')
+            for start, end in ranges
+        ]
+        closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+        content_length = len(closing) + sum(
+            len(part_header) + end - start + 1
+            for part_header, (start, end) in zip(part_headers, ranges)
+        )
+        
+        def iter_parts():
+            for part_header, (start, end) in zip(part_headers, ranges):
+                yield part_header
+                yield from iter_body(file_path, entry, start, end)
+            yield closing
+        
+        headers = [
+            ('Content-Type', f'multipart/byteranges; boundary={boundary}'),
+            ('Content-Length', str(content_length)),
+        ]
+        headers.extend(entry.validator_headers)
+        start_response('206 Partial Content', headers)
+        return iter_parts()
     
     def application(environ, start_response):
         """WSGI application for serving static files."""
+        # Stage timings (a no-op unless a tracer wraps the app)
+        trace = environ.get(TRACE_ENVIRON_KEY, NULL_TRACE)
         try:
             # Get the requested path
             path = environ.get('PATH_INFO', '/')
@@ -45,74 +1289,537 @@ def create_static_file_app(directory):
                 path = 'index.html'
             else:
                 path = path.lstrip('/')
+            trace.mark('normalise')
             
-            # Build full file path
-            file_path = os.path.join(abs_directory, path)
+            # JSON API pages over the in-memory data indexes
+            index = api_routes.get(path) if api_routes else None
+            if index is not None:
+                environ[ROUTE_ENVIRON_KEY] = path
+                try:
+                    key, entry = get_api_entry(path, index, environ)
+                except ValueError as e:
+                    start_response('400 Bad Request', [('Content-Type', 'application/json')])
+                    return [json_bytes({'error': str(e)})]
+                trace.mark('lookup')
+                key, entry = negotiate(environ, key, entry)
+                trace.mark('negotiate')
+                body = respond(environ, start_response, key, entry)
+                trace.mark('respond')
+                return body
             
-            # Security: prevent directory traversal
-            file_path = os.path.normpath(file_path)
-            if not file_path.startswith(abs_directory):
-                # Path outside of served directory
-                status = '403 Forbidden'
-                headers = [('Content-Type', 'text/plain')]
-                start_response(status, headers)
-                return [b'403 Forbidden: Access denied']
+            # Production mode: content-hashed assets and the rewritten entry point
+            if manifest is not None:
+                key, entry = find_hashed(path)
+                trace.mark('lookup')
+                if entry is not None:
+                    asset = manifest.lookup(path)
+                    environ[ROUTE_ENVIRON_KEY] = asset.rel_path if asset is not None else path
+                    environ[CACHE_ENVIRON_KEY] = 'manifest'
+                    if inline_data and path == entry_point:
+                        key, entry = bootstrap_entry(entry)
+                    key, entry = negotiate(environ, key, entry)
+                    trace.mark('negotiate')
+                    body = respond(environ, start_response, key, entry)
+                    trace.mark('respond')
+                    return body
             
-            # Check if file exists
-            if not os.path.exists(file_path) or not os.path.isfile(file_path):
+            # Resolve the path with a single route table lookup (no filesystem access)
+            route = route_table.lookup(path)
+            trace.mark('lookup')
+            if route is None:
+                # Normalise only on a miss so the common case stays one dict lookup
+                normalised = posixpath.normpath(path)
+                
+                # Security: prevent directory traversal
+                if normalised == '..' or normalised.startswith('../') or normalised.startswith('/'):
+                    # Path outside of served directory
+                    status = '403 Forbidden'
+                    headers = [('Content-Type', 'text/plain')]
+                    start_response(status, headers)
+                    return [b'403 Forbidden: Access denied']
+                trace.mark('traversal')
+                if normalised != path:
+                    route = route_table.lookup(normalised)
+                    trace.mark('lookup')
+                    if route is not None:
+                        # Continue with the route's own key so aliases like a//b or x/../a share one
+                        # metrics label (a raw path would add a series per spelling)
+                        path = normalised
+            
+            if route is None:
                 status = '404 Not Found'
                 headers = [('Content-Type', 'text/plain')]
                 start_response(status, headers)
                 return [f'404 Not Found: {path}'.encode()]
             
-            # Determine content type
-            content_type, _ = mimetypes.guess_type(file_path)
-            if content_type is None:
-                content_type = 'application/octet-stream'
-            
-            # Read and serve file
+            # Serve from cache when the file is unchanged since the route was built (labelled with the
+            # route table key, so the metrics series are bounded by the files served)
+            environ[ROUTE_ENVIRON_KEY] = path
+            file_path = route.file_path
             try:
-                with open(file_path, 'rb') as f:
-                    file_data = f.read()
-                
-                # Set headers
-                headers = [
-                    ('Content-Type', content_type),
-                    ('Content-Length', str(len(file_data))),
-                    ('Access-Control-Allow-Origin', '*'),
-                    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
-                    ('Access-Control-Allow-Headers', '*'),
-                    ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-                ]
-                
-                status = '200 OK'
+                entry = get_entry(route, environ=environ)
+                trace.mark('read')
+                if inline_data and path == entry_point and entry.data is not None:
+                    # Precompressed siblings hold the page without the data, so only gzip on the fly
+                    file_path, entry = bootstrap_entry(entry)
+                    file_path, entry = negotiate(environ, file_path, entry)
+                else:
+                    file_path, entry = negotiate(environ, file_path, entry, path)
+                trace.mark('negotiate')
+            except FileNotFoundError:
+                # Removed since the route table was built
+                route_table.refresh_in_background()
+                status = '404 Not Found'
+                headers = [('Content-Type', 'text/plain')]
                 start_response(status, headers)
-                return [file_data]
-                
+                return [f'404 Not Found: {path}'.encode()]
             except IOError as e:
-                print(f"[ERROR] Error reading file {file_path}: {e}")
+                report_error(f"Error reading file {file_path}: {e}", environ)
                 status = '500 Internal Server Error'
                 headers = [('Content-Type', 'text/plain')]
                 start_response(status, headers)
                 return [b'500 Internal Server Error: Could not read file']
-                
+            
+            body = respond(environ, start_response, file_path, entry)
+            trace.mark('respond')
+            return body
+        
         except Exception as e:
             # Log the error for debugging
-            print(f"[ERROR] Unexpected error in WSGI application: {type(e).__name__}: {e}")
-            traceback.print_exc()
+            report_error(f"Unexpected error in WSGI application: {type(e).__name__}: {e}", environ,
+                         exc_info=True)
             status = '500 Internal Server Error'
             headers = [('Content-Type', 'text/plain')]
             start_response(status, headers)
             return [f'500 Internal Server Error: {str(e)}'.encode()]
     
+    def warm_up(url_paths):
+        """
+        Load files into the caches before the first request (startup warm-up).
+        
+        Each file's entry (with its headers and ETag) is cached, along with its
+        precompressed siblings, or a gzip variant when it has none. In
+        production mode the hashed asset and the rendered entry point are
+        built as well.
+        
+        Args:
+            url_paths: Paths relative to the served root
+        
+        Returns:
+            dict: Files loaded, bytes cached, variants compressed and missing paths
+        """
+        loaded = cached_bytes = compressed = 0
+        missing = []
+        for url_path in url_paths:
+            try:
+                if manifest is not None:
+                    hashed = url_path if url_path == manifest.entry_point else manifest.hashed_url(url_path)
+                    key, entry = find_hashed(hashed) if hashed else (None, None)
+                    if entry is not None:
+                        cached_bytes += entry.size
+                        if compressor.precompress(key, entry):
+                            compressed += 1
+                        if url_path == manifest.entry_point:
+                            loaded += 1
+                            continue
+                        # Fall through: plain URLs such as fetch('data/archives.json') are not rewritten
+                
+                route = route_table.lookup(url_path)
+                if route is None:
+                    missing.append(url_path)
+                    continue
+                entry = get_entry(route)
+                loaded += 1
+                if entry.data is not None:
+                    cached_bytes += entry.size
+                
+                siblings = 0
+                for coding, suffix in PRECOMPRESSED_ENCODINGS:
+                    sibling = route_table.routes.get(url_path + suffix)
+                    if sibling is not None and sibling.mtime_ns >= entry.mtime_ns:
+                        cached_bytes += get_entry(sibling, entry.content_type, coding).size
+                        siblings += 1
+                if not siblings and compressor.precompress(route.file_path, entry):
+                    compressed += 1
+            except OSError as e:
+                print(f"[WARNING] Warm-up could not load {url_path}: {e}")
+                missing.append(url_path)
+        return {'files': loaded, 'bytes': cached_bytes, 'compressed': compressed, 'missing': missing}
+    
+    def apply_changes(url_paths):
+        """
+        Refresh routes and drop cached entries for changed files (FileWatcher callback).
+        
+        Args:
+            url_paths: Set of changed URL paths, or None if the whole tree may have changed
+        
+        Returns:
+            int: Number of routes and cache entries invalidated
+        """
+        if url_paths is None:
+            route_table.rebuild()
+            invalidated = file_cache.stats()['entries'] + compressor.stats()['variants']
+            file_cache.invalidate()
+            compressor.invalidate()
+        else:
+            invalidated = route_table.update(url_paths)
+            for url_path in url_paths:
+                file_path = os.path.join(abs_directory, *url_path.split('/'))
+                if file_cache.invalidate(file_path):
+                    invalidated += 1
+                if compressor.invalidate(file_path):
+                    invalidated += 1
+        if manifest is not None and manifest.refresh_if_stale():
+            invalidated += 1
+        for index in data_indexes:
+            data_path = os.path.relpath(index.file_path, abs_directory).replace(os.sep, '/')
+            if url_paths is None or data_path in url_paths:
+                if index.reload():
+                    invalidated += 1
+        return invalidated
+    
+    if tracer is not None:
+        application = tracer.instrument(application)
+    if profiler is not None:
+        application = profiler.instrument(application)
+    if metrics is not None:
+        metrics.add_collector(cache_collector(file_cache, compressor, route_table))
+        if tracer is not None:
+            metrics.add_collector(trace_collector(tracer))
+        if access_log is not None:
+            metrics.add_observer(access_log.access)
+            metrics.add_collector(access_log_collector(access_log))
+        if change_feed is not None:
+            metrics.add_collector(event_stream_collector(change_feed))
+        application = metrics.instrument(application)
+    if change_feed is not None:
+        application = with_event_stream(application, change_feed)
+    application = with_health_endpoints(application, ready)
+    
+    application.file_cache = file_cache
+    application.compressor = compressor
+    application.route_table = route_table
+    application.apply_changes = apply_changes
+    application.warm_up = warm_up
+    application.manifest = manifest
+    application.archive_index = archive_index
+    application.event_index = event_index
+    application.inline_data = inline_data
+    application.change_feed = change_feed
+    application.metrics = metrics
+    application.access_log = access_log
+    application.profiler = profiler
+    application.tracer = tracer
+    application.ready = ready
     return application
 
-def start_server(port=DEFAULT_PORT):
+
+def is_served_path(directory, file_path):
+    """
+    Check whether the route table would expose a file written by the server.
+    
+    Args:
+        directory: Served root
+        file_path: Output file or directory (log, profile, trace)
+    
+    Returns:
+        bool: True if the path is inside the root and not under a hidden or skipped directory
+    """
+    rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(directory))
+    parts = rel_path.split(os.sep)
+    if parts[0] == os.pardir:
+        return False
+    return not any(part.startswith('.') or part in SKIP_DIRS for part in parts)
+
+
+def with_health_endpoints(app, ready):
+    """
+    Wrap a WSGI app so /__live and /__ready are answered without touching it.
+    
+    Probes are not counted in the request metrics.
+    
+    Args:
+        app: WSGI application
+        ready: threading.Event set once the app is warmed up
+    
+    Returns:
+        WSGI application function
+    """
+    def healthy(environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == LIVE_PATH:
+            start_response('200 OK', [('Content-Type', 'text/plain'), ('Cache-Control', 'no-store')])
+            return [b'live\n']
+        if path == READY_PATH:
+            if ready.is_set():
+                start_response('200 OK', [('Content-Type', 'text/plain'), ('Cache-Control', 'no-store')])
+                return [b'ready\n']
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'text/plain'),
+                ('Cache-Control', 'no-store'),
+                ('Retry-After', '1'),
+            ])
+            return [b'warming up\n']
+        return app(environ, start_response)
+    return healthy
+
+
+def build_site_app(script_dir, production=False, file_cache=None, access_log_path=None, worker_id=None,
+                   preload=True, inline_data=False, scrape_interval=None):
+    """
+    Create the site's WSGI app and start watching the tree for changes.
+    
+    Args:
+        script_dir: Project root to serve
+        production: Serve assets from content-hashed, immutable URLs
+        file_cache: Optional FileCache (a default-sized one is created if omitted)
+        access_log_path: Write a JSON-lines access log here (None disables it)
+        worker_id: Pre-forked worker number; each worker logs to its own file
+        preload: Load the preload list (server_preload.py) into the caches in the background;
+            app.ready (and /__ready) is set once it finishes
+        inline_data: Inline the first archive pages and upcoming events into index.html
+        scrape_interval: Seconds between background scraper runs (None disables them);
+            with workers only worker 0 runs them
+    
+    Returns:
+        callable: The WSGI application (with the watcher attached as app.watcher)
+    """
+    # Build the content-hashed asset manifest in production mode
+    manifest = None
+    if production:
+        manifest = AssetManifest(str(script_dir))
+        print(f"[INFO] Production mode: {len(manifest.assets)} assets served from content-hashed URLs")
+    
+    # Non-blocking access log (one file per worker so rotation never races); server_log is
+    # only imported when a log is configured
+    access_log = None
+    if access_log_path:
+        from server_log import AccessLog
+        if worker_id is not None:
+            stem, ext = os.path.splitext(access_log_path)
+            access_log_path = f"{stem}-worker{worker_id}{ext}"
+        access_log = AccessLog(access_log_path).start()
+        # Waitress's own warnings and errors go to the same log instead of the console
+        waitress_logger = logging.getLogger('waitress')
+        waitress_logger.addHandler(access_log.logging_handler())
+        waitress_logger.propagate = False
+        print(f"[INFO] Access log: {access_log.path}")
+        if is_served_path(script_dir, access_log.path):
+            print(f"[WARNING] {access_log.path} is inside the served root and downloadable; "
+                  f"write it under logs/ or outside {script_dir}")
+    
+    # Opt-in request profiling; server_profile (cProfile, pstats) is only imported when configured
+    profiler = None
+    if os.environ.get('ORANGETERRY_PROFILE') or os.environ.get('ORANGETERRY_PROFILE_TOKEN'):
+        from server_profile import RequestProfiler
+        profiler = RequestProfiler.from_environ()
+    if profiler is not None:
+        profiler.start()
+        print(f"[INFO] Profiling {profiler.sample_rate:.2%} of requests"
+              f"{' (and X-Profile requests)' if profiler.token else ''} into {profiler.output_dir}")
+        if is_served_path(script_dir, profiler.output_dir):
+            print(f"[WARNING] {profiler.output_dir} is inside the served root and downloadable; "
+                  f"set ORANGETERRY_PROFILE_DIR to profiles/ or outside {script_dir}")
+    
+    # Request stage histograms, plus Chrome trace export when ORANGETERRY_TRACE is set
+    tracer = RequestTracer.from_environ().start()
+    if tracer.sample_rate > 0:
+        print(f"[INFO] Exporting {tracer.sample_rate:.2%} of request traces into {tracer.output_dir}")
+        if is_served_path(script_dir, tracer.output_dir):
+            print(f"[WARNING] {tracer.output_dir} is inside the served root and downloadable; "
+                  f"set ORANGETERRY_TRACE_DIR to traces/ or outside {script_dir}")
+    
+    # In-memory data indexes behind /api/archives and /api/events
+    archive_index = ArchiveIndex(os.path.join(str(script_dir), *ARCHIVES_PATH.split('/')))
+    event_index = EventIndex(os.path.join(str(script_dir), *EVENTS_PATH.split('/')))
+    print(f"[INFO] Data API: {archive_index.total()} archive items, "
+          f"{len(event_index.snapshot.events)} events"
+          f"{' (inlined into index.html)' if inline_data else ''}")
+    
+    # Data changes pushed to clients at /__events; a Waitress thread is kept free of streams
+    change_feed = ChangeFeed({'archives': archive_index, 'events': event_index},
+                             max_thread_streams=max(1, SERVE_OPTIONS['threads'] // 2)).start()
+    
+    # Create WSGI application (with request metrics served at /__metrics)
+    ready = threading.Event()
+    app = create_static_file_app(str(script_dir), file_cache=file_cache, manifest=manifest,
+                                 metrics=ServerMetrics(), access_log=access_log, profiler=profiler,
+                                 tracer=tracer, ready=ready, archive_index=archive_index,
+                                 event_index=event_index, inline_data=inline_data, change_feed=change_feed)
+    
+    # Watch the tree so scraper and image script output is picked up without a restart;
+    # the watcher replaces the route table's periodic rescans and per-request manifest checks
+    watcher = FileWatcher(str(script_dir), app.apply_changes)
+    backend = watcher.start()
+    app.route_table.refresh_interval = None
+    if manifest is not None:
+        manifest.check_on_request = False
+    archive_index.check_on_request = False
+    event_index.check_on_request = False
+    print(f"[INFO] Watching {script_dir} for changes ({backend})")
+    app.watcher = watcher
+    
+    # Scheduled scraper runs rewrite archives.json atomically and swap the archive index;
+    # one worker runs them and the others reload through their watchers
+    app.scraper = None
+    if scrape_interval and worker_id in (None, 0):
+        from server_scrape import SCRIPTS_DIR, ScrapeScheduler
+        app.scraper = ScrapeScheduler(archive_index, scrape_interval,
+                                      os.path.join(str(script_dir), SCRIPTS_DIR)).start()
+        app.metrics.add_collector(scrape_collector(app.scraper))
+        print(f"[INFO] Scraping {', '.join(app.scraper.jobs)} every {scrape_interval / 60:g} min")
+    
+    # Warm the caches so the first visitors do not pay cold-disk and compression costs. It runs
+    # while the server starts listening; /__ready reports ready once it is done.
+    app.script_dir = script_dir
+    app.preload = preload
+    
+    def warm_up():
+        try:
+            if preload:
+                warm_site_app(app)
+        except Exception as e:
+            print(f"[ERROR] Warm-up failed: {type(e).__name__}: {e}")
+        finally:
+            ready.set()
+            print(f"[INFO] Ready {(time.perf_counter() - STARTUP_BEGAN) * 1000:.0f} ms after start"
+                  f"{f' (worker {worker_id})' if worker_id is not None else ''}")
+            sys.stdout.flush()
+    
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    return app
+
+
+def warm_site_app(app):
+    """Load the preload list into an app built by build_site_app and print what was loaded."""
+    start = time.perf_counter()
+    paths, source = preload_paths(str(app.script_dir))
+    warmed = app.warm_up(paths)
+    print(f"[INFO] Warm-up: {warmed['files']} files ({warmed['bytes'] / 1024:.0f} KB, "
+          f"{warmed['compressed']} gzip variants) from {source} list in "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+    if warmed['missing']:
+        print(f"[WARNING] Warm-up skipped missing files: {', '.join(warmed['missing'])}")
+
+
+# Serialises reloads when SIGHUP arrives again before the previous reload finished
+_reload_lock = threading.Lock()
+
+
+def reload_site_app(app):
+    """
+    Rebuild an app's routes, asset manifest and caches from the tree on disk (SIGHUP).
+    
+    Requests keep being served from the same listening socket while the
+    caches are dropped and warmed again.
+    
+    Args:
+        app: App returned by build_site_app
+    """
+    with _reload_lock:
+        start = time.perf_counter()
+        try:
+            invalidated = app.apply_changes(None)
+            if app.preload:
+                warm_site_app(app)
+            print(f"[INFO] Reloaded {app.script_dir} ({invalidated} routes and cache entries replaced) "
+                  f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        except Exception as e:
+            print(f"[ERROR] Reload failed: {type(e).__name__}: {e}")
+            traceback.print_exc()
+        sys.stdout.flush()
+
+
+def install_shutdown_handlers(app):
+    """
+    Route SIGINT/SIGTERM to a drain request and SIGHUP to an in-place reload.
+    
+    Returns:
+        callable: should_stop() for the server loop, True once a stop signal arrived
+    """
+    stop_requested = []
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_requested.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.append(signum))
+    if hasattr(signal, 'SIGHUP'):
+        # Reload off the signal handler so the server loop keeps serving meanwhile
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+            target=reload_site_app, args=(app,), name='reload', daemon=True).start())
+    return lambda: bool(stop_requested)
+
+
+def stop_site_app(app):
+    """Print the app's cache statistics and stop its background threads."""
+    cache_stats = app.file_cache.stats()
+    print(f"[INFO] File cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+          f"({cache_stats['coalesced']} coalesced), {cache_stats['evictions']} evictions, "
+          f"{cache_stats['entries']} entries "
+          f"({cache_stats['bytes']} bytes)")
+    watch_stats = app.watcher.stats()
+    print(f"[INFO] File watcher: {watch_stats['batches']} change batches, "
+          f"{watch_stats['invalidations']} invalidations")
+    app.watcher.stop()
+    if app.scraper is not None:
+        scrape_stats = app.scraper.stats()
+        print("[INFO] Scrape jobs: " + ', '.join(
+            f"{name} {stats['runs']} runs ({stats['failures']} failed)" for name, stats in scrape_stats.items()))
+        app.scraper.stop()
+    compress_stats = app.compressor.stats()
+    print(f"[INFO] Dynamic gzip: {compress_stats['compressions']} compressions, "
+          f"{compress_stats['hits']} hits, {compress_stats['misses']} misses")
+    app.compressor.shutdown()
+    if app.access_log is not None:
+        log_stats = app.access_log.stats()
+        print(f"[INFO] Access log: {log_stats['written']} entries written, {log_stats['dropped']} dropped, "
+              f"{log_stats['sampled_out']} sampled out")
+        app.access_log.stop()
+    if app.profiler is not None:
+        app.profiler.stop()
+    if app.tracer is not None:
+        stages = app.tracer.stats()['stages']
+        if stages:
+            print("[INFO] Request stages (mean): " + ', '.join(
+                f"{stage} {values['mean_ms'] * 1000:.1f}us" for stage, values in stages.items()))
+        app.tracer.stop()
+    if app.change_feed is not None:
+        feed_stats = app.change_feed.stats()
+        print(f"[INFO] Event streams: {feed_stats['streams_total']} opened, {feed_stats['messages']} messages, "
+              f"{feed_stats['rejected']} rejected")
+        app.change_feed.stop()
+
+
+def serve_waitress_worker(app, sock, should_stop):
+    """Serve app with Waitress on a listening socket until should_stop(), then drain."""
+    app.change_feed.stop_when(should_stop)
+    from server_workers import serve_until_stopped
+    server = create_server(app, sockets=[sock], **SERVE_OPTIONS)
+    app.metrics.add_collector(waitress_collector(server))
+    return serve_until_stopped(server, should_stop)
+
+
+def serve_asyncio_worker(app, sock, should_stop):
+    """Serve app with the asyncio backend on a listening socket until should_stop(), then drain."""
+    app.change_feed.stop_when(should_stop)
+    from server_asyncio import AsyncioHTTPServer
+    server = AsyncioHTTPServer(app)
+    app.metrics.add_collector(asyncio_collector(server))
+    return server.run(sock=sock, should_stop=should_stop)
+
+
+def start_server(port=DEFAULT_PORT, production=False, workers=1, reuse_port=False, backend='waitress',
+                 access_log=None, preload=True, inline_data=False, scrape_interval=None):
     """
     Starts a Waitress HTTP server and opens the site in a browser.
     
     Args:
         port: Port number to run the server on (default: 8000)
+        production: Serve assets from content-hashed, immutable URLs
+        workers: Number of pre-forked worker processes (1 serves from this process)
+        reuse_port: Give each worker its own SO_REUSEPORT socket instead of sharing one
+        backend: HTTP server backend, 'waitress' or 'asyncio'
+        access_log: Path of the JSON-lines access log (None disables it)
+        preload: Warm the caches with the preload list before reporting ready
+        inline_data: Inline the first archive pages and upcoming events into index.html
+        scrape_interval: Seconds between background scraper runs (None disables them)
     """
     try:
         # Change to the script's directory (project root)
@@ -133,27 +1840,45 @@ def start_server(port=DEFAULT_PORT):
         else:
             print(f"[INFO] Verified index.html exists at {index_path}")
         
-        # Create WSGI application
-        app = create_static_file_app(str(script_dir))
+        # server_workers (the supervisor and the Waitress drain loop) is only imported by the modes using it
+        if workers > 1 or backend == 'waitress':
+            from server_workers import Supervisor, serve_until_stopped, supports_prefork, supports_reuse_port
+        if workers > 1 and not supports_prefork():
+            print("[WARNING] --workers needs os.fork (POSIX only); running a single process")
+            workers = 1
         
         url = f"http://localhost:{port}"
+        listen_mode = 'SO_REUSEPORT' if workers > 1 and reuse_port and supports_reuse_port() else 'shared socket'
         
-        print("=" * 60)
-        print(f"Starting Waitress server on port {port}")
-        print(f"Server will be accessible at: {url}")
-        print(f"Also accessible at: http://127.0.0.1:{port}")
-        print(f"Serving directory: {script_dir}")
-        print("=" * 60)
-        print("Press Ctrl+C to stop the server")
-        print()
+        if production:
+            # Headless: no banner and no browser; orchestrators probe /__live and /__ready
+            print(f"[INFO] Production: {backend} on port {port}, "
+                  f"{f'{workers} workers ({listen_mode})' if workers > 1 else '1 process'}; "
+                  f"health checks at {LIVE_PATH} and {READY_PATH}")
+        else:
+            print("=" * 60)
+            print(f"Starting {'Waitress' if backend == 'waitress' else 'asyncio'} server on port {port}")
+            print(f"Server will be accessible at: {url}")
+            print(f"Also accessible at: http://127.0.0.1:{port}")
+            print(f"Serving directory: {script_dir}")
+            if workers > 1:
+                print(f"Worker processes: {workers} ({listen_mode})")
+            print("=" * 60)
+            print("Press Ctrl+C to stop the server")
+            print()
         
         # Flush output to ensure messages are displayed
         sys.stdout.flush()
         sys.stderr.flush()
         
-        # Open browser after a short delay
-        def open_browser():
-            time.sleep(0.5)  # Give server a moment to start
+        # Open the browser once the app is warmed up (after a short delay with workers,
+        # whose apps live in the worker processes)
+        def open_browser(app=None):
+            if app is not None:
+                app.ready.wait()
+            else:
+                time.sleep(0.5)  # Give server a moment to start
+            import webbrowser  # Development only; kept off the production start path
             try:
                 webbrowser.open(url)
                 print(f"[INFO] Browser opened at {url}")
@@ -161,39 +1886,69 @@ def start_server(port=DEFAULT_PORT):
                 print(f"[WARNING] Could not open browser automatically: {browser_error}")
                 print(f"[WARNING] Please manually open: {url}")
         
-        import threading
-        browser_thread = threading.Thread(target=open_browser, daemon=True)
-        browser_thread.start()
-        
-        # Start Waitress server
-        # Waitress has excellent error handling and is production-ready
-        print("[INFO] Server is running and ready to accept connections...")
-        print("[INFO] Waitress provides better stability and error recovery than http.server")
-        sys.stdout.flush()
+        def report_running(app=None):
+            if production:
+                return
+            print("[INFO] Server is running and ready to accept connections...")
+            print("[INFO] Waitress provides better stability and error recovery than http.server")
+            sys.stdout.flush()
+            threading.Thread(target=open_browser, args=(app,), daemon=True).start()
         
-        try:
-            # Serve with Waitress - this blocks until interrupted
-            serve(
-                app,
+        if workers > 1:
+            # Pre-fork: each worker builds and warms its own app (caches, watcher, gzip pool) after
+            # the fork and reports ready on its own
+            report_running()
+            supervisor = Supervisor(
+                lambda worker_id: build_site_app(script_dir, production, access_log_path=access_log,
+                                                 worker_id=worker_id, preload=preload,
+                                                 inline_data=inline_data, scrape_interval=scrape_interval),
+                serve_asyncio_worker if backend == 'asyncio' else serve_waitress_worker,
                 host='0.0.0.0',
                 port=port,
-                threads=4,  # Use multiple threads for better concurrency
-                channel_timeout=120,  # Timeout for connections
-                cleanup_interval=30,  # Cleanup interval
-                asyncore_use_poll=True,  # Better for Windows
-                _quiet=False,  # Show request logs
+                workers=workers,
+                reuse_port=reuse_port,
+                on_worker_exit=stop_site_app,
+                wait_ready=lambda app: app.ready.wait(),
             )
-        except KeyboardInterrupt:
-            print("\n[INFO] Received shutdown signal (Ctrl+C)")
-            print("[INFO] Shutting down server...")
-            print("[INFO] Server stopped.")
-            sys.exit(0)
-        except Exception as serve_error:
-            print(f"\n[ERROR] Server error: {type(serve_error).__name__}: {serve_error}")
-            print(f"[ERROR] Full traceback:")
-            traceback.print_exc()
-            sys.exit(1)
-            
+            sys.exit(supervisor.run())
+        
+        # Warm-up runs in the background; the browser waits for it so the first page load is served hot
+        app = build_site_app(script_dir, production, access_log_path=access_log, preload=preload,
+                             inline_data=inline_data, scrape_interval=scrape_interval)
+        report_running(app)
+        
+        # Ctrl+C / SIGTERM stop accepting and drain in-flight requests; SIGHUP reloads in place
+        should_stop = install_shutdown_handlers(app)
+        app.change_feed.stop_when(should_stop)
+        
+        if backend == 'asyncio':
+            from server_asyncio import AsyncioHTTPServer
+            server = AsyncioHTTPServer(app)
+            app.metrics.add_collector(asyncio_collector(server))
+            server.run('0.0.0.0', port, should_stop=should_stop)
+        else:
+            try:
+                # Serve with Waitress until a stop signal, then drain
+                logging.basicConfig()  # Waitress logs queue depth warnings and errors
+                server = create_server(app, host='0.0.0.0', port=port, **SERVE_OPTIONS)
+                app.metrics.add_collector(waitress_collector(server))
+                server.print_listen("Serving on http://{}:{}")
+                print(f"[INFO] Listening {(time.perf_counter() - STARTUP_BEGAN) * 1000:.0f} ms after start")
+                sys.stdout.flush()
+                remaining = serve_until_stopped(server, should_stop)
+                if remaining:
+                    print(f"[WARNING] Closed {remaining} connection(s) at the drain deadline")
+            except Exception as serve_error:
+                print(f"\n[ERROR] Server error: {type(serve_error).__name__}: {serve_error}")
+                print(f"[ERROR] Full traceback:")
+                traceback.print_exc()
+                sys.exit(1)
+        print("\n[INFO] Received shutdown signal")
+        print("[INFO] Shutting down server...")
+        stop_site_app(app)
+        print("[INFO] Server stopped.")
+        sys.exit(0)
+    
     except KeyboardInterrupt:
         print("\n[INFO] Received interrupt signal before server started")
         sys.exit(0)
@@ -228,24 +1983,53 @@ if __name__ == "__main__":
             print("[ERROR] Or install from requirements: pip install -r requirements.txt")
             sys.exit(1)
         
-        # Parse port from command line if provided
-        port = DEFAULT_PORT
-        if len(sys.argv) > 1:
-            try:
-                port = int(sys.argv[1])
-                if port < 1 or port > 65535:
-                    print(f"[ERROR] Invalid port number: {port}")
-                    print(f"[ERROR] Port must be between 1 and 65535")
-                    sys.exit(1)
-            except ValueError:
-                print(f"[ERROR] Invalid port number '{sys.argv[1]}'")
-                print(f"[ERROR] Port must be a number")
-                print(f"Usage: python server.py [port]")
+        # Parse command line arguments
+        parser = argparse.ArgumentParser(description="Serve the Orange Terry site with Waitress.")
+        parser.add_argument('port', nargs='?', default=str(DEFAULT_PORT),
+                            help=f"Port to listen on (default: {DEFAULT_PORT})")
+        parser.add_argument('--production', action='store_true',
+                            help="Serve assets from content-hashed, immutable URLs")
+        parser.add_argument('--workers', type=int, default=1, metavar='N',
+                            help="Number of pre-forked worker processes (default: 1)")
+        parser.add_argument('--reuse-port', action='store_true',
+                            help="Give each worker its own SO_REUSEPORT socket (Linux/BSD)")
+        parser.add_argument('--backend', choices=SERVER_BACKENDS, default='waitress',
+                            help="HTTP server backend (default: waitress)")
+        parser.add_argument('--access-log', metavar='PATH',
+                            help="Write a JSON-lines access/error log to PATH (rotated by size)")
+        parser.add_argument('--no-preload', action='store_true',
+                            help="Skip the startup cache warm-up (see server_preload.py)")
+        parser.add_argument('--inline-data', action='store_true',
+                            help="Inline the first archive pages and upcoming events into index.html")
+        parser.add_argument('--scrape-interval', type=float, metavar='MINUTES',
+                            help="Refresh data/archives.json from Mixcloud and VK every MINUTES in the background")
+        args = parser.parse_args()
+        
+        if args.workers < 1:
+            print(f"[ERROR] Invalid worker count: {args.workers}")
+            sys.exit(1)
+        if args.scrape_interval is not None and args.scrape_interval <= 0:
+            print(f"[ERROR] Invalid scrape interval: {args.scrape_interval}")
+            sys.exit(1)
+        
+        try:
+            port = int(args.port)
+            if port < 1 or port > 65535:
+                print(f"[ERROR] Invalid port number: {port}")
+                print(f"[ERROR] Port must be between 1 and 65535")
                 sys.exit(1)
+        except ValueError:
+            print(f"[ERROR] Invalid port number '{args.port}'")
+            print(f"[ERROR] Port must be a number")
+            print(f"Usage: python server.py [port] [--production] [--workers N] [--backend {{waitress,asyncio}}]")
+            sys.exit(1)
         
         print(f"[INFO] Starting Waitress server on port {port}...")
-        start_server(port)
-        
+        start_server(port, production=args.production, workers=args.workers,
+                     reuse_port=args.reuse_port, backend=args.backend, access_log=args.access_log,
+                     preload=not args.no_preload, inline_data=args.inline_data,
+                     scrape_interval=args.scrape_interval * 60 if args.scrape_interval else None)
+    
     except KeyboardInterrupt:
         print("\n[INFO] Interrupted before starting")
         sys.exit(0)
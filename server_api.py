@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+JSON API
+In-memory indexes over the site's data files, served by server.py as small
+JSON pages instead of whole files.
+
+    /api/archives?platform=&type=&before=&limit=
+    /api/events?month=YYYY-MM
+    /api/events/upcoming?limit=
+
+Archives
+--------
+platform    Only items from one platform (mixcloud, vk ...)
+type        audio or video (the section of archives.json)
+before      Only items after this cursor: the "next" of the previous page,
+            "<created_time>,<key>" (a bare created_time starts at the
+            newest item created before it)
+limit       Page size (default 20, at most 100)
+
+Pages are newest first and carry only the fields the page renders (the play,
+listener, favorite and repost counters are left out):
+
+    {"items": [{"key": ..., "platform": ..., "type": ..., "title": ...,
+                "url": ..., "embedUrl": ..., "created_time": ...}, ...],
+     "total": 43, "next": "2023-01-05T19:04:11Z,/Orangeterry/some-set/"}
+
+"total" counts every item matching platform and type, and "next" is null on
+the last page. Items are ordered by created_time and then key, so items that
+share a created_time are never skipped at a page boundary. Items without a
+created_time sort last.
+
+Events
+------
+/api/events returns one month of events.json (the current month if month is
+omitted), in date and time order, and /api/events/upcoming the next events
+from today (the server's local date) on, 10 by default:
+
+    {"month": "2026-01", "events": [{"id": ..., "title": ..., "date": ...}, ...]}
+    {"events": [...], "total": 3}
+
+Events are bucketed by month when the file is loaded, and each month's page
+is serialised once per load. Events without a valid YYYY-MM-DD date are left
+out.
+
+Bootstrap data
+--------------
+With server.py --inline-data, index.html is served with the first data the
+page renders inlined as JSON blocks, so the scripts need not fetch it:
+
+    <script type="application/json" id="bootstrap-archives">
+        {"audio": <archives page>, "video": <archives page>}
+    <script type="application/json" id="bootstrap-events">
+        {"upcoming": <upcoming events page>, "count": <number of events>}
+
+The pages are the API responses at the largest page size; a client can only
+use them in place of the files when they are complete ("next" is null, and
+the upcoming events are all of the events).
+
+An index is rebuilt from its file when it changes and swapped in as a whole,
+so a request sees either the old data or the new data. A file that does not
+parse (half-written by a scraper) or cannot be read is ignored and the
+previous data is kept (an empty index if it is unreadable at startup).
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import date
+from urllib.parse import parse_qs
+
+
+# Data files, relative to the served root
+ARCHIVES_PATH = 'data/archives.json'
+EVENTS_PATH = 'data/events.json'
+
+# API routes (request paths without the leading slash)
+ARCHIVES_ROUTE = 'api/archives'
+EVENTS_ROUTE = 'api/events'
+UPCOMING_EVENTS_ROUTE = 'api/events/upcoming'
+
+# Sections of archives.json (the archive "type")
+ARCHIVE_TYPES = ('audio', 'video')
+
+# Item fields included in API pages
+ARCHIVE_FIELDS = ('key', 'platform', 'type', 'title', 'url', 'embedUrl', 'created_time')
+
+# Page sizes
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_UPCOMING_LIMIT = 10
+MAX_PAGE_SIZE = 100
+
+# Element ids of the JSON blocks inlined into index.html
+BOOTSTRAP_ARCHIVES_ID = 'bootstrap-archives'
+BOOTSTRAP_EVENTS_ID = 'bootstrap-events'
+
+# Event dates and month query values
+EVENT_DATE_PATTERN = re.compile(r'^(\d{4}-(?:0[1-9]|1[0-2]))-(?:0[1-9]|[12]\d|3[01])$')
+MONTH_PATTERN = re.compile(r'^\d{4}-(?:0[1-9]|1[0-2])$')
+
+
+def json_bytes(value):
+    """Serialise a value as compact UTF-8 JSON."""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def script_block(element_id, value):
+    """
+    Serialise a value as an inert <script type="application/json"> element.
+    
+    "<" is escaped so the JSON can never close the element early.
+    """
+    body = json_bytes(value).replace(b'<', b'\\u003c')
+    return b'<script type="application/json" id="' + element_id.encode() + b'">' + body + b'</script>\n'
+
+
+def bootstrap_blocks(archive_index=None, event_index=None, today=None):
+    """
+    Build the JSON blocks inlined into index.html (server.py --inline-data).
+    
+    Args:
+        archive_index: ArchiveIndex for the first audio and video pages
+        event_index: EventIndex for the upcoming events
+        today: ISO date the upcoming events start from (today if omitted)
+    
+    Returns:
+        bytes: Script elements, in page order
+    """
+    blocks = []
+    if archive_index is not None:
+        snapshot = archive_index.snapshot
+        pages = {archive_type: archive_index.page(None, archive_type, None, MAX_PAGE_SIZE, snapshot)
+                 for archive_type in ARCHIVE_TYPES}
+        blocks.append(script_block(BOOTSTRAP_ARCHIVES_ID, pages))
+    if event_index is not None:
+        snapshot = event_index.snapshot
+        upcoming = event_index.upcoming(today or date.today().isoformat(), MAX_PAGE_SIZE, snapshot)
+        blocks.append(script_block(BOOTSTRAP_EVENTS_ID, {'upcoming': upcoming, 'count': len(snapshot.events)}))
+    return b''.join(blocks)
+
+
+def inject_bootstrap(html, blocks):
+    """
+    Insert bootstrap blocks into a page, before </head> (or at the start if it has none).
+    
+    Args:
+        html: Page bytes
+        blocks: bootstrap_blocks() output
+    
+    Returns:
+        bytes: The page with the blocks inlined
+    """
+    position = html.lower().find(b'</head>')
+    if position < 0:
+        return blocks + html
+    return html[:position] + blocks + html[position:]
+
+
+def diff_items(old, new):
+    """
+    Compare two {key: item} mappings.
+    
+    Returns:
+        dict: Added and changed items (in the order of new) and removed keys
+    """
+    return {
+        'added': [item for key, item in new.items() if key not in old],
+        'changed': [item for key, item in new.items() if key in old and old[key] != item],
+        'removed': [key for key in old if key not in new],
+    }
+
+
+def parse_limit(values, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Parse a limit query parameter.
+    
+    Args:
+        values: List of values from parse_qs (or None)
+        default: Value used when the parameter is absent
+        maximum: Largest accepted value
+    
+    Returns:
+        int: The limit
+    
+    Raises:
+        ValueError: If the value is not an integer between 1 and maximum
+    """
+    if not values:
+        return default
+    try:
+        limit = int(values[0])
+    except ValueError:
+        raise ValueError(f"limit must be an integer, got {values[0]!r}") from None
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+class DataIndex:
+    """
+    Base for an in-memory index built from one JSON data file.
+    
+    Subclasses implement build(data), parse_query(route, query_string) and
+    render(query, snapshot) for the API routes they list in routes, and
+    diff(old, new) for change notifications. The built index is replaced in a
+    single assignment, so readers take self.snapshot once and use it throughout.
+    """
+    
+    routes = ()
+    
+    def __init__(self, file_path):
+        self.file_path = os.path.abspath(file_path)
+        # Stat the file on each request; turned off when a file watcher reloads instead
+        self.check_on_request = True
+        self._lock = threading.Lock()
+        self.source = None  # (mtime_ns, size) of the file the snapshot was built from
+        self.snapshot = None  # Built index, with .version (content digest) and .mtime_ns
+        self.builds = 0
+        self.failures = 0
+        self._observers = []
+        self.reload()
+    
+    def build(self, data):
+        """Build a snapshot from the parsed file (implemented by subclasses)."""
+        raise NotImplementedError
+    
+    def diff(self, old, new):
+        """
+        Compare two snapshots (implemented by subclasses).
+        
+        Returns:
+            dict: {"added": [...], "changed": [...], "removed": [keys]}
+        """
+        raise NotImplementedError
+    
+    def add_observer(self, observer):
+        """
+        Register a callable run after a reload swaps in new data.
+        
+        It is called as observer(old_snapshot, new_snapshot) on the reloading
+        thread with the index lock held, so it must not block.
+        """
+        self._observers.append(observer)
+    
+    def parse_query(self, route, query_string):
+        """
+        Validate and normalise a request's query string (implemented by subclasses).
+        
+        Returns:
+            tuple: Hashable query passed to render(); equal queries render the same page
+        
+        Raises:
+            ValueError: If a parameter is invalid
+        """
+        raise NotImplementedError
+    
+    def render(self, query, snapshot=None):
+        """Serialise the page for a parse_query() result (implemented by subclasses)."""
+        raise NotImplementedError
+    
+    def is_stale(self):
+        """Return True if the file changed, disappeared or appeared since the last load."""
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return self.source is not None
+        return (st.st_mtime_ns, st.st_size) != self.source
+    
+    def refresh_if_stale(self):
+        """
+        Reload the index if its file changed.
+        
+        Returns:
+            bool: True if a new snapshot was swapped in
+        """
+        if not self.is_stale():
+            return False
+        with self._lock:
+            if not self.is_stale():
+                return False
+            return self._load()
+    
+    def reload(self):
+        """
+        Reload the index from its file unconditionally.
+        
+        Returns:
+            bool: True if a new snapshot was swapped in
+        """
+        with self._lock:
+            return self._load()
+    
+    def _load(self):
+        # Caller must hold self._lock
+        try:
+            with open(self.file_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                raw = f.read()
+        except FileNotFoundError:
+            self.source = None
+            if self.snapshot is not None:
+                return False
+            return self._swap(self.build({}), '', 0)
+        except OSError as e:
+            # Unreadable (permissions, I/O error): keep the previous data, or serve none at startup.
+            # Remembering the stat stops per-request retries; a chmod reaches reload() via the watcher.
+            self.failures += 1
+            print(f"[WARNING] Could not read {os.path.basename(self.file_path)}: {type(e).__name__}: {e}")
+            try:
+                st = os.stat(self.file_path)
+                self.source = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                self.source = None
+            if self.snapshot is not None:
+                return False
+            return self._swap(self.build({}), '', 0)
+        
+        self.source = (st.st_mtime_ns, st.st_size)
+        version = hashlib.blake2b(raw, digest_size=8).hexdigest()
+        if self.snapshot is not None and version == self.snapshot.version:
+            return False
+        try:
+            snapshot = self.build(json.loads(raw))
+        except (ValueError, TypeError, AttributeError) as e:
+            # Keep serving the previous data; the watcher reloads again when the write completes
+            self.failures += 1
+            print(f"[WARNING] Ignoring unreadable {os.path.basename(self.file_path)}: "
+                  f"{type(e).__name__}: {e}")
+            if self.snapshot is not None:
+                return False
+            return self._swap(self.build({}), '', 0)
+        return self._swap(snapshot, version, st.st_mtime_ns)
+    
+    def _swap(self, snapshot, version, mtime_ns):
+        # Caller must hold self._lock
+        snapshot.version = version
+        snapshot.mtime_ns = mtime_ns
+        old, self.snapshot = self.snapshot, snapshot
+        self.builds += 1
+        if old is not None:
+            for observer in self._observers:
+                try:
+                    observer(old, snapshot)
+                except Exception as e:
+                    print(f"[ERROR] Data index observer failed: {type(e).__name__}: {e}")
+        return True
+
+
+def archive_sort_key(item):
+    """Order of a compact archive item in the index (oldest first)."""
+    return item['created_time'], item['key'] or ''
+
+
+def archive_cursor(item):
+    """The "next" cursor for a page ending at this item."""
+    created_time, key = archive_sort_key(item)
+    return f"{created_time},{key}"
+
+
+class ArchiveSnapshot:
+    """One build of the archive index: items grouped and sorted by (created_time, key)."""
+    
+    def __init__(self, groups, platforms):
+        self.groups = groups  # (platform or None, type or None) -> (sort keys, items), oldest first
+        self.platforms = platforms
+        self.version = None
+        self.mtime_ns = None
+
+
+class ArchiveIndex(DataIndex):
+    """Index over archives.json for /api/archives."""
+    
+    routes = (ARCHIVES_ROUTE,)
+    
+    def build(self, data):
+        """
+        Group the archive items by platform and type, each group sorted by created_time.
+        
+        Args:
+            data: Parsed archives.json ({"audio": [...], "video": [...]})
+        
+        Returns:
+            ArchiveSnapshot
+        """
+        items = []
+        for archive_type in ARCHIVE_TYPES:
+            for item in data.get(archive_type) or ():
+                compact = {field: item.get(field) for field in ARCHIVE_FIELDS}
+                compact['type'] = archive_type
+                compact['platform'] = (compact['platform'] or '').lower() or None
+                compact['created_time'] = compact['created_time'] or ''
+                items.append(compact)
+        # Oldest first so a "before" cursor is a bisect; (created_time, key) orders ties too
+        items.sort(key=archive_sort_key)
+        
+        platforms = sorted({item['platform'] for item in items if item['platform']})
+        members = {}
+        for item in items:
+            for group in {(None, None), (item['platform'], None), (None, item['type']),
+                          (item['platform'], item['type'])}:
+                members.setdefault(group, []).append(item)
+        groups = {group: ([archive_sort_key(item) for item in group_items], group_items)
+                  for group, group_items in members.items()}
+        return ArchiveSnapshot(groups, platforms)
+    
+    def parse_query(self, route, query_string):
+        """
+        Validate and normalise the /api/archives query parameters.
+        
+        Args:
+            route: ARCHIVES_ROUTE
+            query_string: Raw QUERY_STRING
+        
+        Returns:
+            tuple: (platform or None, type or None, before or None, limit)
+        
+        Raises:
+            ValueError: On an unknown type or an invalid limit
+        """
+        params = parse_qs(query_string or '')
+        platform = (params.get('platform') or [''])[0].strip().lower() or None
+        archive_type = (params.get('type') or [''])[0].strip().lower() or None
+        if archive_type is not None and archive_type not in ARCHIVE_TYPES:
+            raise ValueError(f"type must be one of {', '.join(ARCHIVE_TYPES)}")
+        before = (params.get('before') or [''])[0].strip() or None
+        return platform, archive_type, before, parse_limit(params.get('limit'))
+    
+    def page(self, platform=None, archive_type=None, before=None, limit=DEFAULT_PAGE_SIZE, snapshot=None):
+        """
+        Get one page of archive items, newest first.
+        
+        Args:
+            platform: Only items from this platform
+            archive_type: Only 'audio' or 'video' items
+            before: Cursor: only items before this "created_time,key" (or bare created_time)
+            limit: Maximum number of items
+            snapshot: ArchiveSnapshot to read (the current one if omitted)
+        
+        Returns:
+            dict: {"items": [...], "total": int, "next": cursor or None}
+        """
+        snapshot = snapshot or self.snapshot
+        sort_keys, items = snapshot.groups.get((platform, archive_type), ((), ()))
+        if before is None:
+            end = len(items)
+        else:
+            created_time, _, key = before.partition(',')
+            end = bisect.bisect_left(sort_keys, (created_time, key))
+        start = max(end - limit, 0)
+        page_items = items[start:end][::-1]
+        next_before = archive_cursor(page_items[-1]) if start > 0 else None
+        return {'items': page_items, 'total': len(items), 'next': next_before}
+    
+    def diff(self, old, new):
+        """
+        Compare two archive snapshots by item key.
+        
+        Returns:
+            dict: {"added": [items], "changed": [items], "removed": [keys]}
+        """
+        def by_key(snapshot):
+            return {item['key']: item for item in snapshot.groups.get((None, None), ((), ()))[1]}
+        return diff_items(by_key(old), by_key(new))
+    
+    def total(self):
+        """Return the number of archive items in the current snapshot."""
+        return len(self.snapshot.groups.get((None, None), ((), ()))[1])
+    
+    def render(self, query, snapshot=None):
+        """Serialise the page for a parse_query() result as compact JSON bytes."""
+        platform, archive_type, before, limit = query
+        return json_bytes(self.page(platform, archive_type, before, limit, snapshot))
+
+
+class EventSnapshot:
+    """One build of the event index: events in date order and serialised month pages."""
+    
+    def __init__(self, events, dates, months):
+        self.events = events  # Sorted by (date, time)
+        self.dates = dates  # Date of each event, for bisecting
+        self.months = months  # 'YYYY-MM' -> serialised month page
+        self.version = None
+        self.mtime_ns = None
+
+
+class EventIndex(DataIndex):
+    """Index over events.json for /api/events and /api/events/upcoming."""
+    
+    routes = (EVENTS_ROUTE, UPCOMING_EVENTS_ROUTE)
+    
+    def build(self, data):
+        """
+        Sort the events by date and time and serialise each month's page.
+        
+        Args:
+            data: Parsed events.json ({"events": [...]})
+        
+        Returns:
+            EventSnapshot
+        """
+        events = [event for event in data.get('events') or ()
+                  if isinstance(event, dict) and EVENT_DATE_PATTERN.match(str(event.get('date', '')))]
+        events.sort(key=lambda event: (event['date'], str(event.get('time') or '')))
+        
+        buckets = {}
+        for event in events:
+            buckets.setdefault(event['date'][:7], []).append(event)
+        months = {month: json_bytes({'month': month, 'events': month_events})
+                  for month, month_events in buckets.items()}
+        return EventSnapshot(events, [event['date'] for event in events], months)
+    
+    def parse_query(self, route, query_string):
+        """
+        Validate and normalise the /api/events or /api/events/upcoming query parameters.
+        
+        Args:
+            route: EVENTS_ROUTE or UPCOMING_EVENTS_ROUTE
+            query_string: Raw QUERY_STRING
+        
+        Returns:
+            tuple: ('month', 'YYYY-MM') or ('upcoming', today's ISO date, limit)
+        
+        Raises:
+            ValueError: On a malformed month or an invalid limit
+        """
+        params = parse_qs(query_string or '')
+        if route == UPCOMING_EVENTS_ROUTE:
+            limit = parse_limit(params.get('limit'), default=DEFAULT_UPCOMING_LIMIT)
+            return 'upcoming', date.today().isoformat(), limit
+        month = (params.get('month') or [''])[0].strip() or date.today().isoformat()[:7]
+        if not MONTH_PATTERN.match(month):
+            raise ValueError(f"month must be YYYY-MM, got {month!r}")
+        return 'month', month
+    
+    def month(self, month, snapshot=None):
+        """
+        Get the serialised page of one month's events.
+        
+        Args:
+            month: 'YYYY-MM'
+            snapshot: EventSnapshot to read (the current one if omitted)
+        
+        Returns:
+            bytes: JSON page (with an empty event list for a month without events)
+        """
+        snapshot = snapshot or self.snapshot
+        body = snapshot.months.get(month)
+        if body is None:
+            body = json_bytes({'month': month, 'events': []})
+        return body
+    
+    def upcoming(self, today, limit=DEFAULT_UPCOMING_LIMIT, snapshot=None):
+        """
+        Get the next events on or after a date.
+        
+        Args:
+            today: ISO date to start from
+            limit: Maximum number of events
+            snapshot: EventSnapshot to read (the current one if omitted)
+        
+        Returns:
+            dict: {"events": [...], "total": number of events on or after today}
+        """
+        snapshot = snapshot or self.snapshot
+        start = bisect.bisect_left(snapshot.dates, today)
+        return {'events': snapshot.events[start:start + limit], 'total': len(snapshot.events) - start}
+    
+    def diff(self, old, new):
+        """
+        Compare two event snapshots by event id (date, time and title for events without one).
+        
+        Returns:
+            dict: {"added": [events], "changed": [events], "removed": [ids]}
+        """
+        def by_id(snapshot):
+            return {event['id'] if event.get('id') is not None
+                    else f"{event['date']} {event.get('time') or ''} {event.get('title') or ''}": event
+                    for event in snapshot.events}
+        return diff_items(by_id(old), by_id(new))
+    
+    def render(self, query, snapshot=None):
+        """Serialise the page for a parse_query() result as compact JSON bytes."""
+        if query[0] == 'month':
+            return self.month(query[1], snapshot)
+        _, today, limit = query
+        return json_bytes(self.upcoming(today, limit, snapshot))
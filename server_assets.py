@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Content-Hashed Asset Manifest
+Maps static assets to content-hashed URLs for production serving, so they can be
+cached by browsers and proxies with a far-future immutable Cache-Control header.
+
+Assets under scripts/ and styles/ get URLs such as
+scripts/main.3f2a9c1b7d.js. Relative ES module imports inside JavaScript files
+are rewritten to the hashed names as well (otherwise a module would load twice
+under two URLs), and index.html is re-rendered to reference the hashed names.
+
+Used by server.py when started with --production.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from pathlib import PurePosixPath
+
+
+# Directories (relative to the served root) whose files get content-hashed URLs. Only
+# src/href attributes and module imports are rewritten, so a directory belongs here only
+# if its files are referenced that way: the logo variants are not referenced by the page,
+# and data/*.json is fetched by plain URL (and replaced at runtime by the scrapers).
+HASHED_ASSET_DIRS = ('scripts', 'styles')
+
+# Only these file types are served from hashed URLs (server-side scripts are never served hashed)
+HASHED_ASSET_EXTENSIONS = {
+    '.js', '.css', '.json', '.png', '.jpg', '.jpeg', '.webp', '.gif', '.svg', '.ico',
+}
+
+# Files larger than this keep their plain URL
+MAX_HASHED_ASSET_BYTES = 2 * 1024 * 1024
+
+# Number of hex digits of the content hash used in URLs
+HASH_LENGTH = 10
+
+# Static and dynamic relative imports: import x from './a.js', export * from './a.js', import('./a.js')
+JS_IMPORT_PATTERN = re.compile(r'''(\bfrom\s*|\bimport\s*\(\s*|\bimport\s+)(['"])(\.{1,2}/[^'"\s]+)\2''')
+
+# src="..." and href="..." attributes in HTML
+HTML_URL_PATTERN = re.compile(r'''(\b(?:src|href)\s*=\s*)(["'])([^"']+)\2''', re.IGNORECASE)
+
+
+def content_hash(data):
+    """Return the hex content hash used for asset URLs."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hashed_name(rel_path, digest):
+    """
+    Insert a content hash into a relative path.
+    
+    Args:
+        rel_path: POSIX relative path, e.g. 'scripts/main.js'
+        digest: Hex content hash
+    
+    Returns:
+        str: Hashed path, e.g. 'scripts/main.3f2a9c1b7d.js'
+    """
+    path = PurePosixPath(rel_path)
+    return str(path.with_name(f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}"))
+
+
+class HashedAsset:
+    """One asset served from a content-hashed URL, with the exact bytes to send."""
+    
+    __slots__ = ('url', 'rel_path', 'file_path', 'data', 'digest', 'mtime_ns')
+    
+    def __init__(self, url, rel_path, file_path, data, digest, mtime_ns):
+        self.url = url
+        self.rel_path = rel_path
+        self.file_path = file_path
+        self.data = data
+        self.digest = digest
+        self.mtime_ns = mtime_ns
+
+
+class AssetManifest:
+    """
+    In-memory manifest of content-hashed asset URLs and the rewritten entry point.
+    
+    The manifest is rebuilt as a whole and swapped in atomically; the assets of
+    the previous build stay reachable so pages rendered just before a rebuild
+    can still load their hashed URLs.
+    """
+    
+    def __init__(self, directory, asset_dirs=HASHED_ASSET_DIRS, entry_point='index.html'):
+        self.directory = os.path.abspath(directory)
+        self.asset_dirs = tuple(asset_dirs)
+        self.entry_point = entry_point
+        # Stat the inputs on each entry point request; turned off when a file watcher rebuilds instead
+        self.check_on_request = True
+        self._lock = threading.Lock()
+        self.assets = {}  # hashed URL path -> HashedAsset
+        self.urls = {}  # relative path -> hashed URL path
+        self.sources = {}  # absolute path -> (mtime_ns, size) of every input
+        self.index_html = None  # (bytes, mtime_ns) of the rewritten entry point
+        self._previous_assets = {}
+        self.builds = 0
+        self.build()
+    
+    def lookup(self, url_path):
+        """
+        Find the asset for a hashed URL path.
+        
+        Args:
+            url_path: Request path without the leading slash
+        
+        Returns:
+            HashedAsset or None
+        """
+        asset = self.assets.get(url_path)
+        if asset is None:
+            asset = self._previous_assets.get(url_path)
+        return asset
+    
+    def hashed_url(self, rel_path):
+        """Return the hashed URL path for a relative path, or None if it is not hashed."""
+        return self.urls.get(rel_path)
+    
+    def is_stale(self):
+        """Return True if any input file changed, disappeared or appeared since the last build."""
+        for file_path, (mtime_ns, size) in self.sources.items():
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return True
+            if st.st_mtime_ns != mtime_ns or st.st_size != size:
+                return True
+        return self._scan_sources().keys() != self.sources.keys()
+    
+    def refresh_if_stale(self):
+        """
+        Rebuild the manifest if any input changed.
+        
+        Returns:
+            bool: True if the manifest was rebuilt
+        """
+        if not self.is_stale():
+            return False
+        with self._lock:
+            if not self.is_stale():
+                return False
+            self.build()
+            return True
+    
+    def build(self):
+        """Scan the asset directories, hash every asset and render the entry point."""
+        sources = self._scan_sources()
+        originals = {}
+        stats = {}
+        for rel_path, file_path in sources.items():
+            with open(file_path, 'rb') as f:
+                stats[file_path] = os.fstat(f.fileno())
+                originals[rel_path] = f.read()
+        
+        urls = {}
+        assets = {}
+        contents = {}
+        
+        # Non-JS assets are hashed as-is
+        for rel_path, data in originals.items():
+            if rel_path.endswith('.js') or rel_path == self.entry_point:
+                continue
+            digest = content_hash(data)
+            urls[rel_path] = hashed_name(rel_path, digest)
+            contents[rel_path] = (data, digest)
+        
+        # JS modules are hashed after their imports are rewritten, dependencies first.
+        # Import cycles are hashed as one group so every member's name is still stable.
+        js_paths = [p for p in originals if p.endswith('.js')]
+        graph = {p: self._js_dependencies(p, originals[p], originals) for p in js_paths}
+        for group in strongly_connected_components(graph):
+            group_hash = hashlib.blake2b(digest_size=16)
+            for rel_path in sorted(group):
+                group_hash.update(rel_path.encode())
+                group_hash.update(originals[rel_path])
+                for dep in sorted(graph[rel_path]):
+                    if dep not in group:
+                        group_hash.update(urls[dep].encode())
+            digest = group_hash.hexdigest()
+            for rel_path in group:
+                urls[rel_path] = hashed_name(rel_path, digest)
+            for rel_path in group:
+                data = self._rewrite_js(rel_path, originals[rel_path], urls)
+                contents[rel_path] = (data, content_hash(data))
+        
+        for rel_path, (data, digest) in contents.items():
+            file_path = sources[rel_path]
+            asset = HashedAsset(urls[rel_path], rel_path, file_path, data, digest,
+                                stats[file_path].st_mtime_ns)
+            assets[asset.url] = asset
+        
+        index_html = None
+        if self.entry_point in originals:
+            entry_path = sources[self.entry_point]
+            html = self._rewrite_html(originals[self.entry_point], urls)
+            index_html = (html, stats[entry_path].st_mtime_ns)
+        
+        # Swap in the new build; keep the previous one reachable for in-flight pages
+        self._previous_assets = self.assets
+        self.assets = assets
+        self.urls = urls
+        self.index_html = index_html
+        self.sources = {path: (st.st_mtime_ns, st.st_size) for path, st in stats.items()}
+        self.builds += 1
+    
+    def _scan_sources(self):
+        """Return {relative path: absolute path} for the entry point and every hashable asset."""
+        sources = {}
+        entry_path = os.path.join(self.directory, self.entry_point)
+        if os.path.isfile(entry_path):
+            sources[self.entry_point] = entry_path
+        for asset_dir in self.asset_dirs:
+            root = os.path.join(self.directory, asset_dir)
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for filename in filenames:
+                    if os.path.splitext(filename)[1].lower() not in HASHED_ASSET_EXTENSIONS:
+                        continue
+                    file_path = os.path.join(dirpath, filename)
+                    try:
+                        if os.path.getsize(file_path) > MAX_HASHED_ASSET_BYTES:
+                            continue
+                    except OSError:
+                        continue
+                    rel_path = os.path.relpath(file_path, self.directory).replace(os.sep, '/')
+                    sources[rel_path] = file_path
+        return sources
+    
+    @staticmethod
+    def _resolve_import(rel_path, specifier):
+        """Resolve a relative import specifier against the importing module's path."""
+        base = PurePosixPath(rel_path).parent
+        parts = []
+        for part in (base / specifier).parts:
+            if part == '..':
+                if parts:
+                    parts.pop()
+            elif part != '.':
+                parts.append(part)
+        return '/'.join(parts)
+    
+    def _js_dependencies(self, rel_path, data, originals):
+        """Return the set of hashed JS modules a module imports."""
+        deps = set()
+        for match in JS_IMPORT_PATTERN.finditer(data.decode('utf-8', errors='replace')):
+            target = self._resolve_import(rel_path, match.group(3))
+            if target.endswith('.js') and target in originals:
+                deps.add(target)
+        return deps
+    
+    def _rewrite_js(self, rel_path, data, urls):
+        """Rewrite relative imports in a JS module to point at hashed names."""
+        base = PurePosixPath(rel_path).parent
+        
+        def replace(match):
+            target = self._resolve_import(rel_path, match.group(3))
+            hashed = urls.get(target)
+            if hashed is None:
+                return match.group(0)
+            relative = os.path.relpath(hashed, str(base) if str(base) != '.' else '.').replace(os.sep, '/')
+            if not relative.startswith('.'):
+                relative = './' + relative
+            return f"{match.group(1)}{match.group(2)}{relative}{match.group(2)}"
+        
+        text = data.decode('utf-8')
+        return JS_IMPORT_PATTERN.sub(replace, text).encode('utf-8')
+    
+    def _rewrite_html(self, data, urls):
+        """Rewrite src/href attributes in the entry point to hashed names."""
+        def replace(match):
+            value = match.group(3)
+            target = value[2:] if value.startswith('./') else value.lstrip('/')
+            hashed = urls.get(target)
+            if hashed is None:
+                return match.group(0)
+            prefix = '/' if value.startswith('/') else ''
+            return f"{match.group(1)}{match.group(2)}{prefix}{hashed}{match.group(2)}"
+        
+        text = data.decode('utf-8')
+        return HTML_URL_PATTERN.sub(replace, text).encode('utf-8')
+
+
+def strongly_connected_components(graph):
+    """
+    Tarjan's algorithm over a dependency graph.
+    
+    Args:
+        graph: dict mapping node -> set of nodes it depends on
+    
+    Returns:
+        list: Components (lists of nodes), dependencies before their dependents
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = [0]
+    
+    def visit(node):
+        index[node] = lowlink[node] = counter[0]
+        counter[0] += 1
+        stack.append(node)
+        on_stack.add(node)
+        for dep in sorted(graph.get(node, ())):
+            if dep not in index:
+                visit(dep)
+                lowlink[node] = min(lowlink[node], lowlink[dep])
+            elif dep in on_stack:
+                lowlink[node] = min(lowlink[node], index[dep])
+        if lowlink[node] == index[node]:
+            component = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == node:
+                    break
+            components.append(component)
+    
+    for node in sorted(graph):
+        if node not in index:
+            visit(node)
+    return components
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Asyncio HTTP/1.1 Backend
+An alternative to Waitress for serving the WSGI app from create_static_file_app.
+
+Connections are handled by asyncio streams, so thousands of idle keep-alive
+connections cost no threads; only the WSGI call itself (a dict lookup and, on
+a cache miss, a disk read) runs on a small thread pool. Requests on one
+connection are read and answered in order, so pipelined requests work.
+Uncached files handed back through wsgi.file_wrapper are sent with
+loop.sendfile (os.sendfile where the platform supports it). Bodies that are
+asynchronous iterables (the /__events stream) are iterated on the event loop,
+so a long-lived stream holds no thread either.
+
+Used by server.py when started with --backend asyncio.
+"""
+
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from server_events import ASYNC_BODY_ENVIRON_KEY
+
+
+# Threads running WSGI calls (idle connections do not use a thread)
+DEFAULT_THREADS = 8
+
+# Idle time before a keep-alive connection is closed (seconds)
+DEFAULT_KEEPALIVE_TIMEOUT = 75.0
+
+# Seconds a stopping server waits for in-flight requests
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+# While draining, keep-alive connections idle this long are closed; a request that
+# arrives sooner is still answered (with Connection: close)
+DRAIN_IDLE_GRACE = 0.5
+
+# Largest accepted request head (request line plus headers)
+MAX_HEAD_BYTES = 64 * 1024
+
+# Largest accepted request body (the static app never reads one)
+MAX_BODY_BYTES = 1024 * 1024
+
+# Block size for iterating a wsgi.file_wrapper when sendfile cannot be used
+FILE_BLOCK_SIZE = 64 * 1024
+
+# How often the stop callback is polled (seconds)
+STOP_POLL_INTERVAL = 0.5
+
+
+class FileBody:
+    """wsgi.file_wrapper implementation that lets the server sendfile() the file."""
+    
+    def __init__(self, filelike, block_size=FILE_BLOCK_SIZE):
+        self.filelike = filelike
+        self.block_size = block_size
+    
+    def __iter__(self):
+        while True:
+            data = self.filelike.read(self.block_size)
+            if not data:
+                break
+            yield data
+    
+    def close(self):
+        self.filelike.close()
+
+
+class AsyncioHTTPServer:
+    """
+    HTTP/1.1 server for a WSGI application built on asyncio streams.
+    
+    Supports persistent connections (HTTP/1.1 default, HTTP/1.0 with
+    Connection: keep-alive), pipelined requests, and chunked responses for
+    bodies without a Content-Length. Request bodies must use Content-Length.
+    """
+    
+    def __init__(self, app, threads=DEFAULT_THREADS, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+        self.app = app
+        self.keepalive_timeout = keepalive_timeout
+        self.drain_timeout = drain_timeout
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.stopping = False
+        self._connections = {}  # StreamWriter -> monotonic time it went idle, None while busy
+        self._date = (0, '')
+        self._pending = 0  # WSGI calls submitted to the pool and not yet finished
+        self.requests = 0
+        self.connections_total = 0
+    
+    def stats(self):
+        """
+        Get server counters.
+        
+        Returns:
+            dict: Open connections (and how many are idle), pool threads, busy and queued
+                WSGI calls, total connections and requests
+        """
+        return {
+            'threads': self.threads,
+            'busy': min(self._pending, self.threads),
+            'queued': max(0, self._pending - self.threads),
+            'connections': len(self._connections),
+            'idle_connections': sum(1 for since in self._connections.values() if since is not None),
+            'connections_total': self.connections_total,
+            'requests': self.requests,
+        }
+    
+    def run(self, host='0.0.0.0', port=8000, sock=None, should_stop=None):
+        """
+        Serve until should_stop() returns True (or forever), then drain.
+        
+        Args:
+            host: Address to bind when no socket is given
+            port: Port to bind when no socket is given
+            sock: Already listening socket to serve on
+            should_stop: Callable polled to request a graceful shutdown
+        
+        Returns:
+            int: Connections still open when the drain finished
+        """
+        return asyncio.run(self.serve(host, port, sock, should_stop))
+    
+    async def serve(self, host='0.0.0.0', port=8000, sock=None, should_stop=None):
+        """Coroutine form of run()."""
+        if sock is not None:
+            server = await asyncio.start_server(self._handle_connection, sock=sock, limit=MAX_HEAD_BYTES)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port,
+                                                limit=MAX_HEAD_BYTES, reuse_address=True)
+        try:
+            while should_stop is None or not should_stop():
+                await asyncio.sleep(STOP_POLL_INTERVAL)
+        finally:
+            # Stop accepting; busy connections close after their response, idle ones after a grace
+            self.stopping = True
+            server.close()
+            deadline = time.monotonic() + self.drain_timeout
+            while self._connections and time.monotonic() < deadline:
+                idle_before = time.monotonic() - DRAIN_IDLE_GRACE
+                for writer, since in list(self._connections.items()):
+                    if since is not None and since <= idle_before:
+                        writer.close()
+                await asyncio.sleep(0.05)
+            remaining = len(self._connections)
+            for writer in list(self._connections):
+                writer.transport.abort()
+            self.executor.shutdown(wait=False)
+        return remaining
+    
+    def _http_date(self):
+        """Return the current Date header value, formatted at most once per second."""
+        now = int(time.time())
+        if self._date[0] != now:
+            self._date = (now, formatdate(now, usegmt=True))
+        return self._date[1]
+    
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on one connection until it closes or stops being kept alive."""
+        self._connections[writer] = time.monotonic()
+        self.connections_total += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except asyncio.LimitOverrunError:
+                    await self._send_error(writer, '431 Request Header Fields Too Large')
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                self._connections[writer] = None
+                keep_alive = await self._handle_request(reader, writer, head)
+                self._connections[writer] = time.monotonic()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"[ERROR] Connection handler failed: {type(e).__name__}: {e}")
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+    
+    async def _send_error(self, writer, status):
+        """Send a minimal error response on a connection that is about to close."""
+        body = status.encode('latin-1')
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n'
+            f'Date: {self._http_date()}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+    
+    async def _handle_request(self, reader, writer, head):
+        """
+        Parse one request, run the WSGI app and write the response.
+        
+        Returns:
+            bool: True if the connection stays open for another request
+        """
+        lines = head[:-4].decode('latin-1').lstrip('\r\n').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) != 3:
+            await self._send_error(writer, '400 Bad Request')
+            return False
+        method, target, version = parts
+        if version not in ('HTTP/1.1', 'HTTP/1.0'):
+            await self._send_error(writer, '505 HTTP Version Not Supported')
+            return False
+        
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if not sep or not name or name != name.strip():
+                await self._send_error(writer, '400 Bad Request')
+                return False
+            if '_' in name:
+                # Would be indistinguishable from a dash once mapped to a WSGI key
+                continue
+            key = name.upper().replace('-', '_')
+            value = value.strip()
+            headers[key] = f"{headers[key]}, {value}" if key in headers else value
+        
+        connection = headers.get('CONNECTION', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = 'close' not in connection
+        else:
+            keep_alive = 'keep-alive' in connection
+        
+        # Request body (Content-Length only)
+        if 'TRANSFER_ENCODING' in headers:
+            await self._send_error(writer, '501 Not Implemented')
+            return False
+        content_length = headers.get('CONTENT_LENGTH', '0')
+        if not (content_length.isascii() and content_length.isdigit()):
+            # int() would also take signs, spaces and underscores; repeated headers arrive joined by ', '
+            await self._send_error(writer, '400 Bad Request')
+            return False
+        content_length = int(content_length)
+        if content_length < 0 or content_length > MAX_BODY_BYTES:
+            await self._send_error(writer, '413 Content Too Large')
+            return False
+        body = await reader.readexactly(content_length) if content_length else b''
+        
+        if target.startswith(('http://', 'https://')):
+            split = urlsplit(target)
+            path, query = split.path or '/', split.query
+        else:
+            path, _, query = target.partition('?')
+        
+        sockname = writer.get_extra_info('sockname') or ('', 0)
+        peername = writer.get_extra_info('peername') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': str(sockname[0]),
+            'SERVER_PORT': str(sockname[1]),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': str(peername[0]),
+            'REMOTE_PORT': str(peername[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileBody,
+            ASYNC_BODY_ENVIRON_KEY: True,
+        }
+        for key, value in headers.items():
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[key] = value
+            else:
+                environ['HTTP_' + key] = value
+        
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        self._pending += 1
+        try:
+            status, response_headers, app_body = await loop.run_in_executor(self.executor, self._call_app, environ)
+        finally:
+            self._pending -= 1
+        try:
+            if self.stopping:
+                keep_alive = False
+            await self._write_response(writer, method, version, status, response_headers,
+                                       app_body, keep_alive)
+        finally:
+            close = getattr(app_body, 'close', None)
+            if close is not None:
+                close()
+        return keep_alive
+    
+    def _call_app(self, environ):
+        """Run the WSGI app on a pool thread and return (status, headers, body iterable)."""
+        response = []
+        
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[:] = [status, headers]
+            return self._write_not_supported
+        
+        try:
+            body = self.app(environ, start_response)
+            if not response:
+                # start_response may be deferred until the first chunk is produced
+                iterator = iter(body)
+                first = next(iterator, b'')
+                body = _Chained(first, iterator, body)
+            return response[0], response[1], body
+        except Exception as e:
+            print(f"[ERROR] WSGI application failed: {type(e).__name__}: {e}")
+            return '500 Internal Server Error', [('Content-Type', 'text/plain')], [b'500 Internal Server Error']
+    
+    @staticmethod
+    def _write_not_supported(data):
+        raise NotImplementedError("The asyncio backend does not support the WSGI write() callable")
+    
+    async def _write_response(self, writer, method, version, status, headers, body, keep_alive):
+        """Write the status line, headers and body of one response."""
+        code = int(status[:3])
+        send_body = method != 'HEAD' and code >= 200 and code not in (204, 304)
+        header_names = {name.lower() for name, _ in headers}
+        headers = list(headers)
+        if 'date' not in header_names:
+            headers.append(('Date', self._http_date()))
+        
+        chunks = None
+        if isinstance(body, (list, tuple)):
+            chunks = [chunk for chunk in body if chunk]
+            if 'content-length' not in header_names and code not in (204, 304):
+                headers.append(('Content-Length', str(sum(len(chunk) for chunk in chunks))))
+                header_names.add('content-length')
+        
+        chunked = False
+        if 'content-length' not in header_names and send_body:
+            if version == 'HTTP/1.1':
+                chunked = True
+                headers.append(('Transfer-Encoding', 'chunked'))
+            else:
+                keep_alive = False
+        
+        if not keep_alive:
+            headers.append(('Connection', 'close'))
+        elif version == 'HTTP/1.0':
+            headers.append(('Connection', 'keep-alive'))
+        
+        head = ''.join([f'HTTP/1.1 {status}\r\n'] + [f'{name}: {value}\r\n' for name, value in headers])
+        head = (head + '\r\n').encode('latin-1')
+        
+        if not send_body:
+            writer.write(head)
+            await writer.drain()
+            return
+        
+        if chunks is not None:
+            # In-memory body (cache hits): one write, no thread hop
+            writer.write(head + b''.join(chunks))
+            await writer.drain()
+            return
+        
+        loop = asyncio.get_running_loop()
+        content_length = _content_length(headers)
+        if isinstance(body, FileBody) and content_length is not None:
+            writer.write(head)
+            await writer.drain()
+            f = body.filelike
+            await loop.sendfile(writer.transport, f, f.tell(), content_length)
+            return
+        
+        if hasattr(body, '__aiter__'):
+            # Asynchronous body (event streams): wait for chunks on the loop, without a thread
+            writer.write(head)
+            await writer.drain()
+            async for chunk in body:
+                if chunked:
+                    writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                else:
+                    writer.write(chunk)
+                await writer.drain()
+            if chunked:
+                writer.write(b'0\r\n\r\n')
+            await writer.drain()
+            return
+        
+        # Generator body (ranges, multipart): pull chunks on the pool so disk reads never block the loop
+        writer.write(head)
+        iterator = iter(body)
+        while True:
+            chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            if chunk is None:
+                break
+            if not chunk:
+                continue
+            if chunked:
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            else:
+                writer.write(chunk)
+            await writer.drain()
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+def _content_length(headers):
+    """Return the response Content-Length as an int, or None if it is missing or not a number."""
+    for name, value in headers:
+        if name.lower() == 'content-length':
+            return int(value) if value.isascii() and value.isdigit() else None
+    return None
+
+
+class _Chained:
+    """Body iterable that re-attaches an already consumed first chunk."""
+    
+    def __init__(self, first, iterator, original):
+        self.first = first
+        self.iterator = iterator
+        self.original = original
+    
+    def __iter__(self):
+        if self.first:
+            yield self.first
+        yield from self.iterator
+    
+    def close(self):
+        close = getattr(self.original, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Data Change Stream
+Server-Sent Events at /__events announcing changes to data/archives.json
+and data/events.json, so pages can keep their data cached without polling.
+
+When a data index swaps in a new file, the difference from the previous
+version is sent to every connected client:
+
+    id: 2f0c4e1a9b7d3c55.81d2b6a0c4f9e713
+    event: archives
+    data: {"added": [<item>, ...], "changed": [<item>, ...], "removed": ["<key>", ...]}
+
+"events" messages have the same shape, with events in place of archive items
+and event ids as the removed keys. A message's id is the content version of
+every data file, so it means the same thing in every worker process: a client
+reconnecting with Last-Event-ID is sent the messages it missed if this process
+still has them, or a "reset" event (refetch everything) if it does not. A new
+connection starts with a "version" event carrying the current id. Comment
+lines are sent as heartbeats so proxies keep idle streams open.
+
+With --backend asyncio a stream is an asynchronous body iterated on the event
+loop, so an idle client costs a queue and no thread. Waitress runs each
+stream on one of its worker threads, so the number of concurrent streams per
+process is capped and further clients are answered 503 with Retry-After.
+Waitress only notices a client has gone when a write to it fails, so thread
+streams get a heartbeat every few seconds and check between messages whether
+Waitress has marked the connection closed: a closed tab (or a quick reload)
+gives its thread back within seconds rather than holding it until the next
+change or the slow heartbeat.
+"""
+
+import asyncio
+import collections
+import json
+import queue
+import threading
+import time
+
+
+# Request path of the stream (answered before the static app and the metrics)
+EVENTS_STREAM_PATH = '/__events'
+
+# environ key a server sets when it iterates asynchronous bodies (async for) on an event loop
+ASYNC_BODY_ENVIRON_KEY = 'orangeterry.async_body'
+
+# Seconds between heartbeat comments
+HEARTBEAT_INTERVAL = 25.0
+
+# Seconds between heartbeats on streams that hold a thread (a failed write frees the thread)
+THREAD_HEARTBEAT_INTERVAL = 2.0
+
+# How often a thread stream waiting for a message checks that its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.25
+
+# environ key of Waitress's callable reporting that the client connection has closed
+CLIENT_DISCONNECTED_ENVIRON_KEY = 'waitress.client_disconnected'
+
+# Reconnection delay suggested to clients (milliseconds)
+RETRY_MILLISECONDS = 5000
+
+# Messages kept for clients resuming with Last-Event-ID
+HISTORY_SIZE = 64
+
+# Undelivered messages after which a slow client is disconnected
+MAX_BACKLOG = 256
+
+# Streams served on Waitress worker threads per process (each one holds a thread)
+DEFAULT_MAX_THREAD_STREAMS = 2
+
+# How often the feed thread checks for a stop request (seconds)
+STOP_POLL_INTERVAL = 0.5
+
+# Sent to end a subscriber's stream
+_CLOSE = None
+
+
+def format_message(event, data, message_id=None):
+    """
+    Serialise one Server-Sent Events message.
+    
+    Args:
+        event: Event type
+        data: JSON-serialisable payload (sent on a single data: line)
+        message_id: Optional id field
+    
+    Returns:
+        bytes: The message, terminated by a blank line
+    """
+    lines = []
+    if message_id is not None:
+        lines.append(f"id: {message_id}\n")
+    lines.append(f"event: {event}\n")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n")
+    return ''.join(lines).encode('utf-8')
+
+
+class ChangeFeed:
+    """
+    Broadcasts data index changes to Server-Sent Events subscribers.
+    
+    Subscribers are queues: a queue.SimpleQueue for streams iterated on a
+    thread, or an asyncio.Queue (fed through its loop) for asynchronous ones.
+    A background thread sends heartbeats (more often to thread streams, so
+    their threads are freed soon after a client leaves) and closes every
+    stream once the server is stopping. indexes maps each event type to its
+    server_api.DataIndex, e.g. {'archives': archive_index}.
+    """
+    
+    def __init__(self, indexes, heartbeat=HEARTBEAT_INTERVAL, max_thread_streams=DEFAULT_MAX_THREAD_STREAMS,
+                 thread_heartbeat=THREAD_HEARTBEAT_INTERVAL):
+        self.indexes = dict(indexes)
+        self.heartbeat = heartbeat
+        self.thread_heartbeat = min(thread_heartbeat, heartbeat)
+        self.max_thread_streams = max_thread_streams
+        self._lock = threading.Lock()
+        self._subscribers = {}  # subscriber -> (queue, loop or None)
+        self._history = collections.deque(maxlen=HISTORY_SIZE)  # (previous id, message id, message)
+        self._should_stop = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.closed = False
+        self.thread_streams = 0
+        self.streams_total = 0
+        self.messages = 0
+        self.rejected = 0
+        self.dropped = 0
+        for name, index in self.indexes.items():
+            index.add_observer(lambda old, new, name=name, index=index: self._changed(name, index, old, new))
+    
+    def version(self):
+        """Return the current message id: every index's content version."""
+        return '.'.join(index.snapshot.version for index in self.indexes.values())
+    
+    def start(self):
+        """Start the heartbeat thread."""
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop_when(self, should_stop):
+        """
+        Close every stream once the server starts stopping, so draining does not wait on them.
+        
+        Args:
+            should_stop: Callable polled by the heartbeat thread
+        """
+        self._should_stop = should_stop
+    
+    def stop(self):
+        """Close every stream and stop the heartbeat thread."""
+        self._stop.set()
+        self.close()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+    
+    def close(self):
+        """End every stream (clients reconnect elsewhere) and refuse new ones."""
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers.values())
+        for subscriber in subscribers:
+            self._deliver(subscriber, _CLOSE)
+    
+    def stats(self):
+        """
+        Get stream counters.
+        
+        Returns:
+            dict: Open streams (and how many hold a thread), streams and messages since start,
+                rejected and dropped clients
+        """
+        with self._lock:
+            return {
+                'streams': len(self._subscribers),
+                'thread_streams': self.thread_streams,
+                'streams_total': self.streams_total,
+                'messages': self.messages,
+                'rejected': self.rejected,
+                'dropped': self.dropped,
+            }
+    
+    def open_stream(self, environ):
+        """
+        Create the response body for a /__events request.
+        
+        Returns:
+            EventStream or None: None if the stream cannot be served now (the feed
+                is closed, or every thread stream slot is taken)
+        """
+        asynchronous = bool(environ.get(ASYNC_BODY_ENVIRON_KEY))
+        with self._lock:
+            if self.closed or (not asynchronous and self.thread_streams >= self.max_thread_streams):
+                self.rejected += 1
+                return None
+            if not asynchronous:
+                self.thread_streams += 1
+            self.streams_total += 1
+        return EventStream(self, environ.get('HTTP_LAST_EVENT_ID'), asynchronous,
+                           environ.get(CLIENT_DISCONNECTED_ENVIRON_KEY))
+    
+    def opening_messages(self, last_event_id):
+        """
+        Get the messages that start a stream.
+        
+        Args:
+            last_event_id: Last-Event-ID sent by a reconnecting client, or None
+        
+        Returns:
+            bytes: Retry hint, then the missed messages, a reset or the current version
+        """
+        version = self.version()
+        opening = [f"retry: {RETRY_MILLISECONDS}\n\n".encode()]
+        if last_event_id is None:
+            opening.append(format_message('version', {'version': version}, version))
+        elif last_event_id != version:
+            with self._lock:
+                history = list(self._history)
+            # Resume after the latest message with that id, or from the latest message sent
+            # from that version (the id of a version event); a file can return to an earlier version
+            missed = None
+            for position in range(len(history) - 1, -1, -1):
+                previous_id, message_id, _ = history[position]
+                if message_id == last_event_id:
+                    missed = [message for _, _, message in history[position + 1:]]
+                    break
+                if previous_id == last_event_id:
+                    missed = [message for _, _, message in history[position:]]
+                    break
+            if missed:
+                opening.extend(missed)
+            else:
+                opening.append(format_message('reset', {'version': version}, version))
+        return b''.join(opening)
+    
+    def subscribe(self, subscriber, stream_queue, loop=None):
+        """Register a stream's queue (with its event loop for an asyncio.Queue)."""
+        with self._lock:
+            if self.closed:
+                return False
+            self._subscribers[subscriber] = (stream_queue, loop)
+            return True
+    
+    def unsubscribe(self, subscriber, thread_stream=False):
+        """Remove a stream's queue and release its thread stream slot."""
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+            if thread_stream:
+                self.thread_streams -= 1
+    
+    def publish(self, event, data, previous_id=None):
+        """
+        Send a message to every stream and keep it for resuming clients.
+        
+        Args:
+            event: Event type ('archives', 'events')
+            data: JSON-serialisable payload
+            previous_id: Version the change was made from, so clients that last saw it can resume
+        """
+        message_id = self.version()
+        message = format_message(event, data, message_id)
+        with self._lock:
+            self._history.append((previous_id, message_id, message))
+            self.messages += 1
+            subscribers = list(self._subscribers.items())
+        self._broadcast(subscribers, message)
+    
+    def _broadcast(self, subscribers, message):
+        for subscriber, target in subscribers:
+            stream_queue, _ = target
+            if stream_queue.qsize() >= MAX_BACKLOG:
+                # Not reading: end its stream rather than buffer without bound
+                with self._lock:
+                    self.dropped += 1
+                self._deliver(target, _CLOSE)
+                continue
+            self._deliver(target, message)
+    
+    @staticmethod
+    def _deliver(target, message):
+        stream_queue, loop = target
+        if loop is None:
+            stream_queue.put(message)
+            return
+        try:
+            loop.call_soon_threadsafe(stream_queue.put_nowait, message)
+        except RuntimeError:
+            pass  # Loop already closed
+    
+    def _changed(self, name, index, old, new):
+        """Index observer: publish the difference between two snapshots."""
+        diff = index.diff(old, new)
+        if any(diff.values()):
+            previous_id = '.'.join(old.version if other is index else other.snapshot.version
+                                   for other in self.indexes.values())
+            self.publish(name, diff, previous_id)
+    
+    def _run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat
+        next_thread_heartbeat = time.monotonic() + self.thread_heartbeat
+        while not self._stop.wait(min(STOP_POLL_INTERVAL, self.thread_heartbeat)):
+            if self._should_stop is not None and self._should_stop():
+                self.close()
+                return
+            now = time.monotonic()
+            if now < next_thread_heartbeat:
+                continue
+            next_thread_heartbeat = now + self.thread_heartbeat
+            # Every stream is due at the slow interval; thread streams (no loop) at every beat
+            everyone = now >= next_heartbeat
+            if everyone:
+                next_heartbeat = now + self.heartbeat
+            with self._lock:
+                subscribers = [(subscriber, target) for subscriber, target in self._subscribers.items()
+                               if everyone or target[1] is None]
+            self._broadcast(subscribers, b': ping\n\n')
+
+
+class EventStream:
+    """
+    Response body of one /__events client.
+    
+    Iterated with a plain for loop it blocks its thread between messages,
+    ending once client_disconnected() (the server's check, if it has one)
+    reports the connection closed; a server that sets ASYNC_BODY_ENVIRON_KEY
+    iterates it with async for instead, which waits on the event loop.
+    """
+    
+    def __init__(self, feed, last_event_id, asynchronous, client_disconnected=None):
+        self.feed = feed
+        self.last_event_id = last_event_id
+        self.asynchronous = asynchronous
+        self.client_disconnected = client_disconnected
+        self._closed = False
+    
+    def __iter__(self):
+        stream_queue = queue.SimpleQueue()
+        if not self.feed.subscribe(self, stream_queue):
+            return
+        yield self.feed.opening_messages(self.last_event_id)
+        while True:
+            if self.client_disconnected is None:
+                message = stream_queue.get()
+            else:
+                try:
+                    message = stream_queue.get(timeout=DISCONNECT_POLL_INTERVAL)
+                except queue.Empty:
+                    # A failed write closed the connection: give the thread back now
+                    if self.client_disconnected():
+                        return
+                    continue
+            if message is _CLOSE:
+                return
+            yield message
+    
+    async def __aiter__(self):
+        stream_queue = asyncio.Queue()
+        if not self.feed.subscribe(self, stream_queue, asyncio.get_running_loop()):
+            return
+        yield self.feed.opening_messages(self.last_event_id)
+        while True:
+            message = await stream_queue.get()
+            if message is _CLOSE:
+                return
+            yield message
+    
+    def close(self):
+        """Unsubscribe from the feed (called by the server when the response ends)."""
+        if not self._closed:
+            self._closed = True
+            self.feed.unsubscribe(self, thread_stream=not self.asynchronous)
+
+
+def with_event_stream(app, feed):
+    """
+    Wrap a WSGI app so /__events is answered with the change stream.
+    
+    Streams are long-lived, so they are kept out of the request metrics.
+    
+    Args:
+        app: WSGI application
+        feed: ChangeFeed
+    
+    Returns:
+        WSGI application function
+    """
+    def streaming(environ, start_response):
+        if environ.get('PATH_INFO') != EVENTS_STREAM_PATH:
+            return app(environ, start_response)
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            start_response('200 OK', [('Content-Type', 'text/event-stream; charset=utf-8'),
+                                      ('Cache-Control', 'no-store')])
+            return [b'']
+        stream = feed.open_stream(environ)
+        if stream is None:
+            start_response('503 Service Unavailable', [
+                ('Content-Type', 'text/plain'),
+                ('Cache-Control', 'no-store'),
+                ('Retry-After', str(RETRY_MILLISECONDS // 1000)),
+            ])
+            return [b'event stream unavailable\n']
+        start_response('200 OK', [
+            ('Content-Type', 'text/event-stream; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+            ('X-Accel-Buffering', 'no'),
+            ('Access-Control-Allow-Origin', '*'),
+        ])
+        return stream
+    return streaming
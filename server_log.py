@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Structured Access Log
+JSON-lines access and error log for server.py, written by a background
+thread so request threads never wait on disk or console I/O.
+
+Request threads only build a small dict and put it on a bounded queue. The
+writer thread serialises entries in batches and appends them to a file that
+is rotated by size. When the queue backs up, access entries are sampled
+(every Nth kept, tagged with its sample rate) and, once it is full, dropped;
+the number of sampled-out and dropped entries is written to the log itself.
+
+Used by server.py when started with --access-log PATH.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+
+
+# Rotate the log file once it grows past this size
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+# Rotated files kept (access.log.1 ... access.log.N)
+DEFAULT_BACKUP_COUNT = 5
+
+# Entries buffered between request threads and the writer
+DEFAULT_QUEUE_SIZE = 10000
+
+# Start sampling access entries when the queue is this full
+SAMPLE_THRESHOLD = 0.5
+
+# Keep one access entry in this many while sampling
+SAMPLE_RATE = 10
+
+# Most entries written per batch, and the longest an entry waits to be written (seconds)
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+_STOP = object()
+
+
+class AccessLog:
+    """
+    Non-blocking JSON-lines log with a background writer and size-based rotation.
+    
+    Call start() before logging and stop() on shutdown to flush what is queued.
+    """
+    
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 queue_size=DEFAULT_QUEUE_SIZE, sample_rate=SAMPLE_RATE):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sample_from = int(queue_size * SAMPLE_THRESHOLD)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._sample_counter = 0
+        self.pid = os.getpid()
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.rotations = 0
+        self._reported = (0, 0)
+    
+    def start(self):
+        """Open the log file and start the writer thread."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self, timeout=5.0):
+        """Flush queued entries and stop the writer thread."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+    
+    def stats(self):
+        """
+        Get log counters.
+        
+        Returns:
+            dict: Entries written, dropped and sampled out, queue depth and rotations
+        """
+        with self._lock:
+            return {
+                'written': self.written,
+                'dropped': self.dropped,
+                'sampled_out': self.sampled_out,
+                'queued': self._queue.qsize(),
+                'rotations': self.rotations,
+            }
+    
+    def access(self, environ, status, seconds, bytes_sent, headers):
+        """
+        Queue an access entry for a finished request (ServerMetrics observer signature).
+        
+        Args:
+            environ: WSGI environ of the request
+            status: Status code as a string
+            seconds: Time to produce the response
+            bytes_sent: Body bytes
+            headers: Response headers
+        """
+        # Sample before building the entry so a backed-up queue costs as little as possible
+        sample_rate = None
+        if self._queue.qsize() >= self._sample_from:
+            with self._lock:
+                self._sample_counter += 1
+                if self._sample_counter % self.sample_rate:
+                    self.sampled_out += 1
+                    return
+            sample_rate = self.sample_rate
+        
+        encoding = None
+        for name, value in headers:
+            if name.lower() == 'content-encoding':
+                encoding = value
+                break
+        record = {
+            'ts': time.time(),
+            'type': 'access',
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'query': environ.get('QUERY_STRING') or None,
+            'status': int(status),
+            'bytes': bytes_sent,
+            'duration_ms': round(seconds * 1000, 3),
+            'route': environ.get('orangeterry.route'),
+            'cache': environ.get('orangeterry.cache'),
+            'encoding': encoding,
+            'remote': environ.get('REMOTE_ADDR'),
+            'user_agent': environ.get('HTTP_USER_AGENT'),
+        }
+        if sample_rate is not None:
+            record['sample_rate'] = sample_rate
+        self._put(record)
+    
+    def error(self, message, environ=None, exc_info=False):
+        """
+        Queue an error entry.
+        
+        Args:
+            message: Error description
+            environ: WSGI environ of the failing request, if any
+            exc_info: Include the traceback of the exception being handled
+        """
+        record = {'ts': time.time(), 'type': 'error', 'message': message}
+        if environ is not None:
+            record['method'] = environ.get('REQUEST_METHOD')
+            record['path'] = environ.get('PATH_INFO')
+        if exc_info:
+            record['traceback'] = traceback.format_exc()
+        self._put(record)
+    
+    def logging_handler(self, level=logging.WARNING):
+        """Return a logging.Handler that queues records as 'log' entries (for the waitress logger)."""
+        return _QueueingHandler(self, level)
+    
+    def _put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+    
+    def _run(self):
+        """Writer loop: batch queued entries, write them and rotate the file."""
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not _STOP]
+            
+            with self._lock:
+                lost = (self.dropped, self.sampled_out)
+            if lost != self._reported:
+                batch.append({
+                    'ts': time.time(), 'type': 'log_backpressure',
+                    'dropped': lost[0] - self._reported[0],
+                    'sampled_out': lost[1] - self._reported[1],
+                })
+                self._reported = lost
+            if batch:
+                self._write(batch)
+        self._file.close()
+    
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            record['pid'] = self.pid
+            lines.append(json.dumps(record, separators=(',', ':'), default=str))
+        try:
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"[ERROR] Access log write failed: {e}")
+            with self._lock:
+                self.dropped += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+    
+    def _rotate(self):
+        """Rename access.log -> access.log.1 -> ... and reopen an empty file."""
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        with self._lock:
+            self.rotations += 1
+
+
+class _QueueingHandler(logging.Handler):
+    """logging.Handler that puts records on an AccessLog's queue instead of writing them."""
+    
+    def __init__(self, access_log, level):
+        super().__init__(level)
+        self.access_log = access_log
+    
+    def emit(self, record):
+        try:
+            entry = {
+                'ts': record.created,
+                'type': 'log',
+                'logger': record.name,
+                'level': record.levelname,
+                'message': record.getMessage(),
+            }
+            if record.exc_info:
+                entry['traceback'] = ''.join(traceback.format_exception(*record.exc_info))
+            self.access_log._put(entry)
+        except Exception:
+            self.handleError(record)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Prometheus Metrics
+Request counters, latency histograms and cache/server gauges for the static
+file app, exposed at /__metrics in the Prometheus text exposition format.
+
+The app records each request's route (the served file's path, or
+'unmatched'), status, latency and bytes sent. Caches and the HTTP server
+backend register collectors that are read at scrape time, so they add no
+per-request cost. With --workers every worker process keeps its own metrics;
+each scrape is answered by whichever worker accepts the connection.
+"""
+
+import threading
+import time
+
+
+# Path the metrics are served from
+METRICS_PATH = '/__metrics'
+
+# environ key the app sets to the route label of a request
+ROUTE_ENVIRON_KEY = 'orangeterry.route'
+
+# environ key the app sets to the file cache outcome ('hit', 'miss', 'coalesced', 'stream' or 'manifest')
+CACHE_ENVIRON_KEY = 'orangeterry.cache'
+
+# Route label for requests that did not resolve to a file
+UNMATCHED_ROUTE = 'unmatched'
+
+# Request methods reported as-is; anything else is counted as 'OTHER'
+KNOWN_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'})
+
+# Latency histogram bucket upper bounds (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Metric name prefix
+PREFIX = 'orangeterry_'
+
+
+def escape_label(value):
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Render a label dict as {name="value",...} (empty string for no labels)."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_value(value):
+    """Render a sample value."""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class ServerMetrics:
+    """
+    Thread-safe request metrics plus scrape-time collectors.
+    
+    A collector is a callable returning a list of metric families, each a
+    (name, type, help, samples) tuple where samples is a list of
+    (labels dict, value) pairs. Names are given without the common prefix.
+    Histogram samples are (suffix, labels dict, value) triples, where the
+    suffix is '_bucket', '_sum' or '_count'.
+    """
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests = {}  # (route, method, status) -> count
+        self._bytes = {}  # route -> bytes sent
+        self._latency = {}  # route -> [bucket counts..., +Inf count, sum]
+        self._collectors = []
+        self._observers = []
+        self.in_flight = 0
+        self.started = time.time()
+    
+    def add_collector(self, collector):
+        """Register a callable read at scrape time (see the class docstring)."""
+        self._collectors.append(collector)
+    
+    def add_observer(self, observer):
+        """
+        Register a callable run after each recorded request.
+        
+        It is called as observer(environ, status, seconds, bytes_sent, headers)
+        on the request thread, so it must not block.
+        """
+        self._observers.append(observer)
+    
+    def begin_request(self):
+        """Count a request as in flight."""
+        with self._lock:
+            self.in_flight += 1
+    
+    def end_request(self, route, method, status, seconds, bytes_sent):
+        """
+        Record a finished request.
+        
+        Args:
+            route: Route label
+            method: Request method
+            status: Status code as a string
+            seconds: Time to produce the response
+            bytes_sent: Body bytes
+        """
+        with self._lock:
+            self.in_flight -= 1
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._bytes[route] = self._bytes.get(route, 0) + bytes_sent
+            histogram = self._latency.get(route)
+            if histogram is None:
+                histogram = self._latency[route] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[len(self.buckets)] += 1
+            histogram[-1] += seconds
+    
+    def instrument(self, app):
+        """
+        Wrap a WSGI app so every request is recorded and /__metrics is served.
+        
+        Bodies that are lists (cached files) or file wrappers are recorded as
+        soon as the app returns, using their length or Content-Length; other
+        iterables (ranges) are recorded when the server closes them. File
+        wrapper bodies are passed through unwrapped so the server can still
+        send them with its file_wrapper/sendfile fast path.
+        """
+        def instrumented(environ, start_response):
+            if environ.get('PATH_INFO') == METRICS_PATH:
+                body = self.render()
+                start_response('200 OK', [
+                    ('Content-Type', CONTENT_TYPE),
+                    ('Content-Length', str(len(body))),
+                    ('Cache-Control', 'no-store'),
+                ])
+                return [body]
+            
+            start = time.perf_counter()
+            self.begin_request()
+            method = environ.get('REQUEST_METHOD', 'GET')
+            if method not in KNOWN_METHODS:
+                method = 'OTHER'
+            response = {}
+            
+            def recording_start_response(status, headers, exc_info=None):
+                response['status'] = status[:3]
+                response['headers'] = headers
+                return start_response(status, headers, exc_info)
+            
+            def finish(bytes_sent):
+                seconds = time.perf_counter() - start
+                status = response.get('status', '500')
+                if method == 'HEAD':
+                    bytes_sent = 0
+                self.end_request(environ.get(ROUTE_ENVIRON_KEY, UNMATCHED_ROUTE), method, status,
+                                 seconds, bytes_sent)
+                for observer in self._observers:
+                    observer(environ, status, seconds, bytes_sent, response.get('headers', ()))
+            
+            try:
+                body = app(environ, recording_start_response)
+            except BaseException:
+                # The server answers 500 whatever the app had started; record and report it as such
+                response.update(status='500', headers=[])
+                finish(0)
+                raise
+            
+            if isinstance(body, (list, tuple)):
+                finish(sum(len(chunk) for chunk in body))
+                return body
+            file_wrapper = environ.get('wsgi.file_wrapper')
+            if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+                length = next((value for name, value in response.get('headers', ())
+                               if name.lower() == 'content-length'), '0')
+                finish(int(length))
+                return body
+            return _CountingBody(body, finish)
+        
+        return instrumented
+    
+    def render(self):
+        """
+        Render every metric in the Prometheus text format.
+        
+        Returns:
+            bytes: The exposition body
+        """
+        with self._lock:
+            requests = dict(self._requests)
+            sent = dict(self._bytes)
+            latency = {route: list(values) for route, values in self._latency.items()}
+            in_flight = self.in_flight
+        
+        families = [
+            ('http_requests_total', 'counter', 'Requests handled, by route, method and status.',
+             [({'route': route, 'method': method, 'status': status}, count)
+              for (route, method, status), count in sorted(requests.items())]),
+            ('http_response_bytes_total', 'counter', 'Response body bytes sent, by route.',
+             [({'route': route}, count) for route, count in sorted(sent.items())]),
+            ('http_requests_in_flight', 'gauge', 'Requests currently being handled.',
+             [({}, in_flight)]),
+            ('process_start_time_seconds', 'gauge', 'Start time of the process since the Unix epoch.',
+             [({}, self.started)]),
+        ]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"[ERROR] Metrics collector failed: {type(e).__name__}: {e}")
+        
+        lines = []
+        for name, metric_type, help_text, samples in families:
+            lines.append(f'# HELP {PREFIX}{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}{name} {metric_type}')
+            for sample in samples:
+                suffix, labels, value = sample if len(sample) == 3 else ('', *sample)
+                lines.append(f'{PREFIX}{name}{suffix}{format_labels(labels)} {format_value(value)}')
+        
+        # Latency histogram: cumulative buckets per route
+        name = f'{PREFIX}http_request_duration_seconds'
+        lines.append(f'# HELP {name} Time to produce a response, by route.')
+        lines.append(f'# TYPE {name} histogram')
+        for route, values in sorted(latency.items()):
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{name}_bucket{format_labels({"route": route, "le": format_value(bound)})} {count}')
+            lines.append(f'{name}_bucket{format_labels({"route": route, "le": "+Inf"})} {values[len(self.buckets)]}')
+            lines.append(f'{name}_sum{format_labels({"route": route})} {format_value(values[-1])}')
+            lines.append(f'{name}_count{format_labels({"route": route})} {values[len(self.buckets)]}')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _CountingBody:
+    """Body iterable that counts bytes and reports them when the server closes it."""
+    
+    def __init__(self, body, finish):
+        self.body = body
+        self.finish = finish
+        self.bytes_sent = 0
+    
+    def __iter__(self):
+        for chunk in self.body:
+            self.bytes_sent += len(chunk)
+            yield chunk
+    
+    def close(self):
+        try:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.finish(self.bytes_sent)
+
+
+def cache_collector(file_cache, compressor, route_table):
+    """Collector for the file cache, dynamic gzip variants and route table."""
+    def collect():
+        cache = file_cache.stats()
+        gzip = compressor.stats()
+        routes = route_table.stats()
+        gzip_lookups = gzip['hits'] + gzip['misses']
+        return [
+            ('file_cache_hits_total', 'counter', 'File cache hits.', [({}, cache['hits'])]),
+            ('file_cache_misses_total', 'counter', 'File cache misses.', [({}, cache['misses'])]),
+            ('file_cache_coalesced_total', 'counter',
+             'File cache misses that waited for a concurrent load of the same file.',
+             [({}, cache['coalesced'])]),
+            ('file_cache_evictions_total', 'counter', 'File cache evictions.', [({}, cache['evictions'])]),
+            ('file_cache_hit_ratio', 'gauge', 'File cache hits / lookups since start.',
+             [({}, cache['hit_ratio'])]),
+            ('file_cache_entries', 'gauge', 'Files held in the cache.', [({}, cache['entries'])]),
+            ('file_cache_bytes', 'gauge', 'Bytes held in the cache.', [({}, cache['bytes'])]),
+            ('gzip_hits_total', 'counter', 'Requests served a ready gzip variant.', [({}, gzip['hits'])]),
+            ('gzip_misses_total', 'counter', 'Gzip-eligible requests served uncompressed.', [({}, gzip['misses'])]),
+            ('gzip_compressions_total', 'counter', 'Gzip variants compressed.', [({}, gzip['compressions'])]),
+            ('gzip_hit_ratio', 'gauge', 'Gzip variant hits / lookups since start.',
+             [({}, gzip['hits'] / gzip_lookups if gzip_lookups else 0.0)]),
+            ('gzip_variants', 'gauge', 'Gzip variants held in memory.', [({}, gzip['variants'])]),
+            ('routes', 'gauge', 'Files in the route table.', [({}, routes['routes'])]),
+        ]
+    return collect
+
+
+def waitress_collector(server):
+    """Collector for a Waitress server's task queue, worker threads and connections."""
+    def collect():
+        dispatcher = server.task_dispatcher
+        threads = len(dispatcher.threads) - dispatcher.stop_count
+        busy = max(0, min(dispatcher.active_count, threads))
+        return [
+            ('server_queue_depth', 'gauge', 'Requests waiting for a worker thread.',
+             [({'backend': 'waitress'}, len(dispatcher.queue))]),
+            ('server_threads', 'gauge', 'Worker threads.', [({'backend': 'waitress'}, threads)]),
+            ('server_threads_busy', 'gauge', 'Worker threads handling a request.',
+             [({'backend': 'waitress'}, busy)]),
+            ('server_thread_utilisation', 'gauge', 'Busy / total worker threads.',
+             [({'backend': 'waitress'}, busy / threads if threads else 0.0)]),
+            ('server_connections', 'gauge', 'Open client connections.',
+             [({'backend': 'waitress'}, len(server.active_channels))]),
+        ]
+    return collect
+
+
+def asyncio_collector(server):
+    """Collector for an AsyncioHTTPServer's WSGI pool and connections."""
+    def collect():
+        stats = server.stats()
+        threads = stats['threads']
+        return [
+            ('server_queue_depth', 'gauge', 'Requests waiting for a worker thread.',
+             [({'backend': 'asyncio'}, stats['queued'])]),
+            ('server_threads', 'gauge', 'Worker threads.', [({'backend': 'asyncio'}, threads)]),
+            ('server_threads_busy', 'gauge', 'Worker threads handling a request.',
+             [({'backend': 'asyncio'}, stats['busy'])]),
+            ('server_thread_utilisation', 'gauge', 'Busy / total worker threads.',
+             [({'backend': 'asyncio'}, stats['busy'] / threads if threads else 0.0)]),
+            ('server_connections', 'gauge', 'Open client connections.',
+             [({'backend': 'asyncio'}, stats['connections'])]),
+            ('server_idle_connections', 'gauge', 'Keep-alive connections waiting for a request.',
+             [({'backend': 'asyncio'}, stats['idle_connections'])]),
+        ]
+    return collect
+
+
+def access_log_collector(access_log):
+    """Collector for a server_log.AccessLog's writer queue and loss counters."""
+    def collect():
+        stats = access_log.stats()
+        return [
+            ('access_log_written_total', 'counter', 'Access log entries written.', [({}, stats['written'])]),
+            ('access_log_dropped_total', 'counter', 'Access log entries dropped (queue full).',
+             [({}, stats['dropped'])]),
+            ('access_log_sampled_out_total', 'counter', 'Access log entries skipped by backpressure sampling.',
+             [({}, stats['sampled_out'])]),
+            ('access_log_queue_depth', 'gauge', 'Entries waiting for the access log writer.',
+             [({}, stats['queued'])]),
+        ]
+    return collect
+
+
+def trace_collector(tracer):
+    """Collector for a server_trace.RequestTracer's per-stage latency histograms."""
+    def collect():
+        samples = []
+        for stage, values in sorted(tracer.histograms().items()):
+            for bound, count in zip(tracer.buckets, values):
+                samples.append(('_bucket', {'stage': stage, 'le': format_value(bound)}, count))
+            samples.append(('_bucket', {'stage': stage, 'le': '+Inf'}, values[len(tracer.buckets)]))
+            samples.append(('_sum', {'stage': stage}, values[-1]))
+            samples.append(('_count', {'stage': stage}, values[len(tracer.buckets)]))
+        return [
+            ('request_stage_duration_seconds', 'histogram', 'Time spent in each request pipeline stage.',
+             samples),
+        ]
+    return collect
+
+
+def event_stream_collector(feed):
+    """Collector for a server_events.ChangeFeed's streams and messages."""
+    def collect():
+        stats = feed.stats()
+        return [
+            ('event_streams', 'gauge', 'Open /__events streams.', [({}, stats['streams'])]),
+            ('event_streams_on_threads', 'gauge', 'Open /__events streams holding a server thread.',
+             [({}, stats['thread_streams'])]),
+            ('event_streams_total', 'counter', '/__events streams opened.', [({}, stats['streams_total'])]),
+            ('event_stream_messages_total', 'counter', 'Data change messages published.',
+             [({}, stats['messages'])]),
+            ('event_streams_rejected_total', 'counter', '/__events requests answered 503 (no stream slot).',
+             [({}, stats['rejected'])]),
+            ('event_streams_dropped_total', 'counter', 'Streams closed for falling too far behind.',
+             [({}, stats['dropped'])]),
+        ]
+    return collect
+
+
+def scrape_collector(scheduler):
+    """Collector for a server_scrape.ScrapeScheduler's job runs and timings."""
+    def collect():
+        jobs = scheduler.stats()
+        
+        def samples(field):
+            return [({'job': name}, stats[field]) for name, stats in jobs.items() if stats[field] is not None]
+        
+        return [
+            ('scrape_interval_seconds', 'gauge', 'Seconds between runs of each scrape job.',
+             [({}, scheduler.interval)]),
+            ('scrape_runs_total', 'counter', 'Scrape job runs.', samples('runs')),
+            ('scrape_failures_total', 'counter', 'Scrape job runs that failed (archives left unchanged).',
+             samples('failures')),
+            ('scrape_running', 'gauge', 'Whether the scrape job is running.',
+             [({'job': name}, int(stats['running'])) for name, stats in jobs.items()]),
+            ('scrape_last_run_timestamp_seconds', 'gauge', 'Start time of the last scrape run.',
+             samples('last_run')),
+            ('scrape_last_duration_seconds', 'gauge', 'Duration of the last scrape run.',
+             samples('last_duration')),
+            ('scrape_last_success_timestamp_seconds', 'gauge', 'End time of the last successful scrape run.',
+             samples('last_success')),
+            ('scrape_next_run_timestamp_seconds', 'gauge', 'Time the scrape job is next due.',
+             samples('next_run')),
+        ]
+    return collect
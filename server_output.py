@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Windowed Output Files
+Shared writer behind the request profiler and the trace exporter: items
+collected while serving are buffered in memory and written by a background
+thread once per time window, to files named <prefix>-<pid>-<UTC time><ext>.
+Only the newest windows of each process are kept on disk.
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+
+
+# Buffered items are written once per window (seconds)
+DEFAULT_WINDOW = 60.0
+
+# Windows kept on disk per process (older files are deleted)
+DEFAULT_MAX_WINDOWS = 10
+
+
+class WindowedWriter:
+    """
+    Buffers items and writes each window's items to a set of files.
+    
+    write(items, base) writes the files of one window, where base is the
+    output path without extension; extensions lists the files it creates, the
+    first being the one reported by flush() and used to find old windows.
+    """
+    
+    def __init__(self, output_dir, prefix, extensions, write, max_pending, window=DEFAULT_WINDOW,
+                 max_windows=DEFAULT_MAX_WINDOWS, name='writer'):
+        self.output_dir = os.path.abspath(output_dir)
+        self.prefix = prefix
+        self.extensions = tuple(extensions)
+        self.write = write
+        self.max_pending = max_pending
+        self.window = window
+        self.max_windows = max_windows
+        self.name = name
+        self._lock = threading.Lock()
+        self._pending = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.pid = os.getpid()
+        self.windows_written = 0
+    
+    def start(self):
+        """Create the output directory and start the background thread that writes windows."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Write the current window and stop the background thread (if it was started)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+            self.flush()
+    
+    def add(self, item):
+        """
+        Buffer an item for the next window.
+        
+        Returns:
+            bool: False if the buffer is full and the item was discarded
+        """
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending.append(item)
+            return True
+    
+    def pending(self):
+        """Return the number of items waiting for the next window."""
+        with self._lock:
+            return len(self._pending)
+    
+    def flush(self):
+        """
+        Write the items buffered since the last write as one window.
+        
+        Returns:
+            str or None: Path of the window's first file, or None if nothing was buffered
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return None
+        
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        base = os.path.join(self.output_dir, f"{self.prefix}-{self.pid}-{stamp}")
+        self.write(pending, base)
+        with self._lock:
+            self.windows_written += 1
+        self._prune()
+        return base + self.extensions[0]
+    
+    def _run(self):
+        while not self._stop.wait(self.window):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[ERROR] {self.name.capitalize()} write failed: {type(e).__name__}: {e}")
+    
+    def _prune(self):
+        """Delete this process's oldest windows beyond max_windows."""
+        if not self.max_windows:
+            return
+        prefix = f"{self.prefix}-{self.pid}-"
+        primary = self.extensions[0]
+        windows = sorted(name[:-len(primary)] for name in os.listdir(self.output_dir)
+                         if name.startswith(prefix) and name.endswith(primary))
+        for name in windows[:-self.max_windows]:
+            for ext in self.extensions:
+                try:
+                    os.remove(os.path.join(self.output_dir, name + ext))
+                except OSError:
+                    pass
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Preload Manifest
+Lists the files the first visitor's page load needs, so server.py can load
+them into its caches before it reports ready.
+
+The list comes from preload.json in the served root when that file exists
+(written by hand, or generated with --write and then edited). Otherwise it
+is discovered at startup: the local src/href references of index.html, the
+relative ES module import graph of the scripts it loads, the files those
+scripts fetch() by literal path, and the logo variants.
+
+preload.json format (paths relative to the served root; globs allowed):
+    {"paths": ["index.html", "styles/main.css", "scripts/*.js", "data/archives.json"]}
+
+Usage:
+    python server_preload.py          Print the discovered preload list
+    python server_preload.py --write  Write it to preload.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import posixpath
+import re
+import sys
+
+from server_assets import HTML_URL_PATTERN, JS_IMPORT_PATTERN
+
+
+# Hand-written preload manifest, relative to the served root
+PRELOAD_MANIFEST = 'preload.json'
+
+# Files no page or script references by a literal path (the responsive logo variants)
+PRELOAD_GLOBS = ('assets/logos/*',)
+
+# fetch('data/archives.json') with a literal path
+FETCH_PATTERN = re.compile(r'''\bfetch\(\s*(['"])([^'"\s]+)\1''')
+
+# Absolute URLs (https:, data:, mailto: ...)
+URL_SCHEME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+
+def local_path(url, base=''):
+    """
+    Resolve a reference to a path relative to the served root.
+    
+    Args:
+        url: src/href/import/fetch value
+        base: Directory of the referencing file ('' for the root)
+    
+    Returns:
+        str or None: Relative path, or None for external, data: and fragment URLs
+    """
+    if not url or url.startswith(('#', '//')) or URL_SCHEME_PATTERN.match(url):
+        return None
+    url = url.split('#', 1)[0].split('?', 1)[0]
+    if url.startswith('/'):
+        path = posixpath.normpath(url.lstrip('/'))
+    else:
+        path = posixpath.normpath(posixpath.join(base, url))
+    if path in ('.', '') or path == '..' or path.startswith('../'):
+        return None
+    return path
+
+
+def discover_preload_paths(directory, entry_point='index.html', extra_globs=PRELOAD_GLOBS):
+    """
+    Scan the entry point and the JS import graph for the files a page load needs.
+    
+    Args:
+        directory: Served root
+        entry_point: Page to start from
+        extra_globs: Additional glob patterns (relative to the root) to include
+    
+    Returns:
+        list: Existing relative paths, in discovery order
+    """
+    found = []
+    seen = set()
+    
+    def add(rel_path):
+        if rel_path in seen:
+            return False
+        seen.add(rel_path)
+        if not os.path.isfile(os.path.join(directory, *rel_path.split('/'))):
+            return False
+        found.append(rel_path)
+        return True
+    
+    def read_text(rel_path):
+        with open(os.path.join(directory, *rel_path.split('/')), 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    
+    pending_js = []
+    if add(entry_point):
+        page_dir = posixpath.dirname(entry_point)
+        for match in HTML_URL_PATTERN.finditer(read_text(entry_point)):
+            rel_path = local_path(match.group(3), page_dir)
+            if rel_path is not None and add(rel_path) and rel_path.endswith('.js'):
+                pending_js.append(rel_path)
+    
+    # Walk the import graph; fetch() paths resolve against the page, imports against the module
+    while pending_js:
+        module = pending_js.pop(0)
+        text = read_text(module)
+        for match in JS_IMPORT_PATTERN.finditer(text):
+            rel_path = local_path(match.group(3), posixpath.dirname(module))
+            if rel_path is not None and add(rel_path) and rel_path.endswith('.js'):
+                pending_js.append(rel_path)
+        for match in FETCH_PATTERN.finditer(text):
+            rel_path = local_path(match.group(2), posixpath.dirname(entry_point))
+            if rel_path is not None:
+                add(rel_path)
+    
+    for pattern in extra_globs:
+        for file_path in sorted(glob.glob(os.path.join(directory, pattern))):
+            if os.path.isfile(file_path):
+                add(os.path.relpath(file_path, directory).replace(os.sep, '/'))
+    return found
+
+
+def load_preload_manifest(directory, manifest_path=PRELOAD_MANIFEST):
+    """
+    Read a hand-written preload manifest.
+    
+    Args:
+        directory: Served root
+        manifest_path: Manifest file, relative to the root
+    
+    Returns:
+        list or None: Relative paths (globs expanded), or None if there is no manifest
+    """
+    file_path = os.path.join(directory, manifest_path)
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r', encoding='utf-8') as f:
+        patterns = json.load(f).get('paths', [])
+    
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(os.path.relpath(p, directory).replace(os.sep, '/')
+                             for p in glob.glob(os.path.join(directory, pattern)) if os.path.isfile(p))
+        else:
+            matches = [pattern.lstrip('/')]
+        paths.extend(p for p in matches if p not in paths)
+    return paths
+
+
+def preload_paths(directory):
+    """
+    Get the preload list: preload.json if present, otherwise the discovered list.
+    
+    Returns:
+        tuple: (list of relative paths, source description)
+    """
+    try:
+        paths = load_preload_manifest(directory)
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"[WARNING] Ignoring unreadable {PRELOAD_MANIFEST}: {type(e).__name__}: {e}")
+        paths = None
+    if paths is not None:
+        return paths, PRELOAD_MANIFEST
+    return discover_preload_paths(directory), 'discovered'
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Print or write the server's startup preload list.")
+    parser.add_argument('--write', action='store_true', help=f"Write the list to {PRELOAD_MANIFEST}")
+    args = parser.parse_args()
+    
+    directory = os.path.dirname(os.path.abspath(__file__))
+    paths = discover_preload_paths(directory)
+    if args.write:
+        with open(os.path.join(directory, PRELOAD_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump({'paths': paths}, f, indent=2)
+            f.write('\n')
+        print(f"[INFO] Wrote {len(paths)} paths to {PRELOAD_MANIFEST}")
+    else:
+        for path in paths:
+            print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
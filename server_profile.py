@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Request Profiler
+Opt-in cProfile sampling of the static file app under real traffic.
+
+A configurable fraction of requests (and any request carrying the profiling
+token header) is run under cProfile. Profiles are merged per time window and
+written as rolling pstats files (for pstats/snakeviz) and collapsed-stack
+files (for flamegraph.pl/speedscope), so the cost of path resolution, stat
+calls, mimetype lookup and response construction can be inspected without
+restarting the server.
+
+Configured from environment variables:
+    ORANGETERRY_PROFILE        Fraction of requests to profile, e.g. 0.01
+    ORANGETERRY_PROFILE_TOKEN  Secret enabling the X-Profile request header
+    ORANGETERRY_PROFILE_DIR    Output directory (default: profiles; server.py never
+                               serves a profiles/ directory)
+
+With a token configured, a request sent with "X-Profile: <token>" is
+profiled, and "X-Profile: <token>; rate=0.05" also changes the sample rate of
+the process that serves it.
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import secrets
+import threading
+
+from server_output import DEFAULT_MAX_WINDOWS, DEFAULT_WINDOW, WindowedWriter
+
+
+# Environment variables
+PROFILE_RATE_ENV = 'ORANGETERRY_PROFILE'
+PROFILE_TOKEN_ENV = 'ORANGETERRY_PROFILE_TOKEN'
+PROFILE_DIR_ENV = 'ORANGETERRY_PROFILE_DIR'
+
+# Request header (WSGI environ key) carrying the profiling token
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# Profiles held in memory between writes (more are discarded)
+MAX_PENDING_PROFILES = 5000
+
+# Depth limit and minimum weight (microseconds) when deriving collapsed stacks
+MAX_STACK_DEPTH = 64
+MIN_STACK_MICROSECONDS = 1
+
+
+def function_label(func):
+    """Readable collapsed-stack frame name for a pstats function key."""
+    filename, line, name = func
+    if filename == '~':
+        # Built-in functions: name is already descriptive, e.g. <built-in method posix.stat>
+        return name.replace(';', ',')
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(';', ',')
+
+
+def collapsed_stacks(stats):
+    """
+    Derive collapsed stacks from a merged pstats.Stats call graph.
+    
+    cProfile records caller/callee edges rather than full stacks, so each
+    function's time is split across the paths reaching it in proportion to
+    the time each caller spent in it (the same approximation flameprof uses).
+    
+    Args:
+        stats: pstats.Stats
+    
+    Returns:
+        dict: "frame;frame;frame" -> self time in microseconds
+    """
+    table = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in table.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    
+    stacks = {}
+    
+    def visit(func, path, weight):
+        _, _, tottime, cumtime, _ = table[func]
+        path = path + [function_label(func)]
+        self_us = int(tottime * weight * 1e6)
+        if self_us >= MIN_STACK_MICROSECONDS:
+            key = ';'.join(path)
+            stacks[key] = stacks.get(key, 0) + self_us
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee in callees.get(func, ()):
+            if function_label(callee) in path:
+                continue  # recursion: already on this path
+            callee_cumtime = table[callee][3]
+            edge_cumtime = table[callee][4][func][3]
+            if callee_cumtime <= 0:
+                continue
+            callee_weight = weight * edge_cumtime / callee_cumtime
+            if callee_cumtime * callee_weight * 1e6 >= MIN_STACK_MICROSECONDS:
+                visit(callee, path, callee_weight)
+    
+    roots = [func for func, (_, _, _, _, callers) in table.items() if not callers]
+    for root in roots:
+        visit(root, [], 1.0)
+    return stacks
+
+
+class RequestProfiler:
+    """
+    Samples requests under cProfile and writes merged profiles per time window.
+    
+    Only one request is profiled at a time (cProfile cannot run concurrently
+    on every Python version); a sampled request that finds the profiler busy
+    is served unprofiled.
+    """
+    
+    def __init__(self, output_dir, sample_rate=0.0, token=None, window=DEFAULT_WINDOW,
+                 max_windows=DEFAULT_MAX_WINDOWS):
+        self.sample_rate = sample_rate
+        self.token = token
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._writer = WindowedWriter(output_dir, 'profile', ('.pstats', '.collapsed'), self._write,
+                                      MAX_PENDING_PROFILES, window=window, max_windows=max_windows,
+                                      name='profiler')
+        self.output_dir = self._writer.output_dir
+        self.profiled = 0
+        self.skipped_busy = 0
+    
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        """
+        Create a profiler from environment variables.
+        
+        Returns:
+            RequestProfiler or None if profiling is not configured
+        """
+        try:
+            rate = float(environ.get(PROFILE_RATE_ENV) or 0)
+        except ValueError:
+            print(f"[WARNING] Ignoring invalid {PROFILE_RATE_ENV}={environ.get(PROFILE_RATE_ENV)!r}")
+            rate = 0.0
+        token = environ.get(PROFILE_TOKEN_ENV) or None
+        if rate <= 0 and token is None:
+            return None
+        return cls(environ.get(PROFILE_DIR_ENV) or 'profiles', sample_rate=min(rate, 1.0), token=token)
+    
+    def start(self):
+        """Start the background thread that writes profile windows."""
+        self._writer.start()
+        return self
+    
+    def stop(self):
+        """Write the current window and stop the background thread."""
+        self._writer.stop()
+    
+    def stats(self):
+        """
+        Get profiler counters.
+        
+        Returns:
+            dict: Sample rate, profiled and skipped requests, pending profiles and windows written
+        """
+        with self._lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'profiled': self.profiled,
+                'skipped_busy': self.skipped_busy,
+                'pending': self._writer.pending(),
+                'windows_written': self._writer.windows_written,
+            }
+    
+    def _wants_profile(self, environ):
+        """Decide whether to profile a request (header token or random sample)."""
+        header = environ.get(PROFILE_HEADER)
+        if header and self.token:
+            value, _, option = header.partition(';')
+            if secrets.compare_digest(value.strip().encode(), self.token.encode()):
+                name, _, rate = option.strip().partition('=')
+                if name == 'rate':
+                    try:
+                        self.sample_rate = min(max(float(rate), 0.0), 1.0)
+                        print(f"[INFO] Profiler sample rate set to {self.sample_rate}")
+                    except ValueError:
+                        pass
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+    
+    def instrument(self, app):
+        """Wrap a WSGI app so sampled requests run under cProfile."""
+        def profiled(environ, start_response):
+            if not self._wants_profile(environ):
+                return app(environ, start_response)
+            if not self._busy.acquire(blocking=False):
+                with self._lock:
+                    self.skipped_busy += 1
+                return app(environ, start_response)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                try:
+                    return app(environ, start_response)
+                finally:
+                    profile.disable()
+            finally:
+                self._busy.release()
+                with self._lock:
+                    self.profiled += 1
+                self._writer.add(profile)
+        return profiled
+    
+    def flush(self):
+        """
+        Merge the profiles collected since the last write into one window's files.
+        
+        Returns:
+            str or None: Path of the pstats file written, or None if nothing was profiled
+        """
+        return self._writer.flush()
+    
+    def _write(self, pending, base):
+        """Write one window: merged pstats and collapsed stacks."""
+        merged = pstats.Stats(pending[0])
+        for profile in pending[1:]:
+            merged.add(profile)
+        
+        merged.dump_stats(base + '.pstats')
+        stacks = collapsed_stacks(merged)
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            for stack, micros in sorted(stacks.items()):
+                f.write(f"{stack} {micros}\n")
+        print(f"[INFO] Profiler: {len(pending)} request(s) written to {base}.pstats")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Scheduled Scraping
+Runs the Mixcloud and VK scrapers (scripts/fetch_mixcloud.py and
+scripts/fetch_vk_videos.py) on a schedule inside server.py, so
+data/archives.json stays current without manual script runs.
+
+Each job fetches on a background thread, off the request path, then merges
+what it found into the archives data the same way the script does. The file
+is replaced atomically (written to a temporary file that is renamed over it),
+so neither the server nor a browser ever reads a half-written file, and the
+archive index is reloaded straight away: the new snapshot is swapped in with
+a single assignment and /__events clients are sent the difference. A run that
+fails or finds nothing leaves the data as it was and is retried at the next
+interval. A scheduled run never removes archive items: if a merge would
+drop any (a profile page that failed or came back short), the run fails and
+the file is left alone; removals need a manual script run.
+
+Enable with --scrape-interval MINUTES. The first run is one interval after
+startup. With --workers only worker 0 runs the jobs; the other workers pick
+the new file up through their file watchers. Runs, failures and the last and
+next run times of each job are exported at /__metrics.
+"""
+
+import copy
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+
+# Job names, in the order they run when due together
+SCRAPE_JOBS = ('mixcloud', 'vk')
+
+# Scraper scripts, relative to the project root
+SCRIPTS_DIR = 'scripts'
+
+# Sections of archives.json
+ARCHIVE_SECTIONS = ('audio', 'video')
+
+# How long stop() waits for a running job (its network requests have their own timeouts)
+STOP_TIMEOUT = 5.0
+
+# Serialises load_script() imports (and their sys.path changes)
+_import_lock = threading.Lock()
+
+
+def load_script(scripts_dir, name):
+    """
+    Import a script from scripts/ (which is not a package) as a module, once.
+    
+    The module is registered in sys.modules as orangeterry_<name>, so later
+    runs reuse it instead of executing the script again.
+    
+    Args:
+        scripts_dir: Directory holding the scripts
+        name: Script name without .py
+    
+    Returns:
+        module: The imported script (its main() is not run)
+    """
+    module_name = f'orangeterry_{name}'
+    with _import_lock:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(scripts_dir, f'{name}.py'))
+        module = importlib.util.module_from_spec(spec)
+        # The scripts import their shared helpers (archives_io) by name, as when run directly;
+        # scripts/ is only on sys.path while they do, so its names never shadow other imports
+        added = scripts_dir not in sys.path
+        if added:
+            sys.path.append(scripts_dir)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        finally:
+            if added:
+                sys.path.remove(scripts_dir)
+        return module
+
+
+def fetch_mixcloud(scripts_dir):
+    """
+    Mixcloud job: fetch the Orange Terry sets.
+    
+    Returns:
+        tuple: (merge function taking the current archives data, number of items fetched)
+    """
+    script = load_script(scripts_dir, 'fetch_mixcloud')
+    # Strict: a failed profile or page raises instead of returning a partial list
+    items = script.fetch_audio_items(strict=True)
+    if not items:
+        raise RuntimeError("no audio items found")
+    return (lambda existing: script.merge_audio_archives(existing, items)), len(items)
+
+
+def fetch_vk(scripts_dir):
+    """
+    VK job: fetch the default VK video playlist.
+    
+    Returns:
+        tuple: (merge function taking the current archives data, number of videos fetched)
+    """
+    script = load_script(scripts_dir, 'fetch_vk_videos')
+    videos = [script.format_archive_item(video) for video in script.fetch_videos()]
+    if not videos:
+        raise RuntimeError("no videos found in playlist")
+    return (lambda existing: script.merge_video_archives(existing, videos)), len(videos)
+
+
+# Job name -> fetch function
+JOB_FETCHERS = {
+    'mixcloud': fetch_mixcloud,
+    'vk': fetch_vk,
+}
+
+
+def archive_keys(data):
+    """Return the (section, key or url) of every item in archives data."""
+    keys = set()
+    for section in ARCHIVE_SECTIONS:
+        items = data.get(section) if isinstance(data, dict) else None
+        for item in items if isinstance(items, list) else ():
+            if isinstance(item, dict):
+                keys.add((section, item.get('key') or item.get('url')))
+    return keys
+
+
+class ScrapeScheduler:
+    """
+    Runs scraper jobs at a fixed interval on a background thread.
+    
+    Jobs run one at a time, so their merges into archives.json never race
+    each other. After a successful run the archive index is reloaded, which
+    swaps its snapshot atomically and notifies its observers. Runs are
+    scheduled on the monotonic clock, so a wall-clock change neither runs
+    every job at once nor stalls them; stats() reports wall-clock times.
+    """
+    
+    def __init__(self, archive_index, interval, scripts_dir, jobs=SCRAPE_JOBS):
+        self.archive_index = archive_index
+        self.file_path = archive_index.file_path
+        self.interval = interval
+        self.scripts_dir = str(scripts_dir)
+        self.jobs = tuple(jobs)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._due = {}  # job name -> time.monotonic() at which it next runs
+        self._stats = {name: {
+            'runs': 0,
+            'failures': 0,
+            'running': False,
+            'last_run': None,
+            'last_duration': None,
+            'last_success': None,
+            'last_error': None,
+        } for name in self.jobs}
+    
+    def start(self):
+        """Schedule every job one interval from now and start the scheduler thread."""
+        now = time.monotonic()
+        with self._lock:
+            for name in self.jobs:
+                self._due[name] = now + self.interval
+        self._thread = threading.Thread(target=self._run, name='scraper', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop scheduling; a job in progress is left to finish on its daemon thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(STOP_TIMEOUT)
+            self._thread = None
+    
+    def stats(self):
+        """
+        Get per-job counters and timestamps (time.time() seconds, or None before the first run).
+        
+        Returns:
+            dict: job name -> {runs, failures, running, last_run, last_duration, last_success,
+                last_error, next_run}
+        """
+        with self._lock:
+            offset = time.time() - time.monotonic()
+            return {name: dict(stats, next_run=self._due[name] + offset if name in self._due else None)
+                    for name, stats in self._stats.items()}
+    
+    def run_job(self, name):
+        """
+        Run one job now: fetch, merge into archives.json and reload the archive index.
+        
+        Returns:
+            bool: True if the job succeeded
+        """
+        started = time.time()
+        start = time.monotonic()
+        with self._lock:
+            self._stats[name]['running'] = True
+            self._stats[name]['last_run'] = started
+        error = None
+        try:
+            merge, fetched = JOB_FETCHERS[name](self.scripts_dir)
+            changed = self._merge(merge)
+            print(f"[INFO] Scrape {name}: {fetched} items fetched, "
+                  f"{'archives updated' if changed else 'no changes'} "
+                  f"in {time.monotonic() - start:.1f} s")
+        except Exception as e:  # Scrapers hit the network; any failure keeps the current data
+            error = f"{type(e).__name__}: {e}"
+            print(f"[WARNING] Scrape {name} failed, keeping the current archives: {error}")
+        with self._lock:
+            stats = self._stats[name]
+            stats['running'] = False
+            stats['runs'] += 1
+            stats['last_duration'] = time.monotonic() - start
+            stats['last_error'] = error
+            if error is None:
+                stats['last_success'] = time.time()
+            else:
+                stats['failures'] += 1
+        return error is None
+    
+    def _merge(self, merge):
+        """Merge into the file on disk, replace it and swap the index. Returns True if it changed."""
+        archives_io = load_script(self.scripts_dir, 'archives_io')
+        # An unreadable file raises here rather than being replaced by the scraped items alone
+        existing = archives_io.load_archives(self.file_path)
+        # The merge works on a copy since the scripts extend the lists they are given
+        output = merge(copy.deepcopy(existing))
+        if output == existing:
+            return False
+        removed = archive_keys(existing) - archive_keys(output)
+        if removed:
+            raise RuntimeError(f"merge would remove {len(removed)} existing item(s), e.g. "
+                               f"{sorted(map(str, removed))[0]}; run the script by hand to accept removals")
+        archives_io.write_archives(self.file_path, output)
+        self.archive_index.reload()
+        return True
+    
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                now = time.monotonic()
+                due = [name for name in self.jobs if self._due[name] <= now]
+                next_due = min(self._due.values())
+            if not due:
+                self._stop.wait(max(0.0, next_due - now))
+                continue
+            for name in due:
+                if self._stop.is_set():
+                    return
+                self.run_job(name)
+                with self._lock:
+                    self._due[name] = time.monotonic() + self.interval
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Request Stage Tracing
+Lightweight timing spans around the stages of the static file app's request
+pipeline, so a latency regression can be pinned to a stage.
+
+The app marks the end of each stage on a per-request trace kept in the WSGI
+environ (one perf_counter() call per stage). Finished traces are aggregated
+into per-stage histograms, served at /__metrics, and a sampled subset can be
+exported as Chrome trace-event JSON files (chrome://tracing, Perfetto).
+
+Stages:
+    normalise   Request path to route key
+    traversal   Path normalisation and directory traversal check (route misses only)
+    lookup      Route table / asset manifest lookup
+    read        File cache lookup, or reading the file on a miss
+    negotiate   Content-Encoding selection (precompressed sibling or gzip variant)
+    respond     Conditional and range checks, headers and start_response
+    send        Iterating a streamed body (ranges) until the server closes it
+
+Cached bodies are handed to the server as one in-memory chunk and uncached
+files through wsgi.file_wrapper, so neither has a send stage.
+
+Trace export is configured from environment variables:
+    ORANGETERRY_TRACE      Fraction of requests to export, e.g. 0.01
+    ORANGETERRY_TRACE_DIR  Output directory (default: traces; server.py never serves
+                           a traces/ directory)
+"""
+
+import bisect
+import json
+import os
+import random
+import threading
+import time
+
+from server_output import DEFAULT_MAX_WINDOWS, DEFAULT_WINDOW, WindowedWriter
+
+
+# Environment variables
+TRACE_RATE_ENV = 'ORANGETERRY_TRACE'
+TRACE_DIR_ENV = 'ORANGETERRY_TRACE_DIR'
+
+# environ key holding the request's RequestTrace
+TRACE_ENVIRON_KEY = 'orangeterry.trace'
+
+# Stage histogram bucket upper bounds (seconds); stages are far shorter than whole requests
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                 0.025, 0.1)
+
+# Exported requests held in memory between writes (more are discarded)
+MAX_PENDING_TRACES = 20000
+
+
+class RequestTrace:
+    """Stage spans of one request, as (stage, start, end) perf_counter() times."""
+    
+    __slots__ = ('start', 'last', 'spans')
+    
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.spans = []
+    
+    def mark(self, stage):
+        """End the current stage (it started where the previous one ended)."""
+        now = time.perf_counter()
+        self.spans.append((stage, self.last, now))
+        self.last = now
+
+
+class _NullTrace:
+    """Stand-in used when a request is not traced; mark() does nothing."""
+    
+    __slots__ = ()
+    
+    def mark(self, stage):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class RequestTracer:
+    """
+    Aggregates request stage timings and exports a sampled subset as Chrome traces.
+    
+    Histograms are always kept; exporting starts a background writer thread
+    and only runs when sample_rate is above zero.
+    """
+    
+    def __init__(self, output_dir='traces', sample_rate=0.0, buckets=STAGE_BUCKETS,
+                 window=DEFAULT_WINDOW, max_windows=DEFAULT_MAX_WINDOWS):
+        self.sample_rate = sample_rate
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> [per-bucket counts..., +Inf bucket count, count, sum]
+        self._writer = WindowedWriter(output_dir, 'trace', ('.json',), self._write, MAX_PENDING_TRACES,
+                                      window=window, max_windows=max_windows, name='tracer')
+        self.output_dir = self._writer.output_dir
+        self.pid = self._writer.pid
+        self.traced = 0
+        self.exported = 0
+    
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        """
+        Create a tracer from environment variables.
+        
+        Returns:
+            RequestTracer: Always returned; export is enabled only if ORANGETERRY_TRACE is set
+        """
+        try:
+            rate = float(environ.get(TRACE_RATE_ENV) or 0)
+        except ValueError:
+            print(f"[WARNING] Ignoring invalid {TRACE_RATE_ENV}={environ.get(TRACE_RATE_ENV)!r}")
+            rate = 0.0
+        return cls(environ.get(TRACE_DIR_ENV) or 'traces', sample_rate=min(max(rate, 0.0), 1.0))
+    
+    def start(self):
+        """Start the background thread that writes exported traces (if exporting)."""
+        if self.sample_rate > 0:
+            self._writer.start()
+        return self
+    
+    def stop(self):
+        """Write the current window and stop the background thread."""
+        self._writer.stop()
+    
+    def stats(self):
+        """
+        Get per-stage timings and export counters.
+        
+        Returns:
+            dict: Traced and exported request counts, windows written, and
+                'stages' mapping each stage to its count and mean milliseconds
+        """
+        with self._lock:
+            stages = {}
+            for stage, values in self._stages.items():
+                count = values[-2]
+                stages[stage] = {'count': count, 'mean_ms': values[-1] / count * 1000 if count else 0.0}
+            return {
+                'traced': self.traced,
+                'exported': self.exported,
+                'pending': self._writer.pending(),
+                'windows_written': self._writer.windows_written,
+                'stages': stages,
+            }
+    
+    def histograms(self):
+        """
+        Copy the stage histograms.
+        
+        Returns:
+            dict: stage -> [cumulative bucket counts..., +Inf count, sum of seconds]
+        """
+        with self._lock:
+            stages = {stage: list(values) for stage, values in self._stages.items()}
+        histograms = {}
+        for stage, values in stages.items():
+            cumulative = []
+            total = 0
+            for count in values[:len(self.buckets)]:
+                total += count
+                cumulative.append(total)
+            histograms[stage] = cumulative + values[-2:]
+        return histograms
+    
+    def instrument(self, app):
+        """
+        Wrap a WSGI app so each request carries a RequestTrace in its environ.
+        
+        Streamed bodies are wrapped to time the send stage; in-memory and
+        file wrapper bodies are passed through untouched.
+        """
+        def traced(environ, start_response):
+            trace = RequestTrace()
+            environ[TRACE_ENVIRON_KEY] = trace
+            export = self.sample_rate > 0 and random.random() < self.sample_rate
+            response = {}
+            if export:
+                def recording_start_response(status, headers, exc_info=None):
+                    response['status'] = status[:3]
+                    return start_response(status, headers, exc_info)
+            else:
+                recording_start_response = start_response
+            
+            def finish():
+                self.record(trace, environ, response.get('status'), export)
+            
+            try:
+                body = app(environ, recording_start_response)
+            except BaseException:
+                finish()
+                raise
+            if isinstance(body, (list, tuple)):
+                finish()
+                return body
+            file_wrapper = environ.get('wsgi.file_wrapper')
+            if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+                finish()
+                return body
+            return _TimedBody(body, trace, finish)
+        
+        return traced
+    
+    def record(self, trace, environ=None, status=None, export=False):
+        """
+        Add a finished trace's spans to the stage histograms (and the export buffer).
+        
+        Args:
+            trace: RequestTrace
+            environ: WSGI environ of the request (for exported trace details)
+            status: Status code as a string, if known
+            export: Queue the trace for the next Chrome trace file
+        """
+        buckets = self.buckets
+        with self._lock:
+            self.traced += 1
+            for stage, start, end in trace.spans:
+                seconds = end - start
+                histogram = self._stages.get(stage)
+                if histogram is None:
+                    histogram = self._stages[stage] = [0] * (len(buckets) + 2) + [0.0]
+                # Per-bucket counts here; histograms() makes them cumulative
+                histogram[bisect.bisect_left(buckets, seconds)] += 1
+                histogram[-2] += 1
+                histogram[-1] += seconds
+        if export and self._writer.add(self._trace_events(trace, environ or {}, status)):
+            with self._lock:
+                self.exported += 1
+    
+    def _trace_events(self, trace, environ, status):
+        """Chrome 'complete' events for a request and its stages (times in microseconds)."""
+        tid = threading.get_ident()
+        end = trace.spans[-1][2] if trace.spans else trace.last
+        events = [{
+            'name': environ.get('PATH_INFO', '?'),
+            'cat': 'request',
+            'ph': 'X',
+            'ts': round(trace.start * 1e6, 3),
+            'dur': round((end - trace.start) * 1e6, 3),
+            'pid': self.pid,
+            'tid': tid,
+            'args': {
+                'method': environ.get('REQUEST_METHOD'),
+                'status': status,
+                'route': environ.get('orangeterry.route'),
+                'cache': environ.get('orangeterry.cache'),
+            },
+        }]
+        for stage, start, stop in trace.spans:
+            events.append({
+                'name': stage,
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': round(start * 1e6, 3),
+                'dur': round((stop - start) * 1e6, 3),
+                'pid': self.pid,
+                'tid': tid,
+            })
+        return events
+    
+    def flush(self):
+        """
+        Write the traces exported since the last write to one Chrome trace file.
+        
+        Returns:
+            str or None: Path of the file written, or None if nothing was exported
+        """
+        return self._writer.flush()
+    
+    def _write(self, pending, base):
+        """Write one window's exported requests as a Chrome trace file."""
+        path = base + '.json'
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                   'args': {'name': f'server pid {self.pid}'}}]
+        for request_events in pending:
+            events.extend(request_events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, separators=(',', ':'))
+        print(f"[INFO] Tracer: {len(pending)} request(s) written to {path}")
+
+
+class _TimedBody:
+    """Body iterable that closes its trace's send stage when the server closes it."""
+    
+    def __init__(self, body, trace, finish):
+        self.body = body
+        self.trace = trace
+        self.finish = finish
+    
+    def __iter__(self):
+        return iter(self.body)
+    
+    def close(self):
+        try:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.trace.mark('send')
+            self.finish()
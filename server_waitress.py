@@ -17,98 +17,14 @@ import traceback
 import time
 from pathlib import Path
 from waitress import serve
-from wsgiref.simple_server import make_server
-from wsgiref.util import FileWrapper
-import mimetypes
+
+# Share the static WSGI app (file cache, ETag / 304 handling, ranges, file_wrapper
+# streaming) with server.py
+from server import create_static_file_app
 
 # Default port
 DEFAULT_PORT = 8000
 
-def create_static_file_app(directory):
-    """
-    Create a WSGI application for serving static files.
-    
-    Args:
-        directory: Directory to serve files from
-        
-    Returns:
-        WSGI application function
-    """
-    abs_directory = os.path.abspath(directory)
-    
-    def application(environ, start_response):
-        """WSGI application for serving static files."""
-        try:
-            # Get the requested path
-            path = environ.get('PATH_INFO', '/')
-            
-            # Remove leading slash and resolve path
-            if path == '/':
-                path = 'index.html'
-            else:
-                path = path.lstrip('/')
-            
-            # Build full file path
-            file_path = os.path.join(abs_directory, path)
-            
-            # Security: prevent directory traversal
-            file_path = os.path.normpath(file_path)
-            if not file_path.startswith(abs_directory):
-                # Path outside of served directory
-                status = '403 Forbidden'
-                headers = [('Content-Type', 'text/plain')]
-                start_response(status, headers)
-                return [b'403 Forbidden: Access denied']
-            
-            # Check if file exists
-            if not os.path.exists(file_path) or not os.path.isfile(file_path):
-                status = '404 Not Found'
-                headers = [('Content-Type', 'text/plain')]
-                start_response(status, headers)
-                return [f'404 Not Found: {path}'.encode()]
-            
-            # Determine content type
-            content_type, _ = mimetypes.guess_type(file_path)
-            if content_type is None:
-                content_type = 'application/octet-stream'
-            
-            # Read and serve file
-            try:
-                with open(file_path, 'rb') as f:
-                    file_data = f.read()
-                
-                # Set headers
-                headers = [
-                    ('Content-Type', content_type),
-                    ('Content-Length', str(len(file_data))),
-                    ('Access-Control-Allow-Origin', '*'),
-                    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
-                    ('Access-Control-Allow-Headers', '*'),
-                    ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-                ]
-                
-                status = '200 OK'
-                start_response(status, headers)
-                return [file_data]
-                
-            except IOError as e:
-                print(f"[ERROR] Error reading file {file_path}: {e}")
-                status = '500 Internal Server Error'
-                headers = [('Content-Type', 'text/plain')]
-                start_response(status, headers)
-                return [b'500 Internal Server Error: Could not read file']
-                
-        except Exception as e:
-            # Log the error for debugging
-            print(f"[ERROR] Unexpected error in WSGI application: {type(e).__name__}: {e}")
-            traceback.print_exc()
-            status = '500 Internal Server Error'
-            headers = [('Content-Type', 'text/plain')]
-            start_response(status, headers)
-            return [f'500 Internal Server Error: {str(e)}'.encode()]
-    
-    return application
-
 def start_server(port=DEFAULT_PORT):
     """
     Starts a Waitress HTTP server and opens the site in a browser.
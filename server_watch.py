@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Filesystem Watcher
+Watches the served directory and reports changed files so server.py can
+refresh its route table and drop stale cache entries without a restart.
+
+Uses inotify on Linux (through ctypes, no extra dependencies) and falls back
+to polling file modification times elsewhere. Bursts of writes - the scrapers
+rewrite data/archives.json in one go, the image scripts write a batch of
+logos - are debounced into a single batch of changed paths.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+
+# Quiet period after the last event before a batch of changes is reported (seconds)
+DEFAULT_DEBOUNCE = 0.25
+
+# A continuous stream of events is still flushed at least this often (seconds)
+DEFAULT_MAX_DELAY = 2.0
+
+# Polling fallback scan interval (seconds)
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Directory names never watched or served (hidden directories are always skipped); logs/ holds
+# --access-log output, which records client addresses and user agents, and profiles/ and
+# traces/ the request profiler's and tracer's dumps
+SKIP_DIRS = {'__pycache__', 'node_modules', 'logs', 'profiles', 'traces'}
+
+# inotify constants (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_hidden(name):
+    """Return True for names the server never serves (dotfiles, editor temp files)."""
+    return name.startswith('.') or name.endswith('~') or name in SKIP_DIRS
+
+
+class FileWatcher:
+    """
+    Background thread reporting changed files under a directory.
+    
+    The callback receives a set of changed paths relative to the directory
+    (POSIX separators), or None when the whole tree must be treated as changed
+    (a directory was created, removed or renamed, or the event queue
+    overflowed). It returns the number of cache entries it invalidated, which
+    is accumulated in the watcher's counters.
+    """
+    
+    def __init__(self, directory, on_change, debounce=DEFAULT_DEBOUNCE,
+                 max_delay=DEFAULT_MAX_DELAY, poll_interval=DEFAULT_POLL_INTERVAL,
+                 use_inotify=True):
+        self.directory = os.path.abspath(directory)
+        self.on_change = on_change
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.backend = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.events = 0
+        self.batches = 0
+        self.paths_changed = 0
+        self.full_refreshes = 0
+        self.invalidations = 0
+    
+    def start(self):
+        """
+        Start watching in a daemon thread.
+        
+        Returns:
+            str: The backend in use ('inotify' or 'polling')
+        """
+        inotify = None
+        if self.use_inotify and sys.platform.startswith('linux'):
+            try:
+                inotify = _Inotify()
+            except OSError as e:
+                print(f"[WARNING] inotify unavailable ({e}), falling back to polling")
+        if inotify is not None:
+            self.backend = 'inotify'
+            target = lambda: self._run_inotify(inotify)
+        else:
+            self.backend = 'polling'
+            target = self._run_polling
+        self._thread = threading.Thread(target=target, name='file-watcher', daemon=True)
+        self._thread.start()
+        return self.backend
+    
+    def stop(self, timeout=2.0):
+        """Stop the watcher thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def stats(self):
+        """
+        Get watcher counters.
+        
+        Returns:
+            dict: Backend, raw event count, flushed batches, changed paths and invalidations
+        """
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'events': self.events,
+                'batches': self.batches,
+                'paths_changed': self.paths_changed,
+                'full_refreshes': self.full_refreshes,
+                'invalidations': self.invalidations,
+            }
+    
+    def _flush(self, paths):
+        """Report one debounced batch to the callback."""
+        try:
+            invalidated = self.on_change(paths) or 0
+        except Exception as e:
+            print(f"[ERROR] File watcher callback failed: {type(e).__name__}: {e}")
+            invalidated = 0
+        with self._lock:
+            self.batches += 1
+            self.invalidations += invalidated
+            if paths is None:
+                self.full_refreshes += 1
+            else:
+                self.paths_changed += len(paths)
+    
+    def _run_inotify(self, inotify):
+        """Event loop for the inotify backend."""
+        watches = {}  # watch descriptor -> relative directory path ('' for the root)
+        pending = set()
+        full_refresh = False
+        first_event = last_event = None
+        
+        def add_tree(rel_dir):
+            root = os.path.join(self.directory, rel_dir) if rel_dir else self.directory
+            for dirpath, dirnames, _ in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not is_hidden(d)]
+                rel = os.path.relpath(dirpath, self.directory).replace(os.sep, '/')
+                rel = '' if rel == '.' else rel
+                try:
+                    watches[inotify.add_watch(dirpath, WATCH_MASK)] = rel
+                except OSError as e:
+                    print(f"[WARNING] Cannot watch {dirpath}: {e}")
+        
+        try:
+            add_tree('')
+            while not self._stop.is_set():
+                timeout = 0.5
+                if first_event is not None:
+                    now = time.monotonic()
+                    timeout = max(0.0, min(last_event + self.debounce, first_event + self.max_delay) - now)
+                for wd, mask, name in inotify.read_events(timeout):
+                    with self._lock:
+                        self.events += 1
+                    now = time.monotonic()
+                    if first_event is None:
+                        first_event = now
+                    last_event = now
+                    if mask & IN_Q_OVERFLOW:
+                        full_refresh = True
+                        continue
+                    if mask & IN_IGNORED:
+                        watches.pop(wd, None)
+                        continue
+                    rel_dir = watches.get(wd)
+                    if rel_dir is None or (name and is_hidden(name)):
+                        continue
+                    rel_path = f"{rel_dir}/{name}" if rel_dir and name else (name or rel_dir)
+                    if mask & IN_ISDIR or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                        # Directory structure changed: watch new directories, rescan everything
+                        if mask & (IN_CREATE | IN_MOVED_TO) and name:
+                            add_tree(rel_path)
+                        full_refresh = True
+                    elif name:
+                        pending.add(rel_path)
+                
+                if first_event is not None:
+                    now = time.monotonic()
+                    if now - last_event >= self.debounce or now - first_event >= self.max_delay:
+                        self._flush(None if full_refresh else pending)
+                        pending = set()
+                        full_refresh = False
+                        first_event = last_event = None
+        finally:
+            inotify.close()
+    
+    def _snapshot(self):
+        """Return {relative path: (mtime_ns, size)} for every visible file."""
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames[:] = [d for d in dirnames if not is_hidden(d)]
+            rel_dir = os.path.relpath(dirpath, self.directory).replace(os.sep, '/')
+            prefix = '' if rel_dir == '.' else rel_dir + '/'
+            for filename in filenames:
+                if is_hidden(filename):
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                snapshot[prefix + filename] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+    
+    def _run_polling(self):
+        """Scan loop for the polling backend; a change is reported once it has been stable for one interval."""
+        previous = self._snapshot()
+        unsettled = set()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            changed = {path for path in previous.keys() | current.keys()
+                       if previous.get(path) != current.get(path)}
+            with self._lock:
+                self.events += len(changed)
+            settled = unsettled - changed
+            unsettled = (unsettled | changed) - settled
+            if settled:
+                self._flush(settled)
+            previous = current
+
+
+class _Inotify:
+    """Minimal ctypes binding for the Linux inotify API."""
+    
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+    
+    def add_watch(self, path, mask):
+        """Add (or update) a watch and return its descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+    
+    def read_events(self, timeout):
+        """
+        Wait up to timeout seconds and return the events that are ready.
+        
+        Returns:
+            list: (watch descriptor, mask, name) tuples
+        """
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return []
+            raise
+        if not ready:
+            return []
+        buffer = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+    
+    def close(self):
+        """Close the inotify file descriptor."""
+        os.close(self.fd)
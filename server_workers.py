@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Pre-Fork Worker Supervisor
+Runs several Waitress worker processes behind one listening address so the
+Python work in the WSGI app is spread across CPU cores instead of being
+serialised by one process's GIL.
+
+Workers either inherit a single listening socket from the supervisor, or
+(with reuse_port) each get their own SO_REUSEPORT socket so the kernel
+balances new connections between them. Every socket is bound by the
+supervisor before the first fork, so a port in use fails the start instead of
+crash-looping the workers, and the supervisor keeps them open for the life of
+the server. The supervisor restarts workers that crash and, on SIGTERM/SIGINT,
+asks every worker to stop accepting and drain its in-flight requests before
+exiting.
+
+On SIGHUP the supervisor rolls through the workers one at a time: it forks a
+replacement (which builds its app from the tree as it is now), waits until
+the replacement is ready, then drains and stops the old worker. The
+replacement inherits the socket the old worker listened on (with reuse_port,
+that worker's own socket), so connections waiting in its accept queue are
+picked up rather than reset, and a deploy drops no requests.
+
+POSIX only (requires os.fork); server.py falls back to a single process elsewhere.
+"""
+
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from waitress import wasyncore
+from waitress.task import WSGITask
+
+
+# Seconds a stopping worker waits for in-flight requests before closing connections
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+# While draining, keep-alive connections idle this long are closed (busy ones are told
+# to close with their next response instead, so a request racing the close is not lost)
+DRAIN_IDLE_GRACE = 0.5
+
+# Workers that die sooner than this after starting are restarted with a delay
+MIN_WORKER_UPTIME = 1.0
+RESTART_DELAY = 1.0
+
+# Listen backlog for sockets created here
+LISTEN_BACKLOG = 1024
+
+# Seconds a replacement worker may take to become ready during a rolling reload
+DEFAULT_READY_TIMEOUT = 60.0
+
+
+def supports_prefork():
+    """Return True if this platform can run pre-forked workers."""
+    return hasattr(os, 'fork')
+
+
+def supports_reuse_port():
+    """Return True if SO_REUSEPORT is available."""
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+def create_listen_socket(host, port, reuse_port=False):
+    """
+    Create a bound, listening TCP socket.
+    
+    Args:
+        host: Address to bind
+        port: Port to bind
+        reuse_port: Set SO_REUSEPORT so several processes can bind the same port
+    
+    Returns:
+        socket.socket: The listening socket
+    """
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+class _DrainingTask(WSGITask):
+    """WSGITask whose response carries Connection: close (used once a server is draining)."""
+    
+    def build_response_header(self):
+        self.set_close_on_finish()
+        return super().build_response_header()
+
+
+def serve_until_stopped(server, should_stop, drain_timeout=DEFAULT_DRAIN_TIMEOUT):
+    """
+    Run a Waitress server's event loop until asked to stop, then drain it.
+    
+    Once should_stop() returns True the server stops accepting connections.
+    Each remaining keep-alive connection gets Connection: close on its next
+    response, or is closed once it has been idle for DRAIN_IDLE_GRACE, and
+    the loop keeps running until every in-flight response has been sent or
+    drain_timeout expires.
+    
+    Args:
+        server: Server returned by waitress.server.create_server (single socket)
+        should_stop: Callable returning True when shutdown has been requested
+        drain_timeout: Maximum seconds to wait for in-flight requests
+    
+    Returns:
+        int: Number of connections still open when the drain finished (0 if fully drained)
+    """
+    loop_timeout = min(server.adj.asyncore_loop_timeout, 0.5)
+    deadline = None
+    try:
+        while True:
+            wasyncore.loop(timeout=loop_timeout, map=server._map,
+                           use_poll=server.adj.asyncore_use_poll, count=1)
+            if deadline is None:
+                if not should_stop():
+                    continue
+                # Stop accepting: close the listening socket, keep existing connections
+                deadline = time.monotonic() + drain_timeout
+                server.accepting = False
+                server.del_channel()
+                server.socket.close()
+                for channel in list(server.active_channels.values()):
+                    channel.task_class = _DrainingTask
+            idle_before = time.time() - DRAIN_IDLE_GRACE
+            for channel in list(server.active_channels.values()):
+                if not channel.requests and channel.last_activity <= idle_before:
+                    channel.will_close = True
+            if not server.active_channels or time.monotonic() >= deadline:
+                break
+    finally:
+        remaining = len(server.active_channels)
+        server.task_dispatcher.shutdown()
+        wasyncore.close_all(server._map)
+    return remaining
+
+
+class Supervisor:
+    """
+    Forks and supervises a fixed number of Waitress worker processes.
+    
+    Each worker calls make_app(worker_id) after the fork, so caches, watcher threads
+    and executors are created per process, then serve_worker(app, sock,
+    should_stop) runs the chosen backend on the listening socket until
+    should_stop() turns True and the backend has drained. on_worker_exit(app)
+    runs in the worker afterwards. wait_ready(app), if given, blocks until a
+    worker's app is ready to take traffic; a rolling reload (SIGHUP) waits for
+    it before stopping the worker being replaced.
+    """
+    
+    def __init__(self, make_app, serve_worker, host, port, workers, reuse_port=False,
+                 drain_timeout=DEFAULT_DRAIN_TIMEOUT, on_worker_exit=None, wait_ready=None,
+                 ready_timeout=DEFAULT_READY_TIMEOUT):
+        self.make_app = make_app
+        self.on_worker_exit = on_worker_exit
+        self.wait_ready = wait_ready
+        self.ready_timeout = ready_timeout
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.serve_worker = serve_worker
+        self.reuse_port = reuse_port and supports_reuse_port()
+        self.drain_timeout = drain_timeout
+        self.workers = {}  # pid -> (worker id, start time)
+        self.stopping = False
+        self.reload_requested = False
+        self.restarts = 0
+        self.reloads = 0
+        self.listen_socket = None
+        self.worker_sockets = {}  # worker id -> its SO_REUSEPORT socket (reuse_port only)
+        self._retiring = set()  # pids of replaced workers that are draining
+        self._roll_queue = []  # pids still to be replaced by the current rolling reload
+        self._replacement = None  # (new pid, old pid, ready pipe fd, deadline) being started
+    
+    def run(self):
+        """
+        Start the workers and supervise them until shutdown.
+        
+        Returns:
+            int: Exit status for the supervisor process
+        """
+        # Bind errors surface here, in the parent, rather than in every forked worker
+        if self.reuse_port:
+            # One socket per worker id, reused by its restarts and reload replacements
+            for worker_id in range(self.worker_count):
+                self.worker_sockets[worker_id] = create_listen_socket(self.host, self.port, reuse_port=True)
+        else:
+            # One socket, inherited by every worker
+            self.listen_socket = create_listen_socket(self.host, self.port)
+        
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._request_reload)
+        
+        for worker_id in range(self.worker_count):
+            self._spawn(worker_id)
+        
+        deadline = None
+        while self.workers:
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + self.drain_timeout + 5.0
+                self._abort_reload()
+                self._signal_workers(signal.SIGTERM)
+            elif not self.stopping:
+                self._step_reload()
+            if deadline is not None and time.monotonic() >= deadline:
+                print("[WARNING] Workers did not stop in time, killing them")
+                self._signal_workers(signal.SIGKILL)
+                deadline = float('inf')
+            
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.2)
+                continue
+            
+            worker_id, started = self.workers.pop(pid, (None, 0.0))
+            if pid in self._retiring:
+                # Replaced by a rolling reload and now drained
+                self._retiring.discard(pid)
+                continue
+            if self._replacement is not None and pid == self._replacement[0]:
+                code = os.waitstatus_to_exitcode(status)
+                print(f"[ERROR] Replacement worker {worker_id} exited with status {code} before it was "
+                      f"ready; keeping the current workers")
+                self._abort_reload()
+                continue
+            if self._replacement is not None and pid == self._replacement[1]:
+                # The worker being replaced died: its replacement, already starting, takes over
+                continue
+            if pid in self._roll_queue:
+                self._roll_queue.remove(pid)
+            if worker_id is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            print(f"[WARNING] Worker {worker_id} (pid {pid}) exited with status {code}, restarting")
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                # Crashing on startup: avoid a tight fork loop
+                time.sleep(RESTART_DELAY)
+            self.restarts += 1
+            self._spawn(worker_id)
+        
+        if self.listen_socket is not None:
+            self.listen_socket.close()
+        for sock in self.worker_sockets.values():
+            sock.close()
+        print("[INFO] All workers stopped.")
+        return 0
+    
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+    
+    def _request_reload(self, signum, frame):
+        self.reload_requested = True
+    
+    def _step_reload(self):
+        """Advance a rolling reload: start the next replacement, or retire the worker it replaces."""
+        if self.reload_requested:
+            self.reload_requested = False
+            if self._roll_queue or self._replacement is not None:
+                # Already rolling: replace the workers started before this request too
+                self._roll_queue.extend(pid for pid in self.workers
+                                        if pid not in self._roll_queue and pid not in self._retiring
+                                        and (self._replacement is None or pid != self._replacement[0]))
+            else:
+                self._roll_queue = [pid for pid in self.workers if pid not in self._retiring]
+                print(f"[INFO] Reloading: replacing {len(self._roll_queue)} worker(s) one at a time")
+        
+        if self._replacement is None:
+            while self._roll_queue and self._roll_queue[0] not in self.workers:
+                self._roll_queue.pop(0)
+            if not self._roll_queue:
+                return
+            old_pid = self._roll_queue.pop(0)
+            worker_id = self.workers[old_pid][0]
+            read_fd, write_fd = os.pipe()
+            new_pid = self._spawn(worker_id, ready_fd=write_fd)
+            os.close(write_fd)
+            self._replacement = (new_pid, old_pid, read_fd, time.monotonic() + self.ready_timeout)
+            return
+        
+        new_pid, old_pid, read_fd, deadline = self._replacement
+        readable, _, _ = select.select([read_fd], [], [], 0)
+        if readable and os.read(read_fd, 1):
+            os.close(read_fd)
+            self._replacement = None
+            worker_id = self.workers.get(new_pid, (None,))[0]
+            if old_pid in self.workers:
+                # The replacement is serving: drain and stop the worker it replaces
+                self._retiring.add(old_pid)
+                os.kill(old_pid, signal.SIGTERM)
+            print(f"[INFO] Worker {worker_id} replaced (pid {old_pid} -> {new_pid})")
+            if not self._roll_queue:
+                self.reloads += 1
+                print("[INFO] Reload complete")
+        elif time.monotonic() >= deadline:
+            print(f"[ERROR] Replacement worker (pid {new_pid}) was not ready within "
+                  f"{self.ready_timeout:.0f}s; keeping the current workers")
+            self._retiring.add(new_pid)
+            os.kill(new_pid, signal.SIGTERM)
+            self._abort_reload()
+    
+    def _abort_reload(self):
+        """Forget a rolling reload in progress (the replacement, if any, keeps running or exits)."""
+        if self._replacement is not None:
+            os.close(self._replacement[2])
+            self._replacement = None
+        self._roll_queue = []
+    
+    def _signal_workers(self, signum):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    
+    def _spawn(self, worker_id, ready_fd=None):
+        """
+        Fork one worker process.
+        
+        Args:
+            worker_id: Worker number
+            ready_fd: Pipe the worker writes a byte to once its app is ready (rolling reload)
+        
+        Returns:
+            int: The worker's pid
+        """
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (worker_id, time.monotonic())
+            return pid
+        # Child process: never return into the supervisor loop
+        code = 1
+        try:
+            if self._replacement is not None:
+                os.close(self._replacement[2])
+            code = self._run_worker(worker_id, ready_fd)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    
+    def _run_worker(self, worker_id, ready_fd=None):
+        """Serve requests in a worker process until SIGTERM/SIGINT, then drain."""
+        stop_requested = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.append(signum))
+        signal.signal(signal.SIGINT, lambda signum, frame: stop_requested.append(signum))
+        if hasattr(signal, 'SIGHUP'):
+            # Reloads are driven by the supervisor
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        
+        if self.reuse_port:
+            sock = self.worker_sockets[worker_id]
+            # The other workers' sockets are theirs to accept on
+            for other_id, other in self.worker_sockets.items():
+                if other_id != worker_id:
+                    other.close()
+        else:
+            sock = self.listen_socket
+        
+        app = self.make_app(worker_id)
+        print(f"[INFO] Worker {worker_id} (pid {os.getpid()}) serving")
+        sys.stdout.flush()
+        if ready_fd is not None:
+            threading.Thread(target=self._report_ready, args=(app, ready_fd), daemon=True).start()
+        
+        remaining = self.serve_worker(app, sock, lambda: bool(stop_requested))
+        if remaining:
+            print(f"[WARNING] Worker {worker_id} closed {remaining} connection(s) at the drain deadline")
+        if self.on_worker_exit is not None:
+            self.on_worker_exit(app)
+        return 0
+    
+    def _report_ready(self, app, ready_fd):
+        """Tell the supervisor (through ready_fd) once the worker's app is ready."""
+        try:
+            if self.wait_ready is not None:
+                self.wait_ready(app)
+            os.write(ready_fd, b'1')
+        finally:
+            os.close(ready_fd)
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Static File App Tests
+The in-memory FileCache and RouteTable, and conditional GET (ETag,
+Last-Modified, 304), byte ranges (206, 416, If-Range) and content coding
+negotiation (precompressed siblings, on-the-fly gzip) against
+create_static_file_app serving a temporary directory.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from wsgiref.util import setup_testing_defaults
+
+from server import (DynamicCompressor, FileCache, RouteTable, acceptable_encodings, build_file_entry,
+                    create_static_file_app, http_date, make_etag, make_stat_etag)
+
+
+BODY = b'0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def request(app, path, **headers):
+    """
+    Call a WSGI app once.
+    
+    Args:
+        app: WSGI application
+        path: Request path
+        **headers: Extra environ keys, e.g. HTTP_RANGE='bytes=0-4'
+    
+    Returns:
+        tuple: (status, headers dict, body bytes)
+    """
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+    environ.update(headers)
+    setup_testing_defaults(environ)
+    response = {}
+    
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(response_headers)
+    
+    result = app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+def cache_entry(data, mtime_ns=1, size=None):
+    """Build a FileCache entry holding data."""
+    size = len(data) if size is None else size
+    return build_file_entry(data, mtime_ns, size, '"etag"', 'text/plain')
+
+
+class FileCacheTests(unittest.TestCase):
+    """Revalidation, the byte budget and LRU eviction."""
+    
+    def test_hit_and_revalidation(self):
+        cache = FileCache()
+        cache.put('/a', cache_entry(b'aaaa', mtime_ns=5))
+        self.assertIsNotNone(cache.get('/a', 5, 4))
+        # A new mtime or size means the file changed: the stale entry is dropped
+        self.assertIsNone(cache.get('/a', 6, 4))
+        self.assertEqual(cache.stats()['entries'], 0)
+        cache.put('/a', cache_entry(b'aaaa', mtime_ns=5))
+        self.assertIsNone(cache.get('/a', 5, 5))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['bytes']), (1, 2, 0))
+    
+    def test_least_recently_used_is_evicted(self):
+        cache = FileCache(max_bytes=30, max_entry_bytes=30)
+        for path in ('/a', '/b', '/c'):
+            cache.put(path, cache_entry(b'x' * 10))
+        cache.get('/a', 1, 10)
+        cache.put('/d', cache_entry(b'x' * 10))
+        self.assertIsNone(cache.get('/b', 1, 10))
+        for path in ('/a', '/c', '/d'):
+            self.assertIsNotNone(cache.get(path, 1, 10), path)
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['bytes'], stats['evictions']), (3, 30, 1))
+    
+    def test_byte_budget(self):
+        cache = FileCache(max_bytes=25, max_entry_bytes=20)
+        self.assertFalse(cache.put('/big', cache_entry(b'x' * 21)))
+        self.assertTrue(cache.put('/a', cache_entry(b'x' * 20)))
+        self.assertTrue(cache.put('/b', cache_entry(b'x' * 10)))
+        self.assertEqual(cache.stats()['bytes'], 10)
+        self.assertIsNone(cache.get('/a', 1, 20))
+        # Replacing an entry releases its bytes first
+        cache.put('/b', cache_entry(b'x' * 15))
+        self.assertEqual(cache.stats()['bytes'], 15)
+    
+    def test_invalidate(self):
+        cache = FileCache()
+        cache.put('/a', cache_entry(b'a'))
+        cache.put('/b', cache_entry(b'b'))
+        self.assertTrue(cache.invalidate('/a'))
+        self.assertFalse(cache.invalidate('/a'))
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertTrue(cache.invalidate())
+        self.assertEqual((cache.stats()['entries'], cache.stats()['bytes']), (0, 0))
+    
+    def test_entry_is_kept_under_the_version_asked_for(self):
+        # The file changed between the route's stat and the load: later lookups with the
+        # route's version still hit instead of reloading on every request
+        cache = FileCache()
+        load = lambda: cache_entry(b'newer', mtime_ns=2)
+        self.assertEqual(cache.get_or_load('/a', 1, 4, load)[1], 'miss')
+        entry, outcome = cache.get_or_load('/a', 1, 4, load)
+        self.assertEqual((outcome, entry.data), ('hit', b'newer'))
+        self.assertEqual(cache.get_or_load('/a', 2, 5, load)[1], 'miss')
+
+
+class SingleFlightTests(unittest.TestCase):
+    """Concurrent get_or_load misses for one file version share one load."""
+    
+    def run_concurrently(self, cache, load, threads=8):
+        results = []
+        errors = []
+        
+        def worker():
+            try:
+                results.append(cache.get_or_load('/a', 1, 4, load))
+            except Exception as e:
+                errors.append(e)
+        
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        return workers, results, errors
+    
+    def test_concurrent_misses_load_once(self):
+        cache = FileCache()
+        calls = []
+        release = threading.Event()
+        
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return cache_entry(b'data')
+        
+        workers, results, _ = self.run_concurrently(cache, load)
+        # Let every thread reach the cache before the load finishes
+        while cache.stats()['misses'] < len(workers):
+            release.wait(0.01)
+        release.set()
+        for thread in workers:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(outcome for _, outcome in results), ['coalesced'] * 7 + ['miss'])
+        self.assertEqual(len({id(entry) for entry, _ in results}), 1)
+        self.assertEqual(cache.get_or_load('/a', 1, 4, load)[1], 'hit')
+    
+    def test_load_error_is_shared_then_retried(self):
+        cache = FileCache()
+        calls = []
+        release = threading.Event()
+        
+        def failing_load():
+            calls.append(1)
+            release.wait(5)
+            raise OSError('read failed')
+        
+        workers, results, errors = self.run_concurrently(cache, failing_load, threads=4)
+        while cache.stats()['misses'] < len(workers):
+            release.wait(0.01)
+        release.set()
+        for thread in workers:
+            thread.join(5)
+        self.assertEqual((len(calls), len(errors), results), (1, 4, []))
+        self.assertEqual(cache.get_or_load('/a', 1, 4, lambda: cache_entry(b'data'))[1], 'miss')
+
+
+class RouteTableTests(unittest.TestCase):
+    """URL path lookups in the route table and its atomic rebuilds."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for rel_path, data in (('index.html', b'<html></html>'), ('styles/main.css', b'body {}'),
+                               ('.env', b'SECRET=1'), ('.git/config', b'[core]'),
+                               ('logs/access.log', b'{}'), ('big.bin', b'x' * 100)):
+            self.write(rel_path, data)
+        self.table = RouteTable(self.directory, refresh_interval=None, max_hash_bytes=64)
+    
+    def write(self, rel_path, data):
+        file_path = os.path.join(self.directory, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        return file_path
+    
+    def touch_later(self, file_path):
+        """Move a file's mtime on so it reads as changed even on coarse-timestamp filesystems."""
+        st = os.stat(file_path)
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    
+    def test_lookups(self):
+        self.assertEqual(sorted(self.table.routes), ['big.bin', 'index.html', 'styles/main.css'])
+        route = self.table.lookup('styles/main.css')
+        self.assertEqual(route.file_path, os.path.join(self.directory, 'styles', 'main.css'))
+        self.assertEqual((route.content_type, route.size), ('text/css', 7))
+        self.assertEqual(route.etag, make_etag(b'body {}'))
+        # Hidden files and server output are never routed
+        for url_path in ('.env', '.git/config', 'logs/access.log', 'missing.html', 'styles'):
+            self.assertIsNone(self.table.lookup(url_path), url_path)
+    
+    def test_large_files_get_a_stat_etag(self):
+        route = self.table.lookup('big.bin')
+        self.assertEqual(route.etag, make_stat_etag(route.mtime_ns, route.size))
+        self.assertEqual(route.content_type, 'application/octet-stream')
+    
+    def test_rebuild_swaps_in_a_new_table(self):
+        before = self.table.routes
+        unchanged = before['index.html']
+        self.touch_later(self.write('styles/main.css', b'body { color: red }'))
+        self.write('new.js', b'//')
+        os.remove(os.path.join(self.directory, 'big.bin'))
+        self.table.rebuild()
+        # The old snapshot is left intact for readers still holding it
+        self.assertEqual(sorted(before), ['big.bin', 'index.html', 'styles/main.css'])
+        self.assertEqual(sorted(self.table.routes), ['index.html', 'new.js', 'styles/main.css'])
+        self.assertIs(self.table.lookup('index.html'), unchanged)
+        self.assertEqual(self.table.lookup('styles/main.css').etag, make_etag(b'body { color: red }'))
+    
+    def test_update(self):
+        before = self.table.routes
+        self.touch_later(self.write('index.html', b'<html>2</html>'))
+        self.write('new.js', b'//')
+        os.remove(os.path.join(self.directory, 'big.bin'))
+        changed = self.table.update(['index.html', 'new.js', 'big.bin', 'styles/main.css', 'gone.txt'])
+        self.assertEqual(changed, 3)
+        self.assertIsNot(self.table.routes, before)
+        self.assertIn('big.bin', before)
+        self.assertEqual(sorted(self.table.routes), ['index.html', 'new.js', 'styles/main.css'])
+        self.assertEqual(self.table.lookup('index.html').size, len(b'<html>2</html>'))
+    
+    def test_readers_never_see_a_partial_table(self):
+        for i in range(50):
+            self.write(f'pages/{i}.html', b'page')
+        self.table.rebuild()
+        stop = threading.Event()
+        missing = []
+        
+        def read():
+            while not stop.is_set():
+                routes = self.table.routes
+                missing.extend(i for i in range(50) if f'pages/{i}.html' not in routes)
+        
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for thread in readers:
+            thread.start()
+        for _ in range(20):
+            self.table.rebuild()
+        stop.set()
+        for thread in readers:
+            thread.join(5)
+        self.assertEqual(missing, [])
+    
+    def test_lookup_refreshes_in_the_background(self):
+        self.table.refresh_interval = 0
+        self.write('late.html', b'late')
+        deadline = time.monotonic() + 5
+        while self.table.lookup('late.html') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNotNone(self.table.lookup('late.html'))
+
+
+class StaticAppTestCase(unittest.TestCase):
+    """Serves a temporary directory holding data.txt."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        with open(os.path.join(self.directory, 'data.txt'), 'wb') as f:
+            f.write(BODY)
+        self.app = create_static_file_app(self.directory, file_cache=self.make_cache())
+    
+    def make_cache(self):
+        return FileCache()
+    
+    def get(self, path='/data.txt', **headers):
+        return request(self.app, path, **headers)
+
+
+class ConditionalGetTests(StaticAppTestCase):
+    """If-None-Match and If-Modified-Since answered with 304 or the file."""
+    
+    def test_full_response_has_validators(self):
+        status, headers, body = self.get()
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, BODY)
+        self.assertTrue(headers['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', headers)
+    
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()[1]['ETag']
+        status, headers, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['ETag'], etag)
+    
+    def test_weak_and_listed_etags_match(self):
+        etag = self.get()[1]['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'"other", W/{etag}')[0], '304 Not Modified')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='*')[0], '304 Not Modified')
+    
+    def test_different_etag_sends_file(self):
+        status, _, body = self.get(HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, BODY)
+    
+    def test_if_modified_since(self):
+        last_modified = self.get()[1]['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified)[0], '304 Not Modified')
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(0))[0], '200 OK')
+    
+    def test_if_none_match_takes_precedence(self):
+        last_modified = self.get()[1]['Last-Modified']
+        status = self.get(HTTP_IF_NONE_MATCH='"stale"', HTTP_IF_MODIFIED_SINCE=last_modified)[0]
+        self.assertEqual(status, '200 OK')
+    
+    def test_etag_changes_with_content(self):
+        etag = self.get()[1]['ETag']
+        file_path = os.path.join(self.directory, 'data.txt')
+        with open(file_path, 'wb') as f:
+            f.write(BODY.upper())
+        # Move the mtime on so the change is visible even on coarse-timestamp filesystems
+        st = os.stat(file_path)
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.app.route_table.rebuild()
+        status, headers, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, BODY.upper())
+        self.assertNotEqual(headers['ETag'], etag)
+
+
+
+class RangeTests(StaticAppTestCase):
+    """Range requests served from the cached copy of the file."""
+    
+    def test_single_range(self):
+        status, headers, body = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(body, BODY[2:6])
+        self.assertEqual(headers['Content-Range'], f'bytes 2-5/{len(BODY)}')
+        self.assertEqual(headers['Content-Length'], '4')
+    
+    def test_open_and_suffix_ranges(self):
+        self.assertEqual(self.get(HTTP_RANGE='bytes=30-')[2], BODY[30:])
+        self.assertEqual(self.get(HTTP_RANGE='bytes=-4')[2], BODY[-4:])
+        # An end past the file is clamped to the last byte
+        self.assertEqual(self.get(HTTP_RANGE='bytes=34-1000')[2], BODY[34:])
+    
+    def test_multiple_ranges(self):
+        status, headers, body = self.get(HTTP_RANGE='bytes=0-1, 10-12')
+        self.assertEqual(status, '206 Partial Content')
+        content_type, _, boundary = headers['Content-Type'].partition('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        parts = body.split(f'--{boundary}'.encode())
+        self.assertEqual(parts[-1], b'--\r\n')
+        self.assertIn(f'Content-Range: bytes 0-1/{len(BODY)}'.encode(), parts[1])
+        self.assertTrue(parts[1].endswith(b'\r\n\r\n' + BODY[0:2] + b'\r\n'))
+        self.assertTrue(parts[2].endswith(b'\r\n\r\n' + BODY[10:13] + b'\r\n'))
+    
+    def test_unsatisfiable_range(self):
+        status, headers, body = self.get(HTTP_RANGE=f'bytes={len(BODY)}-')
+        self.assertEqual(status, '416 Range Not Satisfiable')
+        self.assertEqual(headers['Content-Range'], f'bytes */{len(BODY)}')
+        self.assertEqual(body, b'')
+    
+    def test_malformed_range_sends_whole_file(self):
+        for header in ('bytes=5-2', 'lines=0-1', 'bytes=a-b'):
+            status, _, body = self.get(HTTP_RANGE=header)
+            self.assertEqual(status, '200 OK', header)
+            self.assertEqual(body, BODY)
+    
+    def test_if_range(self):
+        headers = self.get()[1]
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=headers['ETag'])[0],
+                         '206 Partial Content')
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=headers['Last-Modified'])[0],
+                         '206 Partial Content')
+        # A changed (or weak) validator means the client's copy is stale: send it all
+        status, _, body = self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((status, body), ('200 OK', BODY))
+        status = self.get(HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=f'W/{headers["ETag"]}')[0]
+        self.assertEqual(status, '200 OK')
+    
+    def test_range_ignored_for_other_methods(self):
+        self.assertNotEqual(self.get(REQUEST_METHOD='POST', HTTP_RANGE='bytes=0-3')[0],
+                            '206 Partial Content')
+
+
+class StreamedRangeTests(RangeTests):
+    """The same range requests for a file too large to cache, read from disk."""
+    
+    def make_cache(self):
+        return FileCache(max_bytes=1024, max_entry_bytes=len(BODY) - 1)
+    
+    def test_file_is_not_held_in_memory(self):
+        self.get(HTTP_RANGE='bytes=0-3')
+        self.assertEqual(self.app.file_cache.stats()['bytes'], 0)
+
+
+
+class AcceptEncodingTests(unittest.TestCase):
+    """Parsing Accept-Encoding into the codings to offer, best first."""
+    
+    def test_q_values_order_codings(self):
+        self.assertEqual(acceptable_encodings('gzip, br', ['br', 'gzip']), ['br', 'gzip'])
+        self.assertEqual(acceptable_encodings('gzip;q=1.0, br;q=0.5', ['br', 'gzip']), ['gzip', 'br'])
+        self.assertEqual(acceptable_encodings('br;q=0, gzip', ['br', 'gzip']), ['gzip'])
+        self.assertEqual(acceptable_encodings('deflate', ['br', 'gzip']), [])
+        self.assertEqual(acceptable_encodings(None, ['br', 'gzip']), [])
+    
+    def test_wildcards_and_aliases(self):
+        self.assertEqual(acceptable_encodings('*', ['br', 'gzip']), ['br', 'gzip'])
+        self.assertEqual(acceptable_encodings('*;q=0.5, br;q=0', ['br', 'gzip']), ['gzip'])
+        self.assertEqual(acceptable_encodings('x-gzip', ['br', 'gzip']), ['gzip'])
+        self.assertEqual(acceptable_encodings('identity;q=0', ['br', 'gzip']), [])
+        self.assertEqual(acceptable_encodings('gzip, identity;q=0', ['br', 'gzip']), ['gzip'])
+        self.assertEqual(acceptable_encodings('gzip;q=bad', ['br', 'gzip']), [])
+
+
+# Compressible and larger than the on-the-fly gzip minimum
+SCRIPT = b'export const value = 1;\n' * 100
+
+
+class CompressionTests(unittest.TestCase):
+    """Precompressed .br/.gz siblings and on-the-fly gzip for app.js."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.mtime_ns = 1_700_000_000 * 10**9
+        self.write('app.js', SCRIPT)
+        self.write('app.js.br', b'brotli bytes')
+        self.write('app.js.gz', gzip.compress(SCRIPT, mtime=0))
+        self.write('small.js', b'export {};')
+    
+    def write(self, name, data, mtime_ns=None):
+        file_path = os.path.join(self.directory, name)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        mtime_ns = self.mtime_ns if mtime_ns is None else mtime_ns
+        os.utime(file_path, ns=(mtime_ns, mtime_ns))
+    
+    def make_app(self):
+        app = create_static_file_app(self.directory)
+        self.addCleanup(app.compressor.shutdown)
+        return app
+    
+    def wait_for_compression(self, app):
+        deadline = time.monotonic() + 5
+        while app.compressor.stats()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+    
+    def test_best_accepted_sibling_is_sent(self):
+        app = self.make_app()
+        status, headers, body = request(app, '/app.js', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual((status, headers['Content-Encoding'], body), ('200 OK', 'br', b'brotli bytes'))
+        self.assertEqual(headers['Content-Type'], 'text/javascript')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        status, headers, body = request(app, '/app.js', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), SCRIPT)
+    
+    def test_identity_when_no_coding_is_accepted(self):
+        app = self.make_app()
+        for accept_encoding in (None, 'identity;q=0', 'deflate', 'br;q=0, gzip;q=0'):
+            headers = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding else {}
+            status, response_headers, body = request(app, '/app.js', **headers)
+            self.assertEqual(body, SCRIPT, accept_encoding)
+            self.assertNotIn('Content-Encoding', response_headers)
+            # The identity response varies on Accept-Encoding too, so caches keep them apart
+            self.assertEqual(response_headers['Vary'], 'Accept-Encoding')
+    
+    def test_representations_have_distinct_etags(self):
+        app = self.make_app()
+        identity = request(app, '/app.js')[1]['ETag']
+        br = request(app, '/app.js', HTTP_ACCEPT_ENCODING='br')[1]['ETag']
+        self.assertNotEqual(identity, br)
+        status, headers, _ = request(app, '/app.js', HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=br)
+        self.assertEqual((status, headers['Vary']), ('304 Not Modified', 'Accept-Encoding'))
+    
+    def test_stale_sibling_is_ignored(self):
+        self.write('app.js.br', b'old brotli bytes', mtime_ns=self.mtime_ns - 10**10)
+        app = self.make_app()
+        status, headers, body = request(app, '/app.js', HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(body, SCRIPT)
+        self.assertNotIn('Content-Encoding', headers)
+        # gzip is still offered from the up-to-date .gz sibling
+        self.assertEqual(request(app, '/app.js', HTTP_ACCEPT_ENCODING='br, gzip')[1]['Content-Encoding'], 'gzip')
+    
+    def test_ranges_use_the_identity_file(self):
+        app = self.make_app()
+        status, headers, body = request(app, '/app.js', HTTP_ACCEPT_ENCODING='br', HTTP_RANGE='bytes=0-5')
+        self.assertEqual((status, body), ('206 Partial Content', SCRIPT[:6]))
+        self.assertNotIn('Content-Encoding', headers)
+    
+    def test_on_the_fly_gzip(self):
+        os.remove(os.path.join(self.directory, 'app.js.br'))
+        os.remove(os.path.join(self.directory, 'app.js.gz'))
+        app = self.make_app()
+        # The first request schedules compression and is answered with the identity body
+        status, headers, body = request(app, '/app.js', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(body, SCRIPT)
+        identity_etag = headers['ETag']
+        self.wait_for_compression(app)
+        status, headers, body = request(app, '/app.js', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['ETag'], identity_etag[:-1] + '-gzip"')
+        self.assertEqual(gzip.decompress(body), SCRIPT)
+        # Bodies below the minimum size are never compressed
+        request(app, '/small.js', HTTP_ACCEPT_ENCODING='gzip')
+        self.wait_for_compression(app)
+        self.assertNotIn('Content-Encoding', request(app, '/small.js', HTTP_ACCEPT_ENCODING='gzip')[1])
+
+
+class DynamicCompressorTests(unittest.TestCase):
+    """Compressed variants kept per file version."""
+    
+    def setUp(self):
+        self.compressor = DynamicCompressor(min_size=16)
+        self.addCleanup(self.compressor.shutdown)
+    
+    def entry(self, data, etag, content_type='text/css'):
+        return build_file_entry(data, 1, len(data), etag, content_type)
+    
+    def test_variant_per_version(self):
+        entry = self.entry(b'body { margin: 0 }\n' * 20, '"v1"')
+        self.assertTrue(self.compressor.eligible(entry))
+        self.assertTrue(self.compressor.precompress('/a.css', entry))
+        self.assertFalse(self.compressor.precompress('/a.css', entry))
+        variant = self.compressor.get_variant('/a.css', entry)
+        self.assertEqual((variant.etag, variant.content_encoding), ('"v1-gzip"', 'gzip'))
+        # A new version of the file does not get the old variant
+        newer = self.entry(b'body { margin: 1px }\n' * 20, '"v2"')
+        self.assertIsNone(self.compressor.get_variant('/a.css', newer))
+    
+    def test_eligibility_and_incompressible_data(self):
+        self.assertFalse(self.compressor.eligible(self.entry(b'tiny', '"t"')))
+        self.assertFalse(self.compressor.eligible(self.entry(b'x' * 100, '"p"', 'image/png')))
+        random_bytes = os.urandom(256)
+        entry = self.entry(random_bytes, '"r"')
+        self.compressor.precompress('/r.css', entry)
+        # Not worth compressing: the identity entry is remembered so it is not retried
+        self.assertIs(self.compressor.get_variant('/r.css', entry), entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
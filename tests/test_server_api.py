@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Archive Index Tests
+Paging /api/archives with ArchiveIndex.page cursors, keeping the previous
+data when archives.json cannot be parsed or read, and the bootstrap data
+inlined into index.html (escaping, and re-rendering when the date changes).
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
+
+import server
+from server import create_static_file_app
+from server_api import (BOOTSTRAP_ARCHIVES_ID, BOOTSTRAP_EVENTS_ID, ArchiveIndex, EventIndex, bootstrap_blocks,
+                        inject_bootstrap, script_block)
+
+
+def archive_item(key, created_time, platform='mixcloud'):
+    return {'key': key, 'platform': platform, 'title': key.strip('/'), 'url': f'https://example.com{key}',
+            'embedUrl': None, 'created_time': created_time, 'play_count': 1}
+
+
+# Three items share a created_time, so page boundaries fall inside the tie
+ARCHIVES = {
+    'audio': [
+        archive_item('/a/', '2023-01-01T00:00:00Z'),
+        archive_item('/b/', '2023-02-01T00:00:00Z'),
+        archive_item('/c/', '2023-02-01T00:00:00Z'),
+        archive_item('/d/', '2023-02-01T00:00:00Z'),
+        archive_item('/e/', '2023-03-01T00:00:00Z'),
+        archive_item('/undated/', None),
+    ],
+    'video': [
+        archive_item('https://vk.com/video1', '2023-02-15T00:00:00Z', platform='VK'),
+    ],
+}
+
+
+class ArchiveIndexTestCase(unittest.TestCase):
+    """An ArchiveIndex over a temporary archives.json."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.file_path = os.path.join(self.directory, 'archives.json')
+        self.write(ARCHIVES)
+        self.index = ArchiveIndex(self.file_path)
+    
+    def write(self, data):
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            if isinstance(data, str):
+                f.write(data)
+            else:
+                json.dump(data, f)
+    
+    def keys(self, page):
+        return [item['key'] for item in page['items']]
+    
+    def walk(self, limit, **filters):
+        """Follow "next" cursors from the first page; return the keys of every page."""
+        pages = []
+        before = None
+        while True:
+            page = self.index.page(before=before, limit=limit, **filters)
+            pages.append(self.keys(page))
+            before = page['next']
+            if before is None:
+                return pages
+
+
+class PageCursorTests(ArchiveIndexTestCase):
+    """Pages are newest first and cursors never skip or repeat items."""
+    
+    def test_first_page(self):
+        page = self.index.page(archive_type='audio', limit=2)
+        self.assertEqual(self.keys(page), ['/e/', '/d/'])
+        self.assertEqual(page['total'], 6)
+        self.assertEqual(page['next'], '2023-02-01T00:00:00Z,/d/')
+    
+    def test_walk_through_shared_created_time(self):
+        for limit in (1, 2, 4):
+            pages = self.walk(limit, archive_type='audio')
+            self.assertEqual([key for page in pages for key in page],
+                             ['/e/', '/d/', '/c/', '/b/', '/a/', '/undated/'], limit)
+            self.assertTrue(all(pages), limit)
+    
+    def test_last_page_has_no_next(self):
+        page = self.index.page(archive_type='audio', before='2023-01-01T00:00:00Z,/a/')
+        self.assertEqual(self.keys(page), ['/undated/'])
+        self.assertIsNone(page['next'])
+        self.assertEqual(self.keys(self.index.page(archive_type='audio', before=',')), [])
+    
+    def test_bare_created_time(self):
+        # Starts at the newest item created strictly before the timestamp
+        page = self.index.page(archive_type='audio', before='2023-02-01T00:00:00Z', limit=2)
+        self.assertEqual(self.keys(page), ['/a/', '/undated/'])
+    
+    def test_filters(self):
+        self.assertEqual(self.walk(10), [['/e/', 'https://vk.com/video1', '/d/', '/c/', '/b/', '/a/',
+                                          '/undated/']])
+        page = self.index.page(platform='vk')
+        self.assertEqual(self.keys(page), ['https://vk.com/video1'])
+        self.assertEqual(page['items'][0]['type'], 'video')
+        self.assertEqual(self.index.page(platform='vk', archive_type='audio')['total'], 0)
+        self.assertEqual(self.keys(self.index.page(platform='soundcloud')), [])
+    
+    def test_items_are_compact(self):
+        item = self.index.page(limit=1)['items'][0]
+        self.assertNotIn('play_count', item)
+        self.assertEqual(item['platform'], 'mixcloud')
+    
+    def test_cursor_survives_new_items(self):
+        page = self.index.page(archive_type='audio', limit=2)
+        data = json.loads(json.dumps(ARCHIVES))
+        data['audio'].append(archive_item('/f/', '2023-04-01T00:00:00Z'))
+        self.write(data)
+        self.assertTrue(self.index.reload())
+        # A newer item shifts the first page, not the pages behind an existing cursor
+        self.assertEqual(self.keys(self.index.page(archive_type='audio', before=page['next'], limit=2)),
+                         ['/c/', '/b/'])
+        self.assertEqual(self.index.page(archive_type='audio')['total'], 7)
+    
+    def test_parse_query(self):
+        self.assertEqual(self.index.parse_query('api/archives', 'type=Audio&before=x,%2Fk%2F&limit=5'),
+                         (None, 'audio', 'x,/k/', 5))
+        with self.assertRaises(ValueError):
+            self.index.parse_query('api/archives', 'type=podcast')
+
+
+class ReloadTests(ArchiveIndexTestCase):
+    """A bad or unreadable file keeps the data already loaded."""
+    
+    def test_unparseable_file_keeps_previous_data(self):
+        version = self.index.snapshot.version
+        self.write('{"audio": [')
+        self.assertFalse(self.index.reload())
+        self.assertEqual(self.index.snapshot.version, version)
+        self.assertEqual(self.index.total(), 7)
+        self.assertEqual(self.index.failures, 1)
+    
+    def test_unreadable_file_keeps_previous_data(self):
+        os.remove(self.file_path)
+        os.mkdir(self.file_path)
+        self.assertFalse(self.index.reload())
+        self.assertEqual(self.index.total(), 7)
+        # The failure is remembered, so requests do not retry the read
+        self.assertFalse(self.index.refresh_if_stale())
+    
+    def test_unreadable_at_startup_is_empty(self):
+        os.remove(self.file_path)
+        os.mkdir(self.file_path)
+        index = ArchiveIndex(self.file_path)
+        self.assertEqual(index.total(), 0)
+        self.assertEqual(index.page()['total'], 0)
+
+
+# A title that would end the inline <script> element if "<" were not escaped
+HOSTILE_TITLE = '</script><script>alert(1)</script><!--'
+
+EVENTS = {
+    'events': [
+        {'id': 'jan', 'date': '2026-01-10', 'time': '20:00', 'title': 'January'},
+        {'id': 'feb', 'date': '2026-02-14', 'time': '21:00', 'title': HOSTILE_TITLE},
+    ],
+}
+
+
+def script_blocks(html):
+    """Return {element id: parsed JSON} for the application/json script elements of a page."""
+    pattern = re.compile(rb'<script type="application/json" id="([^"]+)">(.*?)</script>', re.DOTALL)
+    return {match.group(1).decode(): json.loads(match.group(2)) for match in pattern.finditer(html)}
+
+
+class BootstrapBlockTests(unittest.TestCase):
+    """script_block, bootstrap_blocks and inject_bootstrap."""
+    
+    def test_script_block_escapes_less_than(self):
+        value = {'title': HOSTILE_TITLE, 'note': 'a < b'}
+        block = script_block('data', value)
+        self.assertTrue(block.startswith(b'<script type="application/json" id="data">'))
+        # Only the element's own end tag is left, and the JSON still parses to the original value
+        self.assertEqual(block.count(b'<'), 2)
+        self.assertTrue(block.endswith(b'</script>\n'))
+        self.assertEqual(script_blocks(block), {'data': value})
+    
+    def test_inject_before_head_end(self):
+        blocks = script_block('data', [1])
+        self.assertEqual(inject_bootstrap(b'<html><HEAD><title>t</title></HEAD><body></body></html>', blocks),
+                         b'<html><HEAD><title>t</title>' + blocks + b'</HEAD><body></body></html>')
+        self.assertEqual(inject_bootstrap(b'<p>no head</p>', blocks), blocks + b'<p>no head</p>')
+    
+    def test_bootstrap_blocks(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_path = os.path.join(directory, 'events.json')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(EVENTS, f)
+        blocks = script_blocks(bootstrap_blocks(event_index=EventIndex(file_path), today='2026-01-11'))
+        self.assertEqual(list(blocks), [BOOTSTRAP_EVENTS_ID])
+        self.assertEqual(blocks[BOOTSTRAP_EVENTS_ID]['count'], 2)
+        self.assertEqual([event['id'] for event in blocks[BOOTSTRAP_EVENTS_ID]['upcoming']['events']], ['feb'])
+        self.assertEqual(bootstrap_blocks(), b'')
+
+
+class InlineDataTests(unittest.TestCase):
+    """index.html served with the data inlined (create_static_file_app inline_data=True)."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.mkdir(os.path.join(self.directory, 'data'))
+        self.write('index.html', '<html><head><title>Orangeterry</title></head><body></body></html>')
+        self.write('data/archives.json', json.dumps(ARCHIVES))
+        self.write('data/events.json', json.dumps(EVENTS))
+        self.app = create_static_file_app(
+            self.directory, inline_data=True,
+            archive_index=ArchiveIndex(os.path.join(self.directory, 'data', 'archives.json')),
+            event_index=EventIndex(os.path.join(self.directory, 'data', 'events.json')))
+        self.addCleanup(self.app.compressor.shutdown)
+        patcher = mock.patch.object(server, 'date')
+        self.date = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.date.today.return_value = date(2026, 1, 5)
+    
+    def write(self, rel_path, text):
+        with open(os.path.join(self.directory, *rel_path.split('/')), 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    def get_page(self):
+        """Request index.html; return (ETag, parsed bootstrap blocks, body)."""
+        environ = {'PATH_INFO': '/index.html', 'REQUEST_METHOD': 'GET'}
+        setup_testing_defaults(environ)
+        response = {}
+        
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = dict(headers)
+        
+        body = b''.join(self.app(environ, start_response))
+        self.assertEqual(response['status'], '200 OK')
+        return response['headers']['ETag'], script_blocks(body), body
+    
+    def upcoming_ids(self, blocks):
+        return [event['id'] for event in blocks[BOOTSTRAP_EVENTS_ID]['upcoming']['events']]
+    
+    def test_data_is_inlined_and_escaped(self):
+        etag, blocks, body = self.get_page()
+        self.assertEqual(list(blocks), [BOOTSTRAP_ARCHIVES_ID, BOOTSTRAP_EVENTS_ID])
+        self.assertEqual(blocks[BOOTSTRAP_ARCHIVES_ID]['audio']['items'][0]['key'], '/e/')
+        self.assertEqual(self.upcoming_ids(blocks), ['jan', 'feb'])
+        self.assertEqual(blocks[BOOTSTRAP_EVENTS_ID]['upcoming']['events'][1]['title'], HOSTILE_TITLE)
+        self.assertNotIn(b'alert(1)</script>', body)
+        self.assertTrue(body.endswith(b'</head><body></body></html>'))
+    
+    def test_page_is_rebuilt_when_the_date_changes(self):
+        etag, blocks, body = self.get_page()
+        # Same day: the rendered page is reused
+        self.assertEqual(self.get_page()[0], etag)
+        self.date.today.return_value = date(2026, 1, 11)
+        next_etag, blocks, _ = self.get_page()
+        self.assertNotEqual(next_etag, etag)
+        self.assertEqual(self.upcoming_ids(blocks), ['feb'])
+        self.date.today.return_value = date(2026, 3, 1)
+        self.assertEqual(self.upcoming_ids(self.get_page()[1]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
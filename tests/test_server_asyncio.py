@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Asyncio Backend Tests
+AsyncioHTTPServer on an ephemeral port, spoken to over raw sockets:
+keep-alive and pipelined requests, request Content-Length and
+Transfer-Encoding handling, and whole files sent through FileBody
+(sendfile) with and without a usable Content-Length.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import server_asyncio
+from server import FileCache, create_static_file_app
+from server_asyncio import AsyncioHTTPServer
+
+
+# Larger than one FileBody block, and too large for the test cache
+LARGE = bytes(range(256)) * 1024
+
+
+def read_response(f, method='GET'):
+    """Read one response from a socket file; return (status code, headers dict, body)."""
+    status_line = f.readline()
+    if not status_line:
+        return None
+    code = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = f.readline().decode('latin-1').rstrip('\r\n')
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if method == 'HEAD' or code in (204, 304):
+        return code, headers, b''
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b''
+        while True:
+            size = int(f.readline().strip(), 16)
+            chunk = f.read(size + 2)[:size]
+            if not size:
+                return code, headers, body
+            body += chunk
+    if 'content-length' in headers and headers['content-length'].isdigit():
+        return code, headers, f.read(int(headers['content-length']))
+    return code, headers, f.read()
+
+
+class AsyncioServerTestCase(unittest.TestCase):
+    """An AsyncioHTTPServer on 127.0.0.1 port 0 in a background thread, serving a temporary directory."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.write('index.html', b'<h1>home</h1>')
+        self.write('about.html', b'<h1>about</h1>')
+        self.write('large.bin', LARGE)
+        self.start(self.make_app())
+    
+    def make_app(self):
+        app = create_static_file_app(self.directory, file_cache=FileCache(max_entry_bytes=64 * 1024))
+        self.addCleanup(app.compressor.shutdown)
+        return app
+    
+    def write(self, name, data):
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(data)
+    
+    def start(self, app):
+        listener = socket.create_server(('127.0.0.1', 0))
+        self.port = listener.getsockname()[1]
+        self.server = AsyncioHTTPServer(app, threads=2)
+        stop = threading.Event()
+        patcher = mock.patch.object(server_asyncio, 'STOP_POLL_INTERVAL', 0.05)
+        patcher.start()
+        thread = threading.Thread(target=self.server.run, kwargs={'sock': listener, 'should_stop': stop.is_set})
+        thread.start()
+        
+        def stop_server():
+            stop.set()
+            thread.join(15)
+            patcher.stop()
+            listener.close()
+        
+        self.addCleanup(stop_server)
+    
+    def connect(self):
+        """Open a client connection; return (socket, binary file for reading responses)."""
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.addCleanup(sock.close)
+        f = sock.makefile('rb')
+        self.addCleanup(f.close)
+        return sock, f
+    
+    def exchange(self, raw, responses=1, method='GET'):
+        """Send raw request bytes on a new connection and read the given number of responses."""
+        sock, f = self.connect()
+        sock.sendall(raw)
+        return [read_response(f, method) for _ in range(responses)], f
+
+
+class PersistentConnectionTests(AsyncioServerTestCase):
+    """Keep-alive and pipelining."""
+    
+    def test_keep_alive(self):
+        sock, f = self.connect()
+        for path, body in (('/index.html', b'<h1>home</h1>'), ('/about.html', b'<h1>about</h1>')):
+            sock.sendall(f'GET {path} HTTP/1.1\r\nHost: test\r\n\r\n'.encode())
+            code, headers, response_body = read_response(f)
+            self.assertEqual((code, response_body), (200, body))
+            self.assertNotIn('connection', headers)
+        self.assertEqual(self.server.stats()['connections_total'], 1)
+        self.assertEqual(self.server.stats()['requests'], 2)
+    
+    def test_connection_close(self):
+        [(code, headers, _)], f = self.exchange(b'GET /index.html HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertEqual((code, headers['connection']), (200, 'close'))
+        self.assertEqual(f.read(), b'')
+    
+    def test_http_1_0(self):
+        [(code, headers, _)], f = self.exchange(b'GET /index.html HTTP/1.0\r\n\r\n')
+        self.assertEqual((code, headers['connection']), (200, 'close'))
+        self.assertEqual(f.read(), b'')
+        [(code, headers, _)], f = self.exchange(b'GET /index.html HTTP/1.0\r\nConnection: keep-alive\r\n\r\n')
+        self.assertEqual(headers['connection'], 'keep-alive')
+    
+    def test_pipelined_requests_are_answered_in_order(self):
+        raw = (b'GET /about.html HTTP/1.1\r\n\r\n'
+               b'HEAD /index.html HTTP/1.1\r\n\r\n'
+               b'GET /missing.html HTTP/1.1\r\n\r\n'
+               b'GET /index.html HTTP/1.1\r\nConnection: close\r\n\r\n')
+        sock, f = self.connect()
+        sock.sendall(raw)
+        responses = [read_response(f), read_response(f, 'HEAD'), read_response(f), read_response(f)]
+        self.assertEqual([code for code, _, _ in responses], [200, 200, 404, 200])
+        self.assertEqual(responses[0][2], b'<h1>about</h1>')
+        self.assertEqual((responses[1][1]['content-length'], responses[1][2]), ('13', b''))
+        self.assertEqual(responses[3][2], b'<h1>home</h1>')
+        self.assertEqual(f.read(), b'')
+
+
+class RequestFramingTests(AsyncioServerTestCase):
+    """Request bodies are framed by a plain decimal Content-Length only."""
+    
+    def assert_rejected(self, raw, code):
+        [(response_code, headers, _)], f = self.exchange(raw)
+        self.assertEqual((response_code, headers['connection']), (code, 'close'))
+        self.assertEqual(f.read(), b'')
+    
+    def test_body_is_consumed(self):
+        raw = (b'POST /index.html HTTP/1.1\r\nContent-Length: 12\r\n\r\nGET / HTTP/1.1'
+               b'GET /about.html HTTP/1.1\r\n\r\n')
+        responses, _ = self.exchange(raw, responses=2)
+        self.assertEqual(responses[1][:1], (200,))
+        self.assertEqual(responses[1][2], b'<h1>about</h1>')
+    
+    def test_invalid_content_length(self):
+        for value in (b'abc', b'+5', b'-1', b'1_0', b' ', b'\xd9\xa3', b'0x10'):
+            with self.subTest(value=value):
+                self.assert_rejected(b'POST / HTTP/1.1\r\nContent-Length: ' + value + b'\r\n\r\n', 400)
+    
+    def test_repeated_content_length(self):
+        self.assert_rejected(b'POST / HTTP/1.1\r\nContent-Length: 5\r\nContent-Length: 5\r\n\r\nhello', 400)
+    
+    def test_oversized_body(self):
+        size = server_asyncio.MAX_BODY_BYTES + 1
+        self.assert_rejected(f'POST / HTTP/1.1\r\nContent-Length: {size}\r\n\r\n'.encode(), 413)
+    
+    def test_transfer_encoding(self):
+        self.assert_rejected(b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n0\r\n\r\n', 501)
+        self.assert_rejected(b'POST / HTTP/1.1\r\nContent-Length: 5\r\nTransfer-Encoding: chunked\r\n\r\n', 501)
+    
+    def test_malformed_request(self):
+        self.assert_rejected(b'GET /index.html\r\n\r\n', 400)
+        self.assert_rejected(b'GET / HTTP/1.1\r\nBad Header\r\n\r\n', 400)
+        self.assert_rejected(b'GET / HTTP/2.0\r\n\r\n', 505)
+
+
+class FileBodyTests(AsyncioServerTestCase):
+    """Uncached files go out through FileBody and loop.sendfile."""
+    
+    def test_uncached_file(self):
+        sock, f = self.connect()
+        for _ in range(2):
+            sock.sendall(b'GET /large.bin HTTP/1.1\r\n\r\n')
+            code, headers, body = read_response(f)
+            self.assertEqual((code, headers['content-length']), (200, str(len(LARGE))))
+            self.assertEqual(body, LARGE)
+        # Ranges of an uncached file are streamed from the pool instead
+        sock.sendall(b'GET /large.bin HTTP/1.1\r\nRange: bytes=100-199\r\n\r\n')
+        code, _, body = read_response(f)
+        self.assertEqual((code, body), (206, LARGE[100:200]))
+    
+    def file_app(self, headers):
+        """A WSGI app returning large.bin through wsgi.file_wrapper with the given headers."""
+        opened = []
+        
+        def app(environ, start_response):
+            f = open(os.path.join(self.directory, 'large.bin'), 'rb')
+            opened.append(f)
+            start_response('200 OK', headers)
+            return environ['wsgi.file_wrapper'](f)
+        
+        return app, opened
+    
+    def test_without_content_length(self):
+        app, opened = self.file_app([('Content-Type', 'application/octet-stream')])
+        self.start(app)
+        [(code, headers, body)], f = self.exchange(b'GET / HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertEqual((code, headers['transfer-encoding'], body), (200, 'chunked', LARGE))
+        # The body is closed before the connection is
+        self.assertEqual(f.read(), b'')
+        self.assertTrue(opened[0].closed)
+    
+    def test_non_numeric_content_length(self):
+        app, opened = self.file_app([('Content-Length', 'abc')])
+        self.start(app)
+        # The file is iterated instead of sent with sendfile; the connection still closes cleanly
+        [(code, _, body)], _ = self.exchange(b'GET / HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertEqual((code, body), (200, LARGE))
+        self.assertTrue(opened[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
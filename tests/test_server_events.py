@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Change Feed Tests
+The /__events stream: opening messages for new and resuming clients
+(Last-Event-ID), resets when the missed messages are gone, and delivery of
+archive changes to open streams.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import server_events
+from server_api import ArchiveIndex
+from server_events import ChangeFeed, with_event_stream
+
+
+def parse_messages(raw):
+    """Split a chunk of an event stream into its messages as dicts of field -> value."""
+    messages = []
+    for block in raw.decode('utf-8').split('\n\n'):
+        if not block or block.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        if 'data' in fields:
+            fields['data'] = json.loads(fields['data'])
+        messages.append(fields)
+    return messages
+
+
+def archive_item(key):
+    return {'key': key, 'platform': 'mixcloud', 'title': key, 'url': key, 'created_time': '2023-01-01'}
+
+
+class ChangeFeedTestCase(unittest.TestCase):
+    """A ChangeFeed over an ArchiveIndex of a temporary archives.json."""
+    
+    history_size = server_events.HISTORY_SIZE
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.file_path = os.path.join(self.directory, 'archives.json')
+        self.keys = ['/a/']
+        self.write()
+        self.index = ArchiveIndex(self.file_path)
+        with mock.patch.object(server_events, 'HISTORY_SIZE', self.history_size):
+            self.feed = ChangeFeed({'archives': self.index})
+    
+    def write(self):
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            json.dump({'audio': [archive_item(key) for key in self.keys]}, f)
+    
+    def add(self, key):
+        """Add an archive item and reload the index; return the feed version before the change."""
+        version = self.feed.version()
+        self.keys.append(key)
+        self.write()
+        self.assertTrue(self.index.reload())
+        return version
+    
+    def opening(self, last_event_id=None):
+        raw = self.feed.opening_messages(last_event_id)
+        self.assertTrue(raw.startswith(f"retry: {server_events.RETRY_MILLISECONDS}\n\n".encode()))
+        return parse_messages(raw)[1:]
+
+
+class OpeningMessageTests(ChangeFeedTestCase):
+    """What a stream starts with, by Last-Event-ID."""
+    
+    def test_new_client_gets_version(self):
+        [message] = self.opening()
+        self.assertEqual(message['event'], 'version')
+        self.assertEqual(message['id'], self.feed.version())
+        self.assertEqual(message['data'], {'version': self.feed.version()})
+    
+    def test_current_client_gets_nothing(self):
+        self.assertEqual(self.opening(self.feed.version()), [])
+    
+    def test_resume_sends_missed_messages(self):
+        # first is the id of the version event a new stream opens with
+        first = self.add('/b/')
+        second = self.add('/c/')
+        messages = self.opening(first)
+        self.assertEqual([message['id'] for message in messages], [second, self.feed.version()])
+        self.assertEqual([message['data']['added'][0]['key'] for message in messages], ['/b/', '/c/'])
+        self.assertEqual([message['data']['added'][0]['key'] for message in self.opening(second)], ['/c/'])
+    
+    def test_unknown_id_resets(self):
+        self.add('/b/')
+        [message] = self.opening('not-a-version')
+        self.assertEqual(message['event'], 'reset')
+        self.assertEqual(message['data'], {'version': self.feed.version()})
+    
+    def test_resume_after_latest_of_repeated_version(self):
+        original = self.add('/b/')
+        self.keys.remove('/b/')
+        self.write()
+        self.index.reload()
+        self.assertEqual(self.feed.version(), original)
+        self.add('/c/')
+        # The id is in the history twice; only the message after its latest use was missed
+        messages = self.opening(original)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['data']['added'][0]['key'], '/c/')
+    
+    def test_unchanged_reload_publishes_nothing(self):
+        version = self.feed.version()
+        self.index.reload()
+        self.assertEqual(self.feed.stats()['messages'], 0)
+        self.assertEqual(self.opening(version), [])
+
+
+class HistoryLimitTests(ChangeFeedTestCase):
+    """Clients further behind than the kept history are told to reset."""
+    
+    history_size = 2
+    
+    def test_expired_id_resets(self):
+        oldest = self.add('/b/')
+        recent = self.add('/c/')
+        self.add('/d/')
+        self.assertEqual(self.opening(oldest)[0]['event'], 'reset')
+        self.assertEqual(len(self.opening(recent)), 2)
+
+
+class StreamTests(ChangeFeedTestCase):
+    """Streams iterated on a thread, as under Waitress."""
+    
+    def call(self, app, **headers):
+        environ = {'PATH_INFO': server_events.EVENTS_STREAM_PATH, 'REQUEST_METHOD': 'GET'}
+        environ.update(headers)
+        response = {}
+        
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = status
+        
+        return response, app(environ, start_response)
+    
+    def test_changes_reach_open_stream(self):
+        app = with_event_stream(None, self.feed)
+        response, stream = self.call(app)
+        self.assertEqual(response['status'], '200 OK')
+        chunks = iter(stream)
+        self.assertEqual(parse_messages(next(chunks))[-1]['event'], 'version')
+        received = []
+        reader = threading.Thread(target=lambda: received.extend(chunks))
+        reader.start()
+        self.add('/b/')
+        self.feed.close()
+        reader.join(5)
+        stream.close()
+        self.assertFalse(reader.is_alive())
+        [message] = parse_messages(b''.join(received))
+        self.assertEqual(message['event'], 'archives')
+        self.assertEqual(message['id'], self.feed.version())
+        self.assertEqual([item['key'] for item in message['data']['added']], ['/b/'])
+        self.assertEqual(self.feed.stats()['streams'], 0)
+    
+    def test_thread_streams_are_capped(self):
+        app = with_event_stream(None, self.feed)
+        streams = [self.call(app)[1] for _ in range(self.feed.max_thread_streams)]
+        response, body = self.call(app)
+        self.assertEqual(response['status'], '503 Service Unavailable')
+        streams[0].close()
+        response, stream = self.call(app)
+        self.assertEqual(response['status'], '200 OK')
+        stream.close()
+        for stream in streams[1:]:
+            stream.close()
+        self.assertEqual(self.feed.stats()['thread_streams'], 0)
+        self.assertEqual(self.feed.stats()['rejected'], 1)
+    
+    def test_thread_streams_get_fast_heartbeats(self):
+        feed = ChangeFeed({'archives': self.index}, heartbeat=60.0, thread_heartbeat=0.1).start()
+        self.addCleanup(feed.stop)
+        thread_queue = queue.SimpleQueue()
+        loop_queue = queue.SimpleQueue()
+        loop = mock.Mock()
+        feed.subscribe('thread', thread_queue)
+        feed.subscribe('async', loop_queue, loop)
+        # A client that has gone away is noticed at the next write, so thread streams are written to often
+        self.assertEqual(thread_queue.get(timeout=5), b': ping\n\n')
+        self.assertEqual(thread_queue.get(timeout=5), b': ping\n\n')
+        self.assertFalse(loop.call_soon_threadsafe.called)
+        feed.unsubscribe('thread')
+        feed.unsubscribe('async')
+    
+    def test_stream_ends_once_client_disconnects(self):
+        disconnected = threading.Event()
+        app = with_event_stream(None, self.feed)
+        _, stream = self.call(app, **{'waitress.client_disconnected': disconnected.is_set})
+        chunks = iter(stream)
+        next(chunks)
+        reader = threading.Thread(target=lambda: list(chunks))
+        reader.start()
+        disconnected.set()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        stream.close()
+        self.assertEqual(self.feed.stats()['thread_streams'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Access Log Tests
+AccessLog writing JSON lines to a temporary directory: access, error and
+logging entries, sampling once the queue is half full, dropping once it is
+full (both reported in the log), and size-based rotation.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from server_log import AccessLog
+
+
+def environ_for(path, **extra):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'REMOTE_ADDR': '127.0.0.1',
+               'HTTP_USER_AGENT': 'tests', 'orangeterry.route': path, 'orangeterry.cache': 'hit'}
+    environ.update(extra)
+    return environ
+
+
+class AccessLogTestCase(unittest.TestCase):
+    """An AccessLog writing logs/access.log under a temporary directory."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'logs', 'access.log')
+    
+    def make_log(self, **options):
+        log = AccessLog(self.path, **options)
+        self.addCleanup(log.stop)
+        return log
+    
+    def read(self, path=None):
+        with open(path or self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+    
+    def wait_written(self, log, count):
+        deadline = time.monotonic() + 5
+        while log.stats()['written'] < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(log.stats()['written'], count)
+
+
+class EntryTests(AccessLogTestCase):
+    """One JSON object per line."""
+    
+    def test_access_entry(self):
+        log = self.make_log().start()
+        log.access(environ_for('/index.html', QUERY_STRING='a=1'), '200', 0.0125, 42,
+                   [('Content-Type', 'text/html'), ('Content-Encoding', 'br')])
+        log.stop()
+        [entry] = self.read()
+        self.assertEqual(entry, {
+            'ts': entry['ts'], 'type': 'access', 'method': 'GET', 'path': '/index.html', 'query': 'a=1',
+            'status': 200, 'bytes': 42, 'duration_ms': 12.5, 'route': '/index.html', 'cache': 'hit',
+            'encoding': 'br', 'remote': '127.0.0.1', 'user_agent': 'tests', 'pid': os.getpid(),
+        })
+        self.assertAlmostEqual(entry['ts'], time.time(), delta=5)
+    
+    def test_error_and_logging_entries(self):
+        log = self.make_log().start()
+        try:
+            raise ValueError('bad value')
+        except ValueError:
+            log.error('Request failed', environ_for('/broken'), exc_info=True)
+        logger = logging.getLogger('tests.server_log')
+        logger.propagate = False
+        handler = log.logging_handler()
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        logger.warning('queue depth %d', 7)
+        logger.info('not logged')
+        log.stop()
+        error, warning = self.read()
+        self.assertEqual((error['type'], error['message'], error['path']), ('error', 'Request failed', '/broken'))
+        self.assertIn('ValueError: bad value', error['traceback'])
+        self.assertEqual((warning['type'], warning['level'], warning['message']), ('log', 'WARNING', 'queue depth 7'))
+
+
+class BackpressureTests(AccessLogTestCase):
+    """A backed-up queue samples, then drops, and says so in the log."""
+    
+    def test_sampling_and_dropping(self):
+        # Entries queue up without a writer: 5 fill it to half, then every second is kept until it is full
+        log = self.make_log(queue_size=10, sample_rate=2)
+        for index in range(25):
+            log.access(environ_for(f'/{index}'), '200', 0.001, 1, [])
+        stats = log.stats()
+        self.assertEqual((stats['queued'], stats['sampled_out'], stats['dropped']), (10, 10, 5))
+        log.start()
+        log.stop()
+        entries = self.read()
+        access = [entry for entry in entries if entry['type'] == 'access']
+        self.assertEqual([entry['path'] for entry in access],
+                         ['/0', '/1', '/2', '/3', '/4', '/6', '/8', '/10', '/12', '/14'])
+        self.assertEqual([entry.get('sample_rate') for entry in access], [None] * 5 + [2] * 5)
+        [report] = [entry for entry in entries if entry['type'] == 'log_backpressure']
+        self.assertEqual((report['dropped'], report['sampled_out']), (5, 10))
+    
+    def test_losses_are_reported_once(self):
+        log = self.make_log(queue_size=2, sample_rate=1000)
+        for index in range(4):
+            log.access(environ_for(f'/{index}'), '200', 0.001, 1, [])
+        log.start()
+        self.wait_written(log, 2)
+        log.access(environ_for('/later'), '200', 0.001, 1, [])
+        log.stop()
+        entries = self.read()
+        self.assertEqual([entry['type'] for entry in entries], ['access', 'log_backpressure', 'access'])
+        self.assertEqual((entries[1]['dropped'], entries[1]['sampled_out']), (0, 3))
+
+
+class RotationTests(AccessLogTestCase):
+    """The file is rotated by size, keeping backup_count old files."""
+    
+    def test_rotation(self):
+        log = self.make_log(max_bytes=100, backup_count=2).start()
+        for index in range(4):
+            log.access(environ_for(f'/{index}'), '200', 0.001, 1, [])
+            self.wait_written(log, index + 1)
+        log.stop()
+        self.assertEqual(log.stats()['rotations'], 4)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ['access.log', 'access.log.1', 'access.log.2'])
+        self.assertEqual(self.read(), [])
+        self.assertEqual([entry['path'] for entry in self.read(self.path + '.1')], ['/3'])
+        self.assertEqual([entry['path'] for entry in self.read(self.path + '.2')], ['/2'])
+    
+    def test_no_backups(self):
+        log = self.make_log(max_bytes=100, backup_count=0).start()
+        log.access(environ_for('/0'), '200', 0.001, 1, [])
+        self.wait_written(log, 1)
+        log.stop()
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['access.log'])
+        self.assertEqual(self.read(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Metrics Tests
+ServerMetrics.instrument recording requests (counters, latency histogram,
+bytes sent, in-flight gauge) for list, file wrapper, streamed and failing
+responses, and the /__metrics text exposition.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import io
+import unittest
+from wsgiref.util import FileWrapper, setup_testing_defaults
+
+from server_metrics import CONTENT_TYPE, METRICS_PATH, ROUTE_ENVIRON_KEY, ServerMetrics
+
+
+def request(app, path, method='GET'):
+    """Call a WSGI app once and return (status, headers dict, body bytes)."""
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': method, 'wsgi.file_wrapper': FileWrapper}
+    setup_testing_defaults(environ)
+    response = {}
+    
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(response_headers)
+    
+    result = app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+def sample_app(environ, start_response):
+    """Serve a few fixed routes the way the static app labels them."""
+    path = environ['PATH_INFO']
+    if path == '/missing':
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'not found']
+    environ[ROUTE_ENVIRON_KEY] = path
+    if path == '/page.html':
+        start_response('200 OK', [('Content-Type', 'text/html'), ('Content-Length', '5')])
+        return [b'hello']
+    if path == '/file.bin':
+        start_response('200 OK', [('Content-Length', '10')])
+        return environ['wsgi.file_wrapper'](io.BytesIO(b'0123456789'))
+    if path == '/stream':
+        start_response('206 Partial Content', [])
+        return (chunk for chunk in (b'abc', b'defg'))
+    raise RuntimeError('broken route')
+
+
+class MetricsTestCase(unittest.TestCase):
+    """ServerMetrics instrumenting sample_app, with an observer recording every request."""
+    
+    def setUp(self):
+        self.metrics = ServerMetrics(buckets=(0.5, 1.0))
+        self.observed = []
+        self.metrics.add_observer(lambda environ, status, seconds, bytes_sent, headers:
+                                  self.observed.append((environ['PATH_INFO'], status, bytes_sent)))
+        self.app = self.metrics.instrument(sample_app)
+    
+    def exposition(self):
+        status, headers, body = request(self.app, METRICS_PATH)
+        self.assertEqual((status, headers['Content-Type']), ('200 OK', CONTENT_TYPE))
+        return body.decode('utf-8').splitlines()
+
+
+class RecordingTests(MetricsTestCase):
+    """What instrument() records per request."""
+    
+    def test_request_counter(self):
+        request(self.app, '/page.html')
+        request(self.app, '/page.html')
+        request(self.app, '/page.html', method='HEAD')
+        request(self.app, '/missing', method='BREW')
+        lines = self.exposition()
+        self.assertIn('orangeterry_http_requests_total{route="/page.html",method="GET",status="200"} 2', lines)
+        self.assertIn('orangeterry_http_requests_total{route="/page.html",method="HEAD",status="200"} 1', lines)
+        self.assertIn('orangeterry_http_requests_total{route="unmatched",method="OTHER",status="404"} 1', lines)
+        # HEAD responses send no body
+        self.assertIn('orangeterry_http_response_bytes_total{route="/page.html"} 10', lines)
+        self.assertIn('orangeterry_http_requests_in_flight 0', lines)
+    
+    def test_bodies_are_counted(self):
+        request(self.app, '/file.bin')
+        self.assertEqual(self.observed, [('/file.bin', '200', 10)])
+        request(self.app, '/stream')
+        self.assertEqual(self.observed[-1], ('/stream', '206', 7))
+        lines = self.exposition()
+        self.assertIn('orangeterry_http_response_bytes_total{route="/file.bin"} 10', lines)
+        self.assertIn('orangeterry_http_response_bytes_total{route="/stream"} 7', lines)
+    
+    def test_streamed_body_is_recorded_on_close(self):
+        environ = {'PATH_INFO': '/stream', 'REQUEST_METHOD': 'GET'}
+        setup_testing_defaults(environ)
+        body = self.app(environ, lambda status, headers, exc_info=None: None)
+        self.assertEqual(self.metrics.in_flight, 1)
+        self.assertEqual(self.observed, [])
+        b''.join(body)
+        body.close()
+        self.assertEqual(self.metrics.in_flight, 0)
+        self.assertEqual(self.observed, [('/stream', '206', 7)])
+    
+    def test_app_errors_are_recorded_and_observed(self):
+        with self.assertRaises(RuntimeError):
+            request(self.app, '/broken')
+        self.assertEqual(self.observed, [('/broken', '500', 0)])
+        self.assertEqual(self.metrics.in_flight, 0)
+        self.assertIn('orangeterry_http_requests_total{route="/broken",method="GET",status="500"} 1',
+                      self.exposition())
+    
+    def test_metrics_requests_are_not_recorded(self):
+        self.exposition()
+        self.assertEqual(self.observed, [])
+        self.assertFalse(any(line.startswith('orangeterry_http_requests_total{') for line in self.exposition()))
+
+
+class ExpositionTests(MetricsTestCase):
+    """The Prometheus text format."""
+    
+    def test_latency_histogram(self):
+        for seconds in (0.25, 0.75, 3.0):
+            self.metrics.begin_request()
+            self.metrics.end_request('/page.html', 'GET', '200', seconds, 0)
+        name = 'orangeterry_http_request_duration_seconds'
+        lines = self.exposition()
+        start = lines.index(f'# TYPE {name} histogram')
+        # Buckets are cumulative and end with +Inf, which equals the count
+        self.assertEqual(lines[start + 1:start + 6], [
+            f'{name}_bucket{{route="/page.html",le="0.5"}} 1',
+            f'{name}_bucket{{route="/page.html",le="1"}} 2',
+            f'{name}_bucket{{route="/page.html",le="+Inf"}} 3',
+            f'{name}_sum{{route="/page.html"}} 4',
+            f'{name}_count{{route="/page.html"}} 3',
+        ])
+    
+    def test_families_have_help_and_type(self):
+        request(self.app, '/page.html')
+        lines = self.exposition()
+        self.assertIn('# HELP orangeterry_http_requests_total Requests handled, by route, method and status.',
+                      lines)
+        self.assertIn('# TYPE orangeterry_http_requests_total counter', lines)
+        self.assertIn('# TYPE orangeterry_http_requests_in_flight gauge', lines)
+        for line in lines:
+            if not line.startswith('#'):
+                self.assertTrue(line.startswith('orangeterry_'), line)
+                float(line.rsplit(' ', 1)[1].replace('+Inf', 'inf'))
+    
+    def test_collectors(self):
+        self.metrics.add_collector(lambda: [
+            ('widgets', 'gauge', 'Widgets.', [({'name': 'say "hi"\\\n'}, 1.5)]),
+            ('sizes', 'histogram', 'Sizes.', [('_count', {}, 2)]),
+        ])
+        self.metrics.add_collector(lambda: 1 / 0)
+        lines = self.exposition()
+        self.assertIn('# TYPE orangeterry_widgets gauge', lines)
+        self.assertIn('orangeterry_widgets{name="say \\"hi\\"\\\\\\n"} 1.5', lines)
+        self.assertIn('orangeterry_sizes_count 2', lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Preload and Health Check Tests
+Discovering the startup preload list from index.html and the JS import
+graph, preload.json globs, warming the caches with the list, and the
+/__live and /__ready probes before and after the warm-up.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from wsgiref.util import setup_testing_defaults
+
+from server import LIVE_PATH, READY_PATH, FileCache, create_static_file_app
+from server_preload import (PRELOAD_MANIFEST, discover_preload_paths, load_preload_manifest, local_path,
+                            preload_paths)
+
+
+INDEX_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+    <link rel="stylesheet" href="styles/main.css">
+    <link rel="icon" href="/assets/logos/logo.png">
+    <link rel="preconnect" href="https://www.mixcloud.com">
+    <script type="module" src="scripts/app.js?v=2"></script>
+</head>
+<body><a href="#top">Top</a><img src="data:image/gif;base64,R0lGOD"><img src="missing.png"></body>
+</html>
+'''
+
+APP_JS = '''import { render } from './render.js';
+const Player = await import('./player.js');
+fetch('data/archives.json').then(response => response.json()).then(render);
+'''
+
+RENDER_JS = '''import { escape } from '../scripts/util.js';
+export function render(data) { return escape(data); }
+'''
+
+
+def request(app, path):
+    """Call a WSGI app once and return (status, headers dict, body bytes)."""
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+    setup_testing_defaults(environ)
+    response = {}
+    
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = dict(response_headers)
+    
+    body = b''.join(app(environ, start_response))
+    return response['status'], response['headers'], body
+
+
+class PreloadTestCase(unittest.TestCase):
+    """A temporary site with a page, an ES module graph, data and logos."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.write('index.html', INDEX_HTML)
+        self.write('styles/main.css', 'body { margin: 0 }')
+        self.write('scripts/app.js', APP_JS)
+        self.write('scripts/render.js', RENDER_JS)
+        self.write('scripts/player.js', 'export default class Player {}')
+        self.write('scripts/util.js', 'export const escape = value => value;')
+        self.write('scripts/unused.js', 'export {};')
+        self.write('data/archives.json', '{"audio": []}')
+        self.write('data/events.json', '[]')
+        self.write('assets/logos/logo.png', 'png')
+        self.write('assets/logos/logo-64.webp', 'webp')
+    
+    def write(self, rel_path, text):
+        file_path = os.path.join(self.directory, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    def write_manifest(self, paths):
+        self.write(PRELOAD_MANIFEST, json.dumps({'paths': paths}))
+
+
+class DiscoveryTests(PreloadTestCase):
+    """The list found by scanning the page and its scripts."""
+    
+    def test_discovered_paths(self):
+        self.assertEqual(discover_preload_paths(self.directory), [
+            'index.html',
+            'styles/main.css',
+            'assets/logos/logo.png',
+            'scripts/app.js',
+            'scripts/render.js',
+            'scripts/player.js',
+            'data/archives.json',
+            'scripts/util.js',
+            'assets/logos/logo-64.webp',
+        ])
+    
+    def test_missing_entry_point(self):
+        os.remove(os.path.join(self.directory, 'index.html'))
+        self.assertEqual(discover_preload_paths(self.directory),
+                         ['assets/logos/logo-64.webp', 'assets/logos/logo.png'])
+    
+    def test_local_path(self):
+        self.assertEqual(local_path('./util.js?v=1#x', 'scripts'), 'scripts/util.js')
+        self.assertEqual(local_path('/styles/main.css', 'scripts'), 'styles/main.css')
+        self.assertEqual(local_path('../data/a.json', 'scripts'), 'data/a.json')
+        for url in ('https://example.com/a.js', '//cdn.example.com/a.js', 'mailto:a@b', '#top', '../..', ''):
+            self.assertIsNone(local_path(url, 'scripts'), url)
+
+
+class ManifestTests(PreloadTestCase):
+    """preload.json, with globs."""
+    
+    def test_globs_are_expanded(self):
+        self.write_manifest(['index.html', 'scripts/*.js', '/scripts/app.js', 'data/*.json', 'assets/*'])
+        self.assertEqual(load_preload_manifest(self.directory), [
+            'index.html',
+            'scripts/app.js',
+            'scripts/player.js',
+            'scripts/render.js',
+            'scripts/unused.js',
+            'scripts/util.js',
+            'data/archives.json',
+            'data/events.json',
+        ])
+        self.assertEqual(preload_paths(self.directory)[1], PRELOAD_MANIFEST)
+    
+    def test_manifest_replaces_discovery(self):
+        self.assertIsNone(load_preload_manifest(self.directory))
+        self.assertEqual(preload_paths(self.directory), (discover_preload_paths(self.directory), 'discovered'))
+        self.write_manifest(['styles/main.css', 'not-there.css'])
+        self.assertEqual(preload_paths(self.directory), (['styles/main.css', 'not-there.css'], PRELOAD_MANIFEST))
+    
+    def test_unreadable_manifest_falls_back_to_discovery(self):
+        for text in ('{"paths": [', '["index.html"]'):
+            self.write(PRELOAD_MANIFEST, text)
+            paths, source = preload_paths(self.directory)
+            self.assertEqual(source, 'discovered', text)
+            self.assertEqual(paths[0], 'index.html')
+
+
+class HealthTests(PreloadTestCase):
+    """/__live and /__ready around a warm-up."""
+    
+    def test_ready_after_warm_up(self):
+        ready = threading.Event()
+        file_cache = FileCache()
+        app = create_static_file_app(self.directory, file_cache=file_cache, ready=ready)
+        self.addCleanup(app.compressor.shutdown)
+        status, headers, body = request(app, READY_PATH)
+        self.assertEqual((status, headers['Retry-After'], headers['Cache-Control']),
+                         ('503 Service Unavailable', '1', 'no-store'))
+        self.assertEqual(request(app, LIVE_PATH)[0], '200 OK')
+        # Files are served while warming up
+        self.assertEqual(request(app, '/styles/main.css')[2], b'body { margin: 0 }')
+        
+        paths, _ = preload_paths(self.directory)
+        warmed = app.warm_up(paths + ['not-there.css'])
+        ready.set()
+        self.assertEqual(warmed['files'], len(paths))
+        self.assertEqual(warmed['missing'], ['not-there.css'])
+        self.assertEqual(file_cache.stats()['entries'], len(paths))
+        self.assertEqual(request(app, READY_PATH)[:3:2], ('200 OK', b'ready\n'))
+        self.assertEqual(request(app, LIVE_PATH)[:3:2], ('200 OK', b'live\n'))
+    
+    def test_ready_without_event(self):
+        app = create_static_file_app(self.directory)
+        self.addCleanup(app.compressor.shutdown)
+        self.assertEqual(request(app, READY_PATH)[0], '200 OK')
+
+
+if __name__ == '__main__':
+    unittest.main()
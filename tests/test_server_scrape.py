@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Scheduled Scrape Tests
+ScrapeScheduler.run_job merging fetched items into a temporary
+archives.json and reloading the archive index, with the network fetches
+replaced by fixed item lists (the scripts' own merge functions still run).
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import server_scrape
+from server_api import ArchiveIndex
+from server_scrape import ScrapeScheduler, load_script
+
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+
+
+def mixcloud_item(name, created_time='2023-01-01T00:00:00Z'):
+    url = f'https://www.mixcloud.com/Orangeterry/{name}/'
+    return {'key': f'/Orangeterry/{name}/', 'platform': 'mixcloud', 'type': 'audio', 'title': name,
+            'url': url, 'embedUrl': url, 'created_time': created_time}
+
+
+def vk_item(name):
+    url = f'https://vk.com/video-1_{name}'
+    return {'key': f'video-1_{name}', 'platform': 'vk', 'type': 'video', 'title': name, 'url': url,
+            'embedUrl': url, 'created_time': '2023-01-15T00:00:00Z'}
+
+
+EXISTING = {
+    'audio': [mixcloud_item('set-1'), mixcloud_item('set-2', '2023-02-01T00:00:00Z')],
+    'video': [vk_item('1')],
+}
+
+
+class ScrapeSchedulerTestCase(unittest.TestCase):
+    """A scheduler over a temporary archives.json whose fetches return self.fetched."""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.file_path = os.path.join(self.directory, 'archives.json')
+        self.write(json.dumps(EXISTING))
+        os.chmod(self.file_path, 0o644)
+        self.index = ArchiveIndex(self.file_path)
+        self.changes = []
+        self.index.add_observer(lambda old, new: self.changes.append(self.index.diff(old, new)))
+        self.scheduler = ScrapeScheduler(self.index, 60, SCRIPTS_DIR)
+        self.fetched = {'mixcloud': list(EXISTING['audio']), 'vk': list(EXISTING['video'])}
+        patcher = mock.patch.dict(server_scrape.JOB_FETCHERS, {
+            'mixcloud': self.fetch_mixcloud,
+            'vk': self.fetch_vk,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def write(self, text):
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    def read(self):
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def fetch_mixcloud(self, scripts_dir):
+        script = load_script(scripts_dir, 'fetch_mixcloud')
+        items = self.fetched['mixcloud']
+        return (lambda existing: script.merge_audio_archives(existing, items)), len(items)
+    
+    def fetch_vk(self, scripts_dir):
+        script = load_script(scripts_dir, 'fetch_vk_videos')
+        videos = self.fetched['vk']
+        return (lambda existing: script.merge_video_archives(existing, videos)), len(videos)
+    
+    def keys(self):
+        return sorted(item['key'] for item in self.index.page(limit=100)['items'])
+
+
+class MergeTests(ScrapeSchedulerTestCase):
+    """Successful runs replace the file and swap the index."""
+    
+    def test_new_items_are_merged_and_reloaded(self):
+        self.fetched['mixcloud'].append(mixcloud_item('set-3', '2023-03-01T00:00:00Z'))
+        self.assertTrue(self.scheduler.run_job('mixcloud'))
+        self.assertIn('/Orangeterry/set-3/', [item['key'] for item in self.read()['audio']])
+        self.assertEqual(self.read()['video'], EXISTING['video'])
+        self.assertEqual(self.index.page(archive_type='audio')['items'][0]['key'], '/Orangeterry/set-3/')
+        self.assertEqual([[item['key'] for item in diff['added']] for diff in self.changes],
+                         [['/Orangeterry/set-3/']])
+        # Replaced atomically with the old file's permissions, leaving no temporary files
+        self.assertEqual(stat.S_IMODE(os.stat(self.file_path).st_mode), 0o644)
+        self.assertEqual(os.listdir(self.directory), ['archives.json'])
+        stats = self.scheduler.stats()['mixcloud']
+        self.assertEqual((stats['runs'], stats['failures'], stats['last_error']), (1, 0, None))
+        self.assertIsNotNone(stats['last_success'])
+    
+    def test_new_video_is_merged(self):
+        self.fetched['vk'].append(vk_item('2'))
+        self.assertTrue(self.scheduler.run_job('vk'))
+        self.assertIn('video-1_2', self.keys())
+        self.assertEqual(len(self.read()['audio']), 2)
+    
+    def test_unchanged_data_is_not_rewritten(self):
+        mtime_ns = os.stat(self.file_path).st_mtime_ns
+        builds = self.index.builds
+        self.assertTrue(self.scheduler.run_job('mixcloud'))
+        self.assertEqual(os.stat(self.file_path).st_mtime_ns, mtime_ns)
+        self.assertEqual(self.index.builds, builds)
+        self.assertEqual(self.changes, [])
+
+
+class FailureTests(ScrapeSchedulerTestCase):
+    """Failed runs leave the file and the index as they were."""
+    
+    def assert_unchanged(self, name, error):
+        with open(self.file_path, 'rb') as f:
+            before = f.read()
+        self.assertFalse(self.scheduler.run_job(name))
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(self.changes, [])
+        stats = self.scheduler.stats()[name]
+        self.assertEqual((stats['runs'], stats['failures']), (1, 1))
+        self.assertIn(error, stats['last_error'])
+        self.assertIsNone(stats['last_success'])
+    
+    def test_merge_that_drops_items_is_refused(self):
+        # A short fetch (one profile page failed) would drop set-2
+        self.fetched['mixcloud'] = [mixcloud_item('set-1'), mixcloud_item('set-3')]
+        self.assert_unchanged('mixcloud', 'would remove 1 existing item')
+        self.assertEqual(len(self.keys()), 3)
+    
+    def test_fetch_error_keeps_data(self):
+        def fail(scripts_dir):
+            raise OSError('network is unreachable')
+        server_scrape.JOB_FETCHERS['vk'] = fail
+        self.assert_unchanged('vk', 'network is unreachable')
+    
+    def test_unparseable_file_is_not_replaced(self):
+        self.write('{"audio": [')
+        self.index.reload()
+        self.fetched['mixcloud'].append(mixcloud_item('set-3'))
+        self.assert_unchanged('mixcloud', 'JSONDecodeError')
+
+
+class SchedulingTests(ScrapeSchedulerTestCase):
+    """Jobs run on the monotonic clock; scripts are imported once."""
+    
+    def test_due_jobs_run(self):
+        self.scheduler = ScrapeScheduler(self.index, 0.1, SCRIPTS_DIR).start()
+        self.addCleanup(self.scheduler.stop)
+        deadline = time.monotonic() + 5
+        while self.scheduler.stats()['vk']['runs'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = self.scheduler.stats()
+        self.assertGreaterEqual(stats['mixcloud']['runs'], 1)
+        self.assertGreaterEqual(stats['vk']['runs'], 1)
+    
+    def test_wall_clock_jump_runs_nothing(self):
+        self.scheduler = ScrapeScheduler(self.index, 3600, SCRIPTS_DIR).start()
+        self.addCleanup(self.scheduler.stop)
+        self.assertAlmostEqual(self.scheduler.stats()['vk']['next_run'], time.time() + 3600, delta=5)
+        real_time = time.time
+        with mock.patch.object(server_scrape.time, 'time', lambda: real_time() + 86400):
+            time.sleep(1)
+        self.assertEqual([stats['runs'] for stats in self.scheduler.stats().values()], [0, 0])
+    
+    def test_scripts_are_imported_once(self):
+        script = load_script(SCRIPTS_DIR, 'fetch_vk_videos')
+        self.assertIs(load_script(SCRIPTS_DIR, 'fetch_vk_videos'), script)
+        self.assertIs(sys.modules['orangeterry_fetch_vk_videos'], script)
+        self.assertNotIn(SCRIPTS_DIR, sys.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+File Watcher Tests
+FileWatcher reporting changed files under a temporary directory through
+both backends: polling (reported once a change has been stable for one
+interval) and inotify (bursts debounced into one batch), with hidden and
+SKIP_DIRS paths ignored.
+
+Run from the project root with: python -m unittest discover -s tests
+"""
+
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from server_watch import SKIP_DIRS, FileWatcher, is_hidden
+
+
+class FileWatcherTestCase(unittest.TestCase):
+    """A watcher over a temporary directory; reported batches arrive on self.batches."""
+    
+    use_inotify = False
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.write('index.html', 'old')
+        self.write('styles/site.css', '')
+        self.batches = queue.SimpleQueue()
+        self.watcher = FileWatcher(self.directory, self.on_change, debounce=0.1, max_delay=2.0,
+                                   poll_interval=0.05, use_inotify=self.use_inotify)
+        self.backend = self.watcher.start()
+        self.addCleanup(self.watcher.stop)
+        # Let the watcher take its first snapshot (or add its watches) before anything changes
+        time.sleep(0.2)
+    
+    def on_change(self, paths):
+        self.batches.put(paths)
+        return len(paths or ())
+    
+    def write(self, rel_path, text):
+        file_path = os.path.join(self.directory, rel_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    
+    def next_batch(self, timeout=5):
+        return self.batches.get(timeout=timeout)
+    
+    def assert_no_batch(self, wait):
+        with self.assertRaises(queue.Empty):
+            self.batches.get(timeout=wait)
+
+
+class PollingTests(FileWatcherTestCase):
+    """The polling fallback."""
+    
+    def test_change_is_reported(self):
+        self.assertEqual(self.backend, 'polling')
+        self.write('index.html', 'new contents')
+        self.write('data/archives.json', '{}')
+        changed = set()
+        while changed != {'index.html', 'data/archives.json'}:
+            changed |= self.next_batch()
+        stats = self.watcher.stats()
+        self.assertEqual(stats['paths_changed'], 2)
+        self.assertEqual(stats['invalidations'], 2)
+    
+    def test_change_is_reported_once_settled(self):
+        started = time.monotonic()
+        while time.monotonic() - started < 0.4:
+            self.write('index.html', f'{time.monotonic()}')
+            time.sleep(0.01)
+            # Nothing is reported while the file keeps changing
+            self.assertTrue(self.batches.empty())
+        self.assertEqual(self.next_batch(), {'index.html'})
+        self.assert_no_batch(0.3)
+    
+    def test_skipped_paths_are_ignored(self):
+        for name in sorted(SKIP_DIRS):
+            self.write(f'{name}/entry.txt', 'skipped')
+        self.write('.git/HEAD', 'ref')
+        self.write('.env', 'SECRET=1')
+        self.write('index.html~', 'backup')
+        self.write('index.html', 'new contents')
+        self.assertEqual(self.next_batch(), {'index.html'})
+        self.assert_no_batch(0.3)
+    
+    def test_callback_errors_do_not_stop_the_watcher(self):
+        self.watcher.on_change = lambda paths: 1 / 0
+        self.write('index.html', 'broken')
+        deadline = time.monotonic() + 5
+        while self.watcher.stats()['batches'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.watcher.on_change = self.on_change
+        self.write('index.html', 'fixed')
+        self.assertEqual(self.next_batch(), {'index.html'})
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+class InotifyTests(FileWatcherTestCase):
+    """The inotify backend."""
+    
+    use_inotify = True
+    
+    def test_burst_is_one_batch(self):
+        self.assertEqual(self.backend, 'inotify')
+        for i in range(5):
+            self.write('index.html', f'version {i}')
+            self.write('styles/site.css', f'/* {i} */')
+            time.sleep(0.01)
+        self.assertEqual(self.next_batch(), {'index.html', 'styles/site.css'})
+        self.assert_no_batch(0.3)
+    
+    def test_skipped_paths_are_ignored(self):
+        self.write('.env', 'SECRET=1')
+        self.write('index.html~', 'backup')
+        self.write('index.html', 'new contents')
+        self.assertEqual(self.next_batch(), {'index.html'})
+    
+    def test_new_directory_is_a_full_refresh(self):
+        self.write('logos/new.png', 'png')
+        self.assertIsNone(self.next_batch())
+        self.assertEqual(self.watcher.stats()['full_refreshes'], 1)
+
+
+class IsHiddenTests(unittest.TestCase):
+    """Names never watched or served."""
+    
+    def test_is_hidden(self):
+        for name in ('.git', '.env', 'index.html~', 'node_modules', 'logs', '__pycache__'):
+            self.assertTrue(is_hidden(name), name)
+        for name in ('index.html', 'data', 'logos', 'site.css'):
+            self.assertFalse(is_hidden(name), name)
+
+
+if __name__ == '__main__':
+    unittest.main()